@@ -116,18 +116,20 @@ class BuildAction(object):
                 "command": self.__command_str(),
                 "file": self.source}
 
-    def __hash__(self):
+    def uniqueing_key(self):
         """
         If the compilation database contains the same compilation action
         multiple times it should be checked only once.
-        Use this key to compare compilation commands for the analysis.
+        Use this key to compare compilation commands for the analysis. The
+        key contains everything which reaches the analyzer command, so only
+        the actions with the same analyzer invocation are merged.
         """
-        hash_content = []
-        hash_content.extend(self.analyzer_options)
-        hash_content.append(str(self.analyzer_type))
-        hash_content.append(self.target[self.lang])
-        hash_content.append(self.source)
-        return hash(''.join(hash_content))
+        return (str(self.analyzer_type),
+                self.directory,
+                self.__command_str())
+
+    def __hash__(self):
+        return hash(self.uniqueing_key())
 
     def with_attr(self, attr, value):
         details = {key: getattr(self, key) for key in BuildAction.__slots__}
@@ -0,0 +1,154 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Checkpointing of per-entry pipeline steps, so an interrupted execution can
+be resumed without processing the already completed entries again.
+"""
+
+import collections
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Iterable
+
+from compilation_database_transformer.util import stable_digest
+
+LOG = logging.getLogger('checkpoint')
+
+
+class Journal(object):
+    """
+    An append-only file of completed per-entry results, keyed by the digest
+    of the entry. Every line holds a JSON object with a digest and a result.
+    The records are written to the file immediately, but synchronized to the
+    disk only in batches, so the overhead of the journal stays low. An
+    interruption may lose the records of the last batch, and may leave a
+    truncated last line, which is ignored when the journal is resumed.
+    """
+
+    def __init__(self, path: str, resume: bool = False,
+                 sync_every: int = 1000, sync_interval: float = 1.0):
+        self.path = path
+        self.results = {}
+        self._sync_every = sync_every
+        self._sync_interval = sync_interval
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        if resume and os.path.exists(path):
+            self._load()
+
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if resume and self._file.tell() and not self._ends_with_newline():
+            # Do not append to a line truncated by an interruption.
+            self._file.write('\n')
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as journal:
+            journal.seek(-1, os.SEEK_END)
+            return journal.read(1) == b'\n'
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8',
+                  errors='ignore') as journal:
+            for line_number, line in enumerate(journal, 1):
+                try:
+                    record = json.loads(line)
+                    self.results[record['digest']] = record['result']
+                except (ValueError, KeyError, TypeError):
+                    LOG.warning("Ignoring invalid record in journal %s at "
+                                "line %d.", self.path, line_number)
+
+        LOG.debug("Loaded %d results from journal %s.",
+                  len(self.results), self.path)
+
+    def __contains__(self, digest: str):
+        return digest in self.results
+
+    def __len__(self):
+        return len(self.results)
+
+    def get(self, digest: str):
+        return self.results.get(digest)
+
+    def record(self, digest: str, result: Any):
+        """Append the result of an entry to the journal."""
+        self.results[digest] = result
+        self._file.write(json.dumps({'digest': digest, 'result': result},
+                                    separators=(',', ':')) + '\n')
+        self._unsynced += 1
+
+        if self._unsynced >= self._sync_every or \
+                time.monotonic() - self._last_sync >= self._sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Write the appended records to the disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def checkpointed(stage: Callable, journal: Journal,
+                 digest: Callable = stable_digest):
+    """
+    Wrap a per-entry pipeline stage, i.e. a function which maps an iterable
+    of entries to an iterable of results of the same length and order. The
+    entries which already have a result in the journal are not passed to
+    the stage, and the results of the others are recorded in the journal.
+    The results are yielded in the order of the input.
+    """
+    def run(entries: Iterable):
+        # The entries in input order, either with their recorded result, or
+        # with the digest of an entry which was passed to the stage.
+        order = collections.deque()
+
+        def pending_entries():
+            for entry in entries:
+                key = digest(entry)
+                if key in journal:
+                    order.append((True, journal.get(key)))
+                else:
+                    order.append((False, key))
+                    yield entry
+
+        results = iter(stage(pending_entries()))
+        prefetched = collections.deque()
+        exhausted = False
+
+        while order or not exhausted:
+            if not order:
+                # Reading the next result also reads the input up to the
+                # entry it belongs to.
+                try:
+                    prefetched.append(next(results))
+                except StopIteration:
+                    exhausted = True
+                continue
+
+            done, value = order.popleft()
+            if done:
+                yield value
+                continue
+
+            result = prefetched.popleft() if prefetched else next(results)
+            journal.record(value, result)
+            yield result
+
+    return run
@@ -5,9 +5,17 @@
 # -------------------------------------------------------------------------
 """Parse the 'clang --version' command output."""
 
-import re
 import subprocess
 
+from compilation_database_transformer.util import LazyPattern
+
+CLANG_VERSION_PATTERN = LazyPattern(
+    r"(?P<vendor>clang|Apple LLVM) version (?P<major_version>[0-9]+)"
+    r"\.(?P<minor_version>[0-9]+)\.(?P<patch_version>[0-9]+)")
+
+CLANG_INSTALLED_DIR_PATTERN = \
+    LazyPattern(r"InstalledDir: (?P<installed_dir>[^\s]*)")
+
 
 class ClangVersionInfo(object):
     """ClangVersionInfo holds the version information of the used Clang."""
@@ -32,18 +40,14 @@ class ClangVersionInfoParser(object):
     """
 
     def __init__(self):
-        self.clang_version_pattern = (
-            r"(?P<vendor>clang|Apple LLVM) version (?P<major_version>[0-9]+)"
-            r"\.(?P<minor_version>[0-9]+)\.(?P<patch_version>[0-9]+)")
-
-        self.clang_installed_dir_pattern = \
-            r"InstalledDir: (?P<installed_dir>[^\s]*)"
+        self.clang_version_pattern = CLANG_VERSION_PATTERN
+        self.clang_installed_dir_pattern = CLANG_INSTALLED_DIR_PATTERN
 
     def parse(self, version_string):
         """Try to parse the version string using the predefined patterns."""
-        version_match = re.search(self.clang_version_pattern, version_string)
-        installed_dir_match = re.search(
-            self.clang_installed_dir_pattern, version_string)
+        version_match = self.clang_version_pattern.search(version_string)
+        installed_dir_match = \
+            self.clang_installed_dir_pattern.search(version_string)
 
         if not version_match or not installed_dir_match:
             return False
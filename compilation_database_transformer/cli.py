@@ -12,14 +12,43 @@ compile command databases.
 """
 
 import argparse
+import functools
+import json
 import operator
 import shlex
-import subprocess
 import sys
 
-from compilation_database_transformer.build_action import BuildAction
-from compilation_database_transformer.log_parser import parse_unique_log
-from compilation_database_transformer.pipeline import JsonPipeline
+# The modules used only by some of the commands are imported by their
+# handlers, so the tool starts fast for the other commands.
+from compilation_database_transformer.pipeline import JsonPipeline, \
+    Pipeline, chunked
+from compilation_database_transformer.shard import in_shard, parse_shard, \
+    select_shard
+from compilation_database_transformer.staging import DEFAULT_QUEUE_SIZE
+
+# The number of entries of a database parsed together by a worker process of
+# clangify.
+CLANGIFY_CHUNK_SIZE = 64
+
+
+def append_shard_filter(pipeline, args):
+    """
+    Append a step to the pipeline, which keeps only the entries of the shard
+    given on the command line.
+    """
+    if args.shard is None:
+        return pipeline
+    return pipeline.append_filter(functools.partial(in_shard, args.shard))
+
+
+def json_pipeline(args):
+    """
+    Create a JsonPipeline for the input and output given on the command line.
+    """
+    return JsonPipeline(args.output, lazy=args.stream, stream=args.stream,
+                        compact=args.compact,
+                        instrument=args.timings is not None,
+                        staged=args.staged, queue_size=args.queue_size)
 
 
 def handle_print(args):
@@ -27,23 +56,104 @@ def handle_print(args):
     Pretty print the input json.
     """
 
-    JsonPipeline(args.output) \
-        .flatten() \
-        .feed(args.input)
+    pipeline = append_shard_filter(json_pipeline(args).flatten(), args)
+    pipeline.feed(args.input)
+    return pipeline
+
+
+# The state of a clangify worker process, which is shared by the chunks
+# parsed by it.
+CLANGIFY_WORKER = {}
+
+
+def init_clangify_worker(compiler_cache):
+    """
+    Create the parse cache and the compiler probe threads of a clangify
+    worker process.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from compilation_database_transformer.log_parser import \
+        DEFAULT_PROBE_WORKERS, OptionParseCache
+
+    CLANGIFY_WORKER.update(
+        parse_cache=OptionParseCache(),
+        probe_executor=ThreadPoolExecutor(DEFAULT_PROBE_WORKERS),
+        compiler_cache=compiler_cache)
+
+
+def clangify_chunk(entries):
+    """
+    Parse a chunk of entries in a clangify worker process. Return the build
+    actions, and the implicit information of the compilers probed by the
+    worker so far, which is written by the parent process.
+    """
+    from compilation_database_transformer.log_parser import \
+        ImplicitCompilerInfo, parse_unique_log
+
+    build_actions, _ = parse_unique_log(entries, None, **CLANGIFY_WORKER)
+    return build_actions, ImplicitCompilerInfo.get()
+
+
+def merge_compiler_info(compiler_info, chunk_result):
+    """
+    Merge the compiler information of a parsed chunk into compiler_info, and
+    return the build actions of the chunk.
+    """
+    build_actions, chunk_info = chunk_result
+    for compiler, languages in chunk_info.items():
+        compiler_info.setdefault(compiler, {}).update(languages)
+    return build_actions
 
 
 def handle_clangify(args):
     """
     Make every entry in every compilation database clang-compatible.
     """
+    from compilation_database_transformer.build_action import BuildAction
+    from compilation_database_transformer.compiler_cache import \
+        CompilerCache
+    from compilation_database_transformer.log_parser import \
+        dump_compiler_info, parse_unique_log
+
+    pipeline = json_pipeline(args)
+    if args.shard is not None:
+        pipeline.append_map(functools.partial(select_shard, args.shard))
+
+    compiler_cache = None if args.no_compiler_cache else CompilerCache()
 
-    JsonPipeline(args.output) \
-        .append_map(lambda x: parse_unique_log(x, './')) \
-        .append_map(operator.itemgetter(0)) \
+    if args.jobs > 1:
+        # The entries of every database are parsed in chunks by the worker
+        # processes, and the build actions of the chunks are uniqued
+        # together, like parse_unique_log uniques a whole database. The
+        # workers only collect the compiler information, which is written
+        # once after every database is parsed.
+        compiler_info = {}
+        pipeline.append_pipe_map(
+            Pipeline(lazy=args.stream)
+            .append_transform(functools.partial(
+                chunked, size=CLANGIFY_CHUNK_SIZE))
+            .append_parallel_map(clangify_chunk, workers=args.jobs,
+                                 initializer=init_clangify_worker,
+                                 initargs=(compiler_cache,))
+            .append_map(functools.partial(merge_compiler_info,
+                                          compiler_info))
+            .flatten()
+            .append_unique(BuildAction.uniqueing_key))
+    else:
+        pipeline \
+            .append_map(functools.partial(parse_unique_log, report_dir='./',
+                                          compiler_cache=compiler_cache)) \
+            .append_map(operator.itemgetter(0))
+
+    pipeline \
         .flatten() \
         .append_map(BuildAction.to_analyzer_dict) \
         .feed(args.input)
 
+    if args.jobs > 1:
+        dump_compiler_info('./', compiler_info)
+    return pipeline
+
 
 def swap_comp_to_clang(entry):
     command = entry['command']
@@ -57,30 +167,69 @@ def swap_comp_to_clang(entry):
     }
 
 
+def check_result(entry, returncode, outs, errs):
+    """
+    Create the result of a compilation check from the outcome of the
+    compiler process.
+    """
+    if returncode == 0:
+        status = 'OK'
+        message = outs
+    else:
+        status = 'FAIL'
+        message = errs
+
+    return {
+        'file': entry['file'],
+        'status': status,
+        'message': message.decode('utf-8', errors='ignore')
+    }
+
+
+def check_exception(entry, exception):
+    """
+    Create the result of a compilation check which could not be executed.
+    """
+    return {
+        'file': entry['file'],
+        'status': 'EXCEPTION',
+        'message': str(exception)
+    }
+
+
 def check_command_validity(entry):
+    import subprocess
+
     try:
         proc = subprocess.Popen(
-            entry['command'],
+            shlex.split(entry['command']),
+            cwd=entry['directory'],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE)
         outs, errs = proc.communicate()
-        error_code = proc.returncode
-
-        if error_code == 0:
-            status = 'OK'
-            message = outs
-        else:
-            status = 'FAIL'
-            message = errs
+        return check_result(entry, proc.returncode, outs, errs)
     except Exception as e:
-        status = 'EXCEPTION'
-        message = str(e)
+        return check_exception(entry, e)
 
-    return {
-        'file': entry['file'],
-        'status': status,
-        'message': message
-    }
+
+async def check_command_validity_async(entry):
+    """
+    Same as check_command_validity, but waits for the compiler process
+    without blocking the event loop, so several checks can run concurrently.
+    """
+    import asyncio
+    import subprocess
+
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *shlex.split(entry['command']),
+            cwd=entry['directory'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        outs, errs = await proc.communicate()
+        return check_result(entry, proc.returncode, outs, errs)
+    except Exception as e:
+        return check_exception(entry, e)
 
 
 def handle_check(args):
@@ -88,11 +237,40 @@ def handle_check(args):
     Swap compiler binary to clang or clang++, and execute the compilation.
     """
 
-    JsonPipeline(args.output) \
-        .flatten() \
-        .append_map(swap_comp_to_clang) \
-        .append_map(check_command_validity) \
-        .feed(args.input)
+    pipeline = append_shard_filter(json_pipeline(args).flatten(), args) \
+        .append_map(swap_comp_to_clang)
+
+    if args.jobs > 1:
+        # The checks mostly wait for the compiler processes, so they run
+        # concurrently on an event loop instead of in worker processes.
+        pipeline.append_async_map(check_command_validity_async, args.jobs)
+    else:
+        pipeline.append_map(check_command_validity)
+
+    journal_path = args.checkpoint or args.resume
+    if journal_path is None:
+        pipeline.feed(args.input)
+        return pipeline
+
+    from compilation_database_transformer.checkpoint import Journal
+
+    with Journal(journal_path, resume=args.resume is not None) as journal:
+        pipeline.checkpoint(journal).feed(args.input)
+    return pipeline
+
+
+def handle_merge_shards(args):
+    """
+    Merge the outputs of the shards of a command into the order of the
+    original compilation database.
+    """
+    from compilation_database_transformer.shard import merge_shards
+
+    order = json.load(args.order)
+    pipeline = json_pipeline(args) \
+        .append_transform(functools.partial(merge_shards, order))
+    pipeline.feed(args.input)
+    return pipeline
 
 
 def main():
@@ -100,7 +278,7 @@ def main():
     argparser.add_argument(
         'command',
         nargs='?',
-        choices=['print', 'clangify', 'check'],
+        choices=['print', 'clangify', 'check', 'merge-shards'],
         default='print')
 
     argparser.add_argument(
@@ -115,14 +293,107 @@ def main():
         type=argparse.FileType('w'),
         default=sys.stdout)
 
+    argparser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help="Number of entries processed in parallel by the per-entry "
+             "steps.")
+
+    argparser.add_argument(
+        '--stream',
+        action='store_true',
+        help="Decode the input incrementally and process the entries one at "
+             "a time instead of loading the whole database into memory.")
+
+    argparser.add_argument(
+        '--compact',
+        action='store_true',
+        help="Write the output JSON without indentation and whitespace.")
+
+    argparser.add_argument(
+        '--staged',
+        action='store_true',
+        help="Run every step of the pipeline in its own thread, so reading, "
+             "processing and writing the entries overlap.")
+
+    argparser.add_argument(
+        '--queue-size',
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help="Number of entries which may wait between two steps of a "
+             "staged pipeline.")
+
+    argparser.add_argument(
+        '--timings',
+        nargs='?',
+        choices=['table', 'json'],
+        const='table',
+        help="Print the time spent in each step of the pipeline, and the "
+             "number of entries processed by it to the standard error.")
+
+    argparser.add_argument(
+        '--shard',
+        metavar='INDEX/COUNT',
+        type=parse_shard,
+        help="Process only one of COUNT disjoint shards of the entries, "
+             "selected by the directory and the file of the entries. The "
+             "index of the first shard is 0. The outputs of the shards can "
+             "be combined with merge-shards.")
+
+    argparser.add_argument(
+        '--order',
+        type=argparse.FileType('r'),
+        help="The original compilation database, which gives the order of "
+             "the results merged by merge-shards. The outputs of the shards "
+             "have to be given as input in the order of the shard indices.")
+
+    argparser.add_argument(
+        '--no-compiler-cache',
+        action='store_true',
+        help="Probe every compiler again instead of using the results of the "
+             "previous runs stored in $XDG_CACHE_HOME/ccdb-tool. Used by "
+             "the clangify command.")
+
+    journal_group = argparser.add_mutually_exclusive_group()
+    journal_group.add_argument(
+        '--checkpoint',
+        metavar='JOURNAL',
+        help="Record the result of every compilation check in the journal "
+             "file, so an interrupted check can be resumed.")
+
+    journal_group.add_argument(
+        '--resume',
+        metavar='JOURNAL',
+        help="Resume an interrupted check from the journal file, skipping "
+             "the entries which were already checked, and continue "
+             "recording the results in it.")
+
     args = argparser.parse_args()
 
+    if (args.checkpoint or args.resume) and args.command != 'check':
+        argparser.error("--checkpoint and --resume are only supported by "
+                        "the check command.")
+
+    if args.command == 'merge-shards':
+        if args.order is None:
+            argparser.error("merge-shards requires --order.")
+        if args.shard is not None:
+            argparser.error("--shard is not supported by merge-shards.")
+
     if args.command == 'print':
-        handle_print(args)
+        pipeline = handle_print(args)
     elif args.command == 'clangify':
-        handle_clangify(args)
+        pipeline = handle_clangify(args)
+    elif args.command == 'check':
+        pipeline = handle_check(args)
     else:
-        handle_check(args)
+        pipeline = handle_merge_shards(args)
+
+    if args.timings:
+        from compilation_database_transformer.instrumentation import \
+            format_stats
+        print(format_stats(pipeline.stats, args.timings), file=sys.stderr)
 
 
 if __name__ == '__main__':
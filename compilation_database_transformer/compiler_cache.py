@@ -0,0 +1,237 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Persistent cache of the version and the implicit information of the
+compilers, which is shared by the runs of ccdb-tool.
+"""
+
+from collections import defaultdict
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from compilation_database_transformer import path_lookup
+from compilation_database_transformer.clangsa_version import \
+    ClangVersionInfo
+from compilation_database_transformer.util import stable_digest
+
+LOG = logging.getLogger('compiler_cache')
+
+# Incremented when the format of the cached records changes.
+CACHE_FORMAT = 2
+
+
+def default_cache_dir():
+    """
+    Return the default cache directory, which is ccdb-tool in the XDG cache
+    directory.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'ccdb-tool')
+
+
+def resolve_compiler(compiler, path=None):
+    """
+    Return the resolved real path of the compiler binary, and the name of the
+    compiler if the binary is ccache, which selects the compiler by the name
+    it is invoked with. Return None if the binary is not found.
+
+    path -- The search path of the binary, os.environ['PATH'] by default.
+    """
+    binary = path_lookup.which(compiler, path)
+    if binary is None:
+        return None
+
+    real_path = os.path.realpath(binary)
+    name = os.path.basename(compiler) \
+        if os.path.basename(real_path) == 'ccache' else ''
+    return real_path, name
+
+
+class CompilerCache(object):
+    """
+    Cache the results of probing the compilers in a directory. The records
+    are keyed by the fingerprint of the compiler binary, i.e. its resolved
+    real path, size, modification time and inode, so the names of the same
+    binary (e.g. cc, gcc and gcc-7) share the records, and a changed binary
+    is probed again. The content of the binary is not read, so
+    fingerprinting costs a single stat call.
+
+    Every record is a separate file, which is replaced atomically, so
+    concurrent runs can use the same directory. The methods can be called
+    from several threads.
+    """
+
+    __slots__ = ['directory', 'hits', 'misses', '_fingerprints', '_records',
+                 '_lock']
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_cache_dir()
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints = {}
+        self._records = {}
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        # The cache is sent to the worker processes without its lock.
+        return {slot: getattr(self, slot) for slot in self.__slots__
+                if slot != '_lock'}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+        self._lock = threading.RLock()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def fingerprint(self, compiler):
+        """
+        Return the fingerprint of the compiler binary, or None if the binary
+        is not found.
+        """
+        with self._lock:
+            if compiler not in self._fingerprints:
+                self._fingerprints[compiler] = self._fingerprint(compiler)
+            return self._fingerprints[compiler]
+
+    def _fingerprint(self, compiler):
+        fingerprint = None
+        resolved = resolve_compiler(compiler)
+        if resolved is not None:
+            real_path, name = resolved
+            try:
+                status = os.stat(real_path)
+                fingerprint = stable_digest(
+                    [CACHE_FORMAT, name, real_path, status.st_size,
+                     status.st_mtime_ns, status.st_ino])
+            except OSError as ex:
+                LOG.debug("Failed to fingerprint compiler %s: %s",
+                          compiler, ex)
+
+        return fingerprint
+
+    def _load(self, name):
+        """Return the record with the given name, or None."""
+        if name in self._records:
+            return self._records[name]
+
+        record = None
+        try:
+            with open(os.path.join(self.directory, name + '.json'),
+                      encoding='utf-8', errors='ignore') as handle:
+                record = json.load(handle)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as ex:
+            LOG.warning("Failed to read compiler cache record %s: %s",
+                        name, ex)
+
+        if not isinstance(record, dict):
+            record = None
+        self._records[name] = record
+        return record
+
+    def _store(self, name, record):
+        """
+        Write the record with the given name. The file is written under a
+        temporary name first, so the readers never see a partial record.
+        """
+        with self._lock:
+            self._records[name] = record
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(
+                prefix='.' + name, suffix='.tmp', dir=self.directory)
+            try:
+                with os.fdopen(handle, 'w', encoding='utf-8') as temp:
+                    json.dump(record, temp)
+                os.replace(temp_path, os.path.join(self.directory,
+                                                   name + '.json'))
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        except OSError as ex:
+            LOG.warning("Failed to write compiler cache record %s: %s",
+                        name, ex)
+
+    def _lookup(self, name, key):
+        with self._lock:
+            record = self._load(name) if name else None
+            if record is None or key not in record:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return record[key]
+
+    def _version_record(self, compiler):
+        fingerprint = self.fingerprint(compiler)
+        return fingerprint and fingerprint + '-version'
+
+    def _info_record(self, compiler, variant):
+        fingerprint = self.fingerprint(compiler)
+        return fingerprint and \
+            fingerprint + '-' + stable_digest(variant, digest_size=8)
+
+    def get_version(self, compiler):
+        """
+        Return the cached clang version information of the compiler, False
+        if the compiler is not clang, or None if it is not cached.
+        """
+        version = self._lookup(self._version_record(compiler), 'version')
+        if not version:
+            return version
+
+        try:
+            return ClangVersionInfo(**version)
+        except (TypeError, ValueError) as ex:
+            LOG.warning("Invalid cached version of compiler %s: %s",
+                        compiler, ex)
+            return None
+
+    def put_version(self, compiler, version_info):
+        """
+        Cache the clang version information of the compiler, which is False
+        if the compiler is not clang.
+        """
+        name = self._version_record(compiler)
+        if not name:
+            return
+
+        if isinstance(version_info, ClangVersionInfo):
+            version_info = vars(version_info)
+        elif version_info is not False:
+            return
+        self._store(name, {'compiler': compiler, 'version': version_info})
+
+    def get_info(self, compiler, variant):
+        """
+        Return the cached implicit information of the compiler, or None if
+        it is not cached.
+
+        variant -- The compiler flags which affect the implicit information.
+        """
+        info = self._lookup(self._info_record(compiler, variant), 'info')
+        return info if info is None else defaultdict(dict, info)
+
+    def put_info(self, compiler, variant, info):
+        """
+        Cache the implicit information of the compiler.
+
+        variant -- The compiler flags which affect the implicit information.
+        """
+        name = self._info_record(compiler, variant)
+        if name:
+            self._store(name, {'compiler': compiler, 'variant': variant,
+                               'info': info})
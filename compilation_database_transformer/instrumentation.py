@@ -0,0 +1,163 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Timing and throughput measurement of pipeline steps.
+"""
+
+import collections.abc
+import json
+import threading
+import time
+from typing import Any, Callable, Iterator, List
+
+
+def count_items(data: Any):
+    """
+    Return the number of items in a collection, or None if the data is not
+    a collection.
+    """
+    if isinstance(data, collections.abc.Sized) and \
+            not isinstance(data, (str, bytes)):
+        return len(data)
+    return None
+
+
+class StepStats(object):
+    """
+    The measurements of a single pipeline step. The times are exclusive,
+    i.e. the time spent in the previous steps while this step pulls its
+    input from them in a lazy pipeline is not included.
+    """
+
+    __slots__ = ['label', 'wall_time', 'cpu_time', 'items_out', 'queue_peak',
+                 'upstream', '_items_in']
+
+    def __init__(self, label: str, upstream: 'StepStats' = None):
+        self.label = label
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.items_out = None
+        self.queue_peak = None
+        self.upstream = upstream
+        self._items_in = None
+
+    @property
+    def items_in(self):
+        """The number of items this step received."""
+        if self.upstream is not None:
+            return self.upstream.items_out
+        return self._items_in
+
+    @items_in.setter
+    def items_in(self, value):
+        self._items_in = value
+
+    def to_dict(self):
+        result = {'step': self.label,
+                  'wall_time': self.wall_time,
+                  'cpu_time': self.cpu_time,
+                  'items_in': self.items_in,
+                  'items_out': self.items_out}
+        if self.queue_peak is not None:
+            result['queue_peak'] = self.queue_peak
+        return result
+
+
+class StepClock(object):
+    """
+    Measure the exclusive time of nested step executions. In a lazy
+    pipeline a step pulls its input from the previous step while it is
+    running, so the time measured for the inner execution is subtracted
+    from the outer one. The CPU time is measured per thread.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def run(self, stats: StepStats, func: Callable, *args):
+        """Call the function and account the time spent in it to stats."""
+        stack = self._stack()
+        stack.append([0.0, 0.0])
+        start_wall = time.perf_counter()
+        start_cpu = time.thread_time()
+        try:
+            return func(*args)
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.thread_time() - start_cpu
+            nested_wall, nested_cpu = stack.pop()
+            stats.wall_time += wall - nested_wall
+            stats.cpu_time += cpu - nested_cpu
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+
+    def measure_iterator(self, stats: StepStats, iterator: Iterator):
+        """
+        Yield the items of the iterator, while accounting the time spent in
+        producing them, and counting them.
+        """
+        next_item = iterator.__next__
+        while True:
+            try:
+                item = self.run(stats, next_item)
+            except StopIteration:
+                return
+            stats.items_out += 1
+            yield item
+
+    def measure(self, stats: StepStats, step: Callable, source: Any):
+        """
+        Execute a pipeline step with the measurements enabled. If the step
+        returns an iterator, the measurement continues while the items are
+        produced.
+        """
+        result = self.run(stats, step, source)
+        if isinstance(result, collections.abc.Iterator):
+            stats.items_out = 0
+            return self.measure_iterator(stats, result)
+
+        stats.items_out = count_items(result)
+        return result
+
+
+def format_stats(stats: List[StepStats], output_format: str = 'table'):
+    """
+    Format the measurements of the pipeline steps as a table or as JSON. The
+    peak number of items queued after the steps is only shown for staged
+    pipelines.
+    """
+    if output_format == 'json':
+        return json.dumps([step.to_dict() for step in stats], indent=2)
+
+    def show(value):
+        return '-' if value is None else str(value)
+
+    staged = any(step.queue_peak is not None for step in stats)
+
+    rows = [('step', 'wall [s]', 'cpu [s]', 'items in', 'items out') +
+            (('queue peak',) if staged else ())]
+    rows.extend((step.label,
+                 '{0:.6f}'.format(step.wall_time),
+                 '{0:.6f}'.format(step.cpu_time),
+                 show(step.items_in),
+                 show(step.items_out)) +
+                ((show(step.queue_peak),) if staged else ())
+                for step in stats)
+
+    widths = [max(len(row[column]) for row in rows)
+              for column in range(len(rows[0]))]
+
+    return '\n'.join(
+        '  '.join([row[0].ljust(widths[0])] +
+                  [cell.rjust(width)
+                   for cell, width in zip(row[1:], widths[1:])])
+        for row in rows)
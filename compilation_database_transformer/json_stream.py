@@ -0,0 +1,272 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Incremental processing of JSON documents which contain a top-level array,
+like compilation databases.
+"""
+
+import codecs
+import io
+import json
+import mmap
+import os
+import stat
+import time
+from typing import IO, Iterable, Iterator
+
+from compilation_database_transformer.util import LazyPattern
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+# The maximal number of seconds the serialized elements may wait in the
+# buffer of the writer.
+DEFAULT_FLUSH_INTERVAL = 0.1
+
+WHITESPACE = LazyPattern(r'[ \t\n\r]*')
+
+# The characters which may follow an element of an array.
+DELIMITERS = frozenset(' \t\n\r,]')
+
+
+def _is_regular_file(source: IO):
+    """
+    Return True if the source is backed by a non-empty regular file, which
+    can be memory mapped.
+    """
+    try:
+        status = os.fstat(source.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+
+    return stat.S_ISREG(status.st_mode) and status.st_size > 0
+
+
+def read_chunks(source: IO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Yield the content of the source as text chunks. Regular files are memory
+    mapped and decoded from the beginning, other streams (e.g. the standard
+    input) are read chunk by chunk from their current position. Invalid
+    encoded content raises UnicodeDecodeError, like reading the source
+    directly, unless the source was opened with other error handling.
+    """
+    encoding = getattr(source, 'encoding', None) or 'utf-8'
+    errors = getattr(source, 'errors', None) or 'strict'
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+
+    if _is_regular_file(source):
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(0, len(mapped), chunk_size):
+                yield decoder.decode(mapped[offset:offset + chunk_size])
+    else:
+        chunk = source.read(chunk_size)
+        while chunk:
+            yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+            chunk = source.read(chunk_size)
+
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+class JsonArrayReader:
+    """
+    Decode the elements of a top-level JSON array one at a time, without
+    reading the whole document into memory. Only the currently decoded
+    element and the unprocessed part of the last chunk are kept in memory.
+    """
+
+    def __init__(self, source: IO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._chunks = read_chunks(source, chunk_size)
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+
+    def _fill(self):
+        """
+        Append the next chunk to the buffer, and drop the already processed
+        part of it. Return False at the end of the input.
+        """
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """
+        Skip whitespace and return the next character without consuming it,
+        or an empty string at the end of the input.
+        """
+        while True:
+            whitespace = WHITESPACE.compiled().match(self._buffer, self._pos)
+            self._pos = whitespace.end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _error(self, message: str):
+        return json.JSONDecodeError(message, self._buffer, self._pos)
+
+    def _decode_value(self):
+        """
+        Decode the next value. If the value is not complete in the buffer,
+        more chunks are read until it is.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+
+            # A number at the end of the buffer may continue in the next
+            # chunk, e.g. "1.5" may be followed by "e10".
+            if (end == len(self._buffer) or
+                    self._buffer[end] not in DELIMITERS) and self._fill():
+                continue
+
+            self._pos = end
+            return value
+
+    def _expect_end(self):
+        if self._peek():
+            raise self._error("Extra data")
+
+    def __iter__(self) -> Iterator:
+        if self._peek() != '[':
+            raise self._error("Expecting '['")
+        self._pos += 1
+
+        if self._peek() == ']':
+            self._pos += 1
+            self._expect_end()
+            return
+
+        while True:
+            yield self._decode_value()
+
+            delimiter = self._peek()
+            self._pos += 1
+            if delimiter == ']':
+                break
+            if delimiter != ',':
+                self._pos -= 1
+                raise self._error("Expecting ',' delimiter")
+
+        self._expect_end()
+
+
+def iter_json_array(source: IO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Yield the elements of the top-level JSON array in source one at a time.
+    """
+    return iter(JsonArrayReader(source, chunk_size))
+
+
+class JsonArrayWriter:
+    """
+    Serialize a JSON array element by element. The opening bracket is written
+    before the first element arrives, and the closing bracket when the writer
+    is closed. The output is the same as the output of json.dump with two
+    spaces of indentation, or without any whitespace in compact mode.
+
+    The serialized elements are collected in a buffer which is written to the
+    output in large blocks. The buffer is also written when the first element
+    arrives, and when an element arrives after the buffered ones waited for
+    longer than the flush interval, so the consumers of the output see the
+    results early. The interval is only checked when an element is written,
+    so a slow producer delays a due flush until its next element.
+
+    Used as a context manager, the array is closed only if no exception was
+    raised, so an interrupted output is not mistaken for a complete one.
+    """
+
+    def __init__(self, output: IO, compact: bool = False,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.output = output
+        self.count = 0
+        self._buffer_size = buffer_size
+        self._flush_interval = flush_interval
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+        if compact:
+            self._encoder = json.JSONEncoder(separators=(',', ':'))
+            self._separator = ','
+            self._indentation = None
+            self._closing = ']'
+        else:
+            self._encoder = json.JSONEncoder(indent=2)
+            self._separator = ',\n  '
+            self._indentation = '\n  '
+            self._closing = '\n]'
+
+    def _append(self, text: str):
+        self._buffer.append(text)
+        self._buffered += len(text)
+
+    def flush(self):
+        """Write the buffered text to the output and flush it."""
+        self.output.write(''.join(self._buffer))
+        self.output.flush()
+        self._buffer = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+
+    def write(self, element):
+        """Serialize an element of the array."""
+        text = self._encoder.encode(element)
+        if self._indentation:
+            # JSON strings can not contain a raw newline, so every newline
+            # separates lines of the serialized element.
+            text = text.replace('\n', self._indentation)
+
+        if self.count:
+            self._append(self._separator)
+        else:
+            self._append('[' + (self._indentation or ''))
+        self._append(text)
+        self.count += 1
+
+        if self.count == 1 or self._buffered >= self._buffer_size or \
+                time.monotonic() - self._last_flush >= self._flush_interval:
+            self.flush()
+
+    def close(self):
+        """Close the array and write everything to the output."""
+        self._append(self._closing if self.count else '[]')
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        else:
+            self.flush()
+
+
+def write_json_array(elements: Iterable, output: IO, compact: bool = False,
+                     buffer_size: int = DEFAULT_BUFFER_SIZE):
+    """
+    Serialize the elements to the output as a JSON array while they are
+    produced. Return the number of elements written.
+    """
+    with JsonArrayWriter(output, compact, buffer_size) as writer:
+        for element in elements:
+            writer.write(element)
+
+    return writer.count
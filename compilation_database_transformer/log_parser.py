@@ -5,11 +5,11 @@
 # -------------------------------------------------------------------------
 
 
-from collections import defaultdict
-# pylint: disable=no-name-in-module
-from distutils.spawn import find_executable
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 
-import glob
+import copy
+import functools
 import json
 import logging
 import os
@@ -23,8 +23,13 @@ import traceback
 from compilation_database_transformer.build_action import BuildAction
 from compilation_database_transformer.clangsa_version \
     import get as clangsa_version_get
-from compilation_database_transformer import gcc_toolchain
-from compilation_database_transformer.util import load_json_or_empty
+from compilation_database_transformer import gcc_toolchain, path_lookup
+from compilation_database_transformer.compiler_cache import resolve_compiler
+from compilation_database_transformer.probe_cache import ProbeCache
+from compilation_database_transformer.response_file import \
+    ResponseFileCache
+from compilation_database_transformer.util import LazyPattern, \
+    load_json_or_empty, stable_digest_bytes
 
 LOG = logging.getLogger('buildlogger')
 
@@ -156,30 +161,30 @@ IGNORED_OPTIONS_GCC = [
     '-mabi'
 ]
 
-IGNORED_OPTIONS_GCC = re.compile('|'.join(IGNORED_OPTIONS_GCC))
-IGNORED_OPTIONS_CLANG = re.compile('|'.join(IGNORED_OPTIONS_CLANG))
+IGNORED_OPTIONS_GCC = LazyPattern('|'.join(IGNORED_OPTIONS_GCC))
+IGNORED_OPTIONS_CLANG = LazyPattern('|'.join(IGNORED_OPTIONS_CLANG))
 
 # The compilation flags of which the prefix is any of these regular expressions
 # will not be included in the output Clang command. These flags have further
 # parameters which are also omitted. The number of parameters is indicated in
 # this dictionary.
 IGNORED_PARAM_OPTIONS = {
-    re.compile('-install_name'): 1,
-    re.compile('-exported_symbols_list'): 1,
-    re.compile('-current_version'): 1,
-    re.compile('-compatibility_version'): 1,
-    re.compile('-init$'): 1,
-    re.compile('-e$'): 1,
-    re.compile('-seg1addr'): 1,
-    re.compile('-bundle_loader'): 1,
-    re.compile('-multiply_defined'): 1,
-    re.compile('-sectorder'): 3,
-    re.compile('--param$'): 1,
-    re.compile('-u$'): 1,
-    re.compile('--serialize-diagnostics'): 1,
-    re.compile('-framework'): 1,
+    LazyPattern('-install_name'): 1,
+    LazyPattern('-exported_symbols_list'): 1,
+    LazyPattern('-current_version'): 1,
+    LazyPattern('-compatibility_version'): 1,
+    LazyPattern('-init$'): 1,
+    LazyPattern('-e$'): 1,
+    LazyPattern('-seg1addr'): 1,
+    LazyPattern('-bundle_loader'): 1,
+    LazyPattern('-multiply_defined'): 1,
+    LazyPattern('-sectorder'): 3,
+    LazyPattern('--param$'): 1,
+    LazyPattern('-u$'): 1,
+    LazyPattern('--serialize-diagnostics'): 1,
+    LazyPattern('-framework'): 1,
     # Darwin linker can be given a file with lists the sources for linking.
-    re.compile('-filelist'): 1
+    LazyPattern('-filelist'): 1
 }
 
 
@@ -198,7 +203,7 @@ COMPILE_OPTIONS = [
     '--gcc-toolchain='
 ]
 
-COMPILE_OPTIONS = re.compile('|'.join(COMPILE_OPTIONS))
+COMPILE_OPTIONS = LazyPattern('|'.join(COMPILE_OPTIONS))
 
 COMPILE_OPTIONS_MERGED = [
     '--sysroot',
@@ -233,16 +238,65 @@ XCLANG_FLAGS_TO_SKIP = ['-module-file-info',
                         '-rewrite-objc']
 
 COMPILE_OPTIONS_MERGED = \
-    re.compile('(' + '|'.join(COMPILE_OPTIONS_MERGED) + ')')
+    LazyPattern('(' + '|'.join(COMPILE_OPTIONS_MERGED) + ')')
 
 INCLUDE_OPTIONS_MERGED = \
-    re.compile('(' + '|'.join(INCLUDE_OPTIONS_MERGED) + ')')
+    LazyPattern('(' + '|'.join(INCLUDE_OPTIONS_MERGED) + ')')
 
 
-PRECOMPILATION_OPTION = re.compile('-(E|M[G|T|Q|F|J|P|V|M]*)$')
+# The .plist file contains a section with a list of files. For some
+# further actions these need to be given with an absolute path. Clang
+# prints them with absolute path if the original compiler invocation
+# was given absolute paths.
+# TODO: If Clang will be extended with an extra analyzer option in
+# order to print these absolute paths natively, this conversion will
+# not be necessary.
+FLAGS_WITH_PATH = frozenset(['-I', '-idirafter', '-imultilib',
+                             '-iquote', '-isysroot', '-isystem',
+                             '-iwithprefix', '-iwithprefixbefore', '-sysroot',
+                             '--sysroot'])
+
+# The placeholders of the source file and the output in the cached compile
+# commands. They do not start with a dash, so they are skipped like the
+# source files.
+PLACEHOLDER_MARK = '\0'
+SOURCE_PLACEHOLDER = PLACEHOLDER_MARK + 'source'
+OUTPUT_PLACEHOLDER = PLACEHOLDER_MARK + 'output'
+
+DEFAULT_PARSE_CACHE_SIZE = 4096
+
+# The number of threads probing the compilers in the background.
+DEFAULT_PROBE_WORKERS = 8
+
+# The number of entries read ahead of the parsing to find the compilers to
+# probe in the background.
+PREFETCH_WINDOW = 256
+
+# The include directories are the same for many compile commands, so they
+# are examined only once in a run.
+PROBE_CACHE = ProbeCache()
+
+# The response files are often shared by many compile commands, so they are
+# read only once in a run.
+RESPONSE_FILE_CACHE = ResponseFileCache()
+
+# Characters which need the full shell-like splitting of shlex.
+SHELL_QUOTING = LazyPattern(r'[\'"\\]')
+
+COMMAND_WORD = LazyPattern(r'[^ \t\r\n]+')
+
+PRECOMPILATION_OPTION = LazyPattern('-(E|M[G|T|Q|F|J|P|V|M]*)$')
+
+# The values of __STDC_VERSION__ and __cplusplus from which the versions of
+# the standards are detected.
+STDC_VERSIONS = [(201710, '17'), (201112, '11'), (199901, '99'),
+                 (199409, '94'), (0, '90')]
+
+CPLUSPLUS_VERSIONS = [(201703, '17'), (201402, '14'), (201103, '11'),
+                      (0, '98')]
 
 # Match for all of the compiler flags.
-CLANG_OPTIONS = re.compile('.*')
+CLANG_OPTIONS = LazyPattern('.*')
 
 
 def filter_compiler_includes_extra_args(compiler_flags):
@@ -274,15 +328,36 @@ class ImplicitCompilerInfo(object):
     This class helps to fetch and set some additional compiler flags which are
     implicitly added when using GCC.
     """
-    # TODO: This dict is mapping compiler to the corresponding information.
-    # It may not be enough to use the compiler as a key, because the implicit
-    # information depends on other data like language or target architecture.
+    # This dict is mapping compiler to the corresponding information, which
+    # is written to compiler_info.json. It contains the information of the
+    # first variant of every compiler.
     compiler_info = defaultdict(dict)
+    # The implicit information depends on the flags which affect the implicit
+    # include paths. This dict is mapping (compiler, language, variant) to
+    # the information, where the variant is the tuple of these flags.
+    variant_info = {}
+    # The number of probed variants, and the number of times the information
+    # of an already probed variant was used.
+    variant_probes = 0
+    variant_hits = 0
     compiler_isexecutable = {}
     # Store the already detected compiler version information.
     # If the value is False the compiler is not clang otherwise the value
-    # should be a clang version information object.
+    # should be a clang version information object. The compilers which were
+    # not probed yet are missing.
     compiler_versions = {}
+    # The version information of the resolved compiler binaries, which is
+    # shared by the names of the same binary.
+    binary_versions = {}
+    # The resolved binaries and the futures of the compilers which are probed
+    # in the background, see prefetch_compiler_info. The results are stored
+    # by wait_for_probe.
+    pending_probes = {}
+    # Futures of the version information of the resolved compiler binaries,
+    # which are probed in the background.
+    pending_versions = {}
+    # The CompilerCache of the probe results shared by the runs, if any.
+    compiler_cache = None
 
     @staticmethod
     def c():
@@ -296,7 +371,7 @@ class ImplicitCompilerInfo(object):
     def is_executable_compiler(compiler):
         if compiler not in ImplicitCompilerInfo.compiler_isexecutable:
             ImplicitCompilerInfo.compiler_isexecutable[compiler] = \
-                find_executable(compiler) is not None
+                path_lookup.which(compiler) is not None
 
         return ImplicitCompilerInfo.compiler_isexecutable[compiler]
 
@@ -306,6 +381,14 @@ class ImplicitCompilerInfo(object):
         Returns the stderr of a compiler invocation as string
         or None in case of error.
         """
+        return ImplicitCompilerInfo.__get_compiler_output(cmd)[1]
+
+    @staticmethod
+    def __get_compiler_output(cmd):
+        """
+        Returns the stdout and the stderr of a compiler invocation as strings
+        or a pair of None values in case of error.
+        """
         try:
             proc = subprocess.Popen(
                 shlex.split(cmd),
@@ -316,11 +399,11 @@ class ImplicitCompilerInfo(object):
                 encoding="utf-8",
                 errors="ignore")
 
-            _, err = proc.communicate("")
-            return err
+            return proc.communicate("")
         except OSError as oerr:
             LOG.error("Error during process execution: " + cmd + '\n' +
                       oerr.strerror + "\n")
+            return None, None
 
     @staticmethod
     def __parse_compiler_includes(lines):
@@ -386,7 +469,13 @@ class ImplicitCompilerInfo(object):
                     fetched.
         """
         lines = ImplicitCompilerInfo.__get_compiler_err(compiler + ' -v')
+        return ImplicitCompilerInfo.__parse_compiler_target(lines)
 
+    @staticmethod
+    def __parse_compiler_target(lines):
+        """
+        Parse the target triple from the verbose output of the compiler.
+        """
         if lines is None:
             return ""
 
@@ -468,6 +557,13 @@ class ImplicitCompilerInfo(object):
                 if finding:
                     standard = finding.group(1)
 
+        return ImplicitCompilerInfo.__standard_flag(standard, language)
+
+    @staticmethod
+    def __standard_flag(standard, language):
+        """
+        Returns the flag of the given standard version, e.g. '11' or '17'.
+        """
         if standard:
             if standard == '94':
                 # Special case for C94 standard.
@@ -479,6 +575,66 @@ class ImplicitCompilerInfo(object):
 
         return standard
 
+    @staticmethod
+    def __parse_compiler_standard(macros, language):
+        """
+        Returns the standard version from the predefined macros printed by
+        the compiler with -dM, using the same thresholds as
+        get_compiler_standard. Returns None if there are no macros.
+        """
+        if not macros or '#define ' not in macros:
+            return None
+
+        macro = '__STDC_VERSION__' if language == 'c' else '__cplusplus'
+        finding = re.search(r'^#define ' + macro + r' (\d+)L?\s*$', macros,
+                            re.MULTILINE)
+        value = int(finding.group(1)) if finding else 0
+
+        thresholds = STDC_VERSIONS if language == 'c' else CPLUSPLUS_VERSIONS
+        return next((standard for version, standard in thresholds
+                     if value >= version), thresholds[-1][1])
+
+    @staticmethod
+    def probe_language(compiler, language, compiler_flags):
+        """
+        Returns the implicit include paths, the target and the default
+        standard of the given compiler for the language, like
+        get_compiler_includes, get_compiler_target and get_compiler_standard.
+        They are collected by a single invocation of the compiler, which
+        prints the predefined macros in verbose mode.
+
+        The standard is probed separately if the flags could change it.
+
+        The language is given by -x, so a C++ driver (e.g. g++) probed for C
+        reports the default C standard. get_compiler_standard compiles a .c
+        file, which a C++ driver compiles as C++, so it reports -std=gnu90
+        for C in that case.
+        """
+        ICI = ImplicitCompilerInfo
+        extra_opts = filter_compiler_includes_extra_args(compiler_flags)
+        cmd = compiler + " " + ' '.join(extra_opts) \
+            + " -E -dM -x " + language + " - -v "
+
+        LOG.debug("Retrieving implicit compiler info via '" + cmd + "'")
+        out, err = ICI.__get_compiler_output(cmd)
+
+        include_dirs = ICI.__parse_compiler_includes(err)
+
+        target = ICI.__parse_compiler_target(err)
+
+        standard = None
+        if not any(opt.startswith('-std=') for opt in extra_opts):
+            standard = ICI.__parse_compiler_standard(out, language)
+        if standard is None:
+            standard = ICI.get_compiler_standard(compiler, language)
+        else:
+            standard = ICI.__standard_flag(standard, language)
+
+        return {'compiler_includes': list(map(os.path.normpath,
+                                              include_dirs)),
+                'target': target,
+                'compiler_standard': standard}
+
     @staticmethod
     def load_compiler_info(filename, compiler):
         """Load compiler information from a file."""
@@ -522,68 +678,142 @@ class ImplicitCompilerInfo(object):
             ICI.compiler_info[compiler][ICI.cpp()]['target'] = \
                 cpp_lang_data.get('target')
 
+    @staticmethod
+    def probe(compiler, compiler_flags):
+        """
+        Invoke the compiler to collect its implicit information for C and
+        C++, independently of the actual compilation language.
+
+        compiler -- The compiler binary to probe.
+        compiler_flags -- The flags used for compilation, which may affect
+                          the implicit include paths.
+        """
+        ICI = ImplicitCompilerInfo
+        cache = ICI.compiler_cache
+        variant = ICI.variant(compiler_flags)
+        if cache is not None:
+            info = cache.get_info(compiler, variant)
+            if info is not None:
+                return info
+
+        info = defaultdict(dict)
+        for lang in (ICI.c(), ICI.cpp()):
+            info[lang] = ICI.probe_language(compiler, lang, compiler_flags)
+
+        if cache is not None:
+            cache.put_info(compiler, variant, info)
+        return info
+
+    @staticmethod
+    def wait_for_probe(compiler):
+        """
+        Wait for the background probe of the compiler, if there is one, and
+        store its results.
+        """
+        ICI = ImplicitCompilerInfo
+        probe = ICI.pending_probes.pop(compiler, None)
+        if probe is None:
+            return
+
+        binary, future = probe
+        version_info, variant, info = future.result()
+        ICI.compiler_versions[compiler] = version_info
+        if binary is not None:
+            ICI.binary_versions[binary] = version_info
+            ICI.pending_versions.pop(binary, None)
+        if info is not None:
+            ICI.store_variant_info(compiler, variant, info)
+
+    @staticmethod
+    def variant(compiler_flags):
+        """
+        Return the variant of the compiler flags, i.e. the flags which affect
+        the implicit information of the compiler.
+        """
+        return tuple(filter_compiler_includes_extra_args(compiler_flags))
+
+    @staticmethod
+    def store_variant_info(compiler, variant, info):
+        """
+        Store the probed implicit information of a variant of the compiler.
+        """
+        ICI = ImplicitCompilerInfo
+        ICI.variant_probes += 1
+        for lang in (ICI.c(), ICI.cpp()):
+            ICI.variant_info[(compiler, lang, variant)] = info[lang]
+
+        if not ICI.compiler_info.get(compiler):
+            ICI.compiler_info[compiler] = info
+
+    @staticmethod
+    def get_variant_info(compiler, compiler_flags):
+        """
+        Return the implicit information of the compiler for C and C++, with
+        the given compiler flags. Every variant is probed only once.
+        """
+        ICI = ImplicitCompilerInfo
+        variant = ICI.variant(compiler_flags)
+        keys = [(compiler, lang, variant) for lang in (ICI.c(), ICI.cpp())]
+        if all(key in ICI.variant_info for key in keys):
+            ICI.variant_hits += 1
+        else:
+            ICI.store_variant_info(compiler, variant,
+                                   ICI.probe(compiler, compiler_flags))
+
+        return defaultdict(dict, ((key[1], ICI.variant_info[key])
+                                  for key in keys))
+
     @staticmethod
     def set(details, compiler_info_file=None):
         """Detect and set the impicit compiler information.
 
         If compiler_info_file is available the implicit compiler
         information will be loaded and set from it.
+
+        Return the implicit information of the compiler which was used.
         """
         ICI = ImplicitCompilerInfo
         compiler = details['compiler']
         if compiler_info_file and os.path.exists(compiler_info_file):
             # Compiler info file exists, load it.
             ICI.load_compiler_info(compiler_info_file, compiler)
+            compiler_data = ICI.compiler_info.get(compiler) or {}
         else:
             # Invoke compiler to gather implicit compiler info.
             # Independently of the actual compilation language in the
             # compile command collect the iformation for C and C++.
-            if not ICI.compiler_info.get(compiler):
-                ICI.compiler_info[compiler] = defaultdict(dict)
-
-                # Collect for C
-                ICI.compiler_info[compiler][ICI.c()]['compiler_includes'] = \
-                    ICI.get_compiler_includes(compiler, ICI.c(),
-                                              details['analyzer_options'])
-                ICI.compiler_info[compiler][ICI.c()]['target'] = \
-                    ICI.get_compiler_target(compiler)
-                ICI.compiler_info[compiler][ICI.c()]['compiler_standard'] = \
-                    ICI.get_compiler_standard(compiler, ICI.c())
-
-                # Collect for C++
-                ICI.compiler_info[compiler][ICI.cpp()]['compiler_includes'] = \
-                    ICI.get_compiler_includes(compiler, ICI.cpp(),
-                                              details['analyzer_options'])
-                ICI.compiler_info[compiler][ICI.cpp()]['target'] = \
-                    ICI.get_compiler_target(compiler)
-                ICI.compiler_info[compiler][ICI.cpp()]['compiler_standard'] = \
-                    ICI.get_compiler_standard(compiler, ICI.cpp())
-
-        def set_details_from_ICI(key, lang):
-            """Set compiler related information in the 'details' dictionary.
-
-            If the language dependent value is not set yet, get the compiler
-            information from ICI.
-            """
-
-            parsed_value = details[key].get(lang)
-            if parsed_value:
-                details[key][lang] = parsed_value
-            else:
-                # Only set what is available from ICI.
-                compiler_data = ICI.compiler_info.get(compiler)
-                if compiler_data:
-                    language_data = compiler_data.get(lang)
-                    if language_data:
-                        details[key][lang] = language_data.get(key)
+            compiler_data = \
+                ICI.get_variant_info(compiler, details['analyzer_options'])
 
-        set_details_from_ICI('compiler_includes', ICI.c())
-        set_details_from_ICI('compiler_standard', ICI.c())
-        set_details_from_ICI('target', ICI.c())
+        for lang in (ICI.c(), ICI.cpp()):
+            ICI.set_details_from_ICI(details, 'compiler_includes', lang,
+                                     compiler_data)
+            ICI.set_details_from_ICI(details, 'compiler_standard', lang,
+                                     compiler_data)
+            ICI.set_details_from_ICI(details, 'target', lang, compiler_data)
 
-        set_details_from_ICI('compiler_includes', ICI.cpp())
-        set_details_from_ICI('compiler_standard', ICI.cpp())
-        set_details_from_ICI('target', ICI.cpp())
+        return compiler_data
+
+    @staticmethod
+    def set_details_from_ICI(details, key, lang, compiler_data=None):
+        """Set compiler related information in the 'details' dictionary.
+
+        If the language dependent value is not set yet, get the compiler
+        information from ICI, or from compiler_data if it is given.
+        """
+
+        parsed_value = details[key].get(lang)
+        if parsed_value:
+            details[key][lang] = parsed_value
+        else:
+            # Only set what is available from ICI.
+            if compiler_data is None:
+                compiler_data = ImplicitCompilerInfo.compiler_info.get(
+                    details['compiler'])
+            if compiler_data:
+                language_data = compiler_data.get(lang)
+                if language_data:
+                    details[key][lang] = language_data.get(key)
 
     @staticmethod
     def get():
@@ -671,135 +901,98 @@ def __contains_no_intrinsic_headers(dirname):
     """
     Returns True if the given directory doesn't contain any intrinsic headers.
     """
-    if not os.path.exists(dirname):
-        return True
-    if glob.glob(os.path.join(dirname, "*intrin.h")):
-        return False
-    return True
+    return PROBE_CACHE.contains_no_intrinsic_headers(dirname)
 
 
-def __collect_clang_compile_opts(flag_iterator, details):
+def __collect_clang_compile_opts(flag_iterator, details, _):
     """Collect all the options for clang do not filter anything."""
-    if CLANG_OPTIONS.match(flag_iterator.item):
-        details['analyzer_options'].append(flag_iterator.item)
-        return True
+    details['analyzer_options'].append(flag_iterator.item)
 
 
-def __collect_transform_xclang_opts(flag_iterator, details):
+def __collect_transform_xclang_opts(flag_iterator, details, _):
     """Some specific -Xclang constucts need to be filtered out.
 
        To generate the proper plist reports and not LLVM IR or
        ASCII text as an output the flags need to be removed.
     """
-    if flag_iterator.item == "-Xclang":
-        next(flag_iterator)
-        next_flag = flag_iterator.item
-        if next_flag in XCLANG_FLAGS_TO_SKIP:
-            return True
+    next(flag_iterator)
+    next_flag = flag_iterator.item
+    if next_flag in XCLANG_FLAGS_TO_SKIP:
+        return
 
-        details['analyzer_options'].extend(["-Xclang", next_flag])
-        return True
+    details['analyzer_options'].extend(["-Xclang", next_flag])
 
-    return False
 
-
-def __collect_transform_include_opts(flag_iterator, details):
+def __collect_transform_include_opts(flag_iterator, details, flag):
     """
     This function collects the compilation (i.e. not linker or preprocessor)
-    flags to the buildaction.
+    flags to the buildaction. The flag is the matched option without its
+    parameter, which is either the rest of the current item, or the next
+    item.
     """
+    together = len(flag) != len(flag_iterator.item)
 
-    m = COMPILE_OPTIONS_MERGED.match(flag_iterator.item)
-
-    if m:
-        flag = m.group(0)
-        together = len(flag) != len(flag_iterator.item)
-
-        if together:
-            param = flag_iterator.item[len(flag):]
-        else:
-            next(flag_iterator)
-            param = flag_iterator.item
-
-        # The .plist file contains a section with a list of files. For some
-        # further actions these need to be given with an absolute path. Clang
-        # prints them with absolute path if the original compiler invocation
-        # was given absolute paths.
-        # TODO: If Clang will be extended with an extra analyzer option in
-        # order to print these absolute paths natively, this conversion will
-        # not be necessary.
-        flags_with_path = ['-I', '-idirafter', '-imultilib',
-                           '-iquote', '-isysroot', '-isystem',
-                           '-iwithprefix', '-iwithprefixbefore', '-sysroot',
-                           '--sysroot']
-        if flag in flags_with_path:
-            # --sysroot format can be --sysroot=/path/to/include
-            # in this case before the normalization the '='
-            # sign must be removed.
-            # We put back the original
-            # --sysroot=/path/to/include as
-            # --sysroot /path/to/include
-            # which is a valid format too.
-            if param.startswith("="):
-                param = param[1:]
-                together = False
-            param = os.path.normpath(
-                os.path.join(details['directory'], param))
-
-        if together:
-            details['analyzer_options'].append(flag + param)
-        else:
-            details['analyzer_options'].extend([flag, param])
-
-        return True
-    return False
+    if together:
+        param = flag_iterator.item[len(flag):]
+    else:
+        next(flag_iterator)
+        param = flag_iterator.item
+
+    if flag in FLAGS_WITH_PATH:
+        # --sysroot format can be --sysroot=/path/to/include
+        # in this case before the normalization the '='
+        # sign must be removed.
+        # We put back the original
+        # --sysroot=/path/to/include as
+        # --sysroot /path/to/include
+        # which is a valid format too.
+        if param.startswith("="):
+            param = param[1:]
+            together = False
+        param = os.path.normpath(
+            os.path.join(details['directory'], param))
+
+    if together:
+        details['analyzer_options'].append(flag + param)
+    else:
+        details['analyzer_options'].extend([flag, param])
 
 
-def __collect_compile_opts(flag_iterator, details):
+def __collect_compile_opts(flag_iterator, details, _):
     """
     This function collects the compilation (i.e. not linker or preprocessor)
     flags to the buildaction.
     """
-    if COMPILE_OPTIONS.match(flag_iterator.item):
-        details['analyzer_options'].append(flag_iterator.item)
-        return True
-
-    return False
+    details['analyzer_options'].append(flag_iterator.item)
 
 
-def __skip_sources(flag_iterator, _):
+def __set_compile_action(_, details, __):
     """
-    This function skips the compiled source file names (i.e. the arguments
-    which don't start with a dash character).
+    The -c flag makes this a compilation action, whatever other flags
+    follow it.
     """
-    if flag_iterator.item[0] != '-':
-        return True
+    details['action_type'] = BuildAction.COMPILE
 
-    return False
 
-
-def __determine_action_type(flag_iterator, details):
+def __set_info_action(_, details, __):
     """
-    This function determines whether this is a preprocessing, compilation or
-    linking action and sets it in the buildaction object. If the action type is
-    set to COMPILE earlier then we don't set it to anything else.
+    This function sets the action type to INFO, unless the action type is
+    set to COMPILE earlier.
     """
-    if flag_iterator.item == '-c':
-        details['action_type'] = BuildAction.COMPILE
-        return True
-    elif flag_iterator.item.startswith('-print-prog-name'):
-        if details['action_type'] != BuildAction.COMPILE:
-            details['action_type'] = BuildAction.INFO
-        return True
-    elif PRECOMPILATION_OPTION.match(flag_iterator.item):
-        if details['action_type'] != BuildAction.COMPILE:
-            details['action_type'] = BuildAction.PREPROCESS
-        return True
+    if details['action_type'] != BuildAction.COMPILE:
+        details['action_type'] = BuildAction.INFO
+
 
-    return False
+def __set_preprocess_action(_, details, __):
+    """
+    This function sets the action type to PREPROCESS, unless the action type
+    is set to COMPILE earlier.
+    """
+    if details['action_type'] != BuildAction.COMPILE:
+        details['action_type'] = BuildAction.PREPROCESS
 
 
-def __get_arch(flag_iterator, details):
+def __get_arch(flag_iterator, details, _):
     """
     This function consumes -arch flag which is followed by the target
     architecture. This is then collected to the buildaction object.
@@ -808,229 +1001,375 @@ def __get_arch(flag_iterator, details):
     # used in a real project? This -arch flag is not really documented among
     # GCC flags.
     # Where do we use this architecture during analysis and why?
-    if flag_iterator.item == '-arch':
-        next(flag_iterator)
-        details['arch'] = flag_iterator.item
-        return True
-
-    return False
+    next(flag_iterator)
+    details['arch'] = flag_iterator.item
 
 
-def __get_language(flag_iterator, details):
+def __get_language(flag_iterator, details, _):
     """
     This function consumes -x flag which is followed by the language. This
     language is then collected to the buildaction object.
     """
     # TODO: Known issue: a -x flag may precede all source files in the build
     # command with different languages.
-    if flag_iterator.item.startswith('-x'):
-        if flag_iterator.item == '-x':
-            next(flag_iterator)
-            details['lang'] = flag_iterator.item
-        else:
-            details['lang'] = flag_iterator.item[2:]  # 2 == len('-x')
-        return True
-    return False
+    if flag_iterator.item == '-x':
+        next(flag_iterator)
+        details['lang'] = flag_iterator.item
+    else:
+        details['lang'] = flag_iterator.item[2:]  # 2 == len('-x')
 
 
-def __get_output(flag_iterator, details):
+def __get_output(flag_iterator, details, _):
     """
     This function consumes -o flag which is followed by the output file of the
     action. This file is then collected to the buildaction object.
     """
-    if flag_iterator.item == '-o':
-        next(flag_iterator)
-        details['output'] = flag_iterator.item
-        return True
+    next(flag_iterator)
+    details['output'] = flag_iterator.item
 
-    return False
 
-
-def __replace(flag_iterator, details):
+def __replace(flag_iterator, details, _):
     """
     This function extends the analyzer options list with the corresponding
-    replacement based on REPLACE_OPTIONS_MAP if the flag_iterator is currently
-    pointing to a flag to replace.
+    replacement based on REPLACE_OPTIONS_MAP.
     """
-    value = REPLACE_OPTIONS_MAP.get(flag_iterator.item)
+    details['analyzer_options'].extend(
+        REPLACE_OPTIONS_MAP[flag_iterator.item])
 
-    if value:
-        details['analyzer_options'].extend(value)
 
-    return bool(value)
+def __skip(*_):
+    """
+    This function skips the flag pointed by the given flag_iterator, e.g.
+    the compiled source file names, which are handled separately.
+    """
 
 
-def __skip_clang(flag_iterator, _):
+def __skip_with_params(arg_num, flag_iterator, *_):
     """
     This function skips the flag pointed by the given flag_iterator with its
-    parameters if any.
+    parameters.
+    """
+    for _ in range(arg_num):
+        next(flag_iterator)
+
+
+class FlagDispatcher(object):
     """
-    if IGNORED_OPTIONS_CLANG.match(flag_iterator.item):
+    Classify compiler flags with a single match of a combined regular
+    expression, and call the handler of the matching rule. The rules are
+    pairs of a regular expression matched at the beginning of the flag, and
+    a handler. If several rules match, the first one wins, as the
+    alternatives of a regular expression are tried in order. A handler is
+    called with the OptionIterator, the details of the build action and the
+    part of the flag matched by the rule. The combined regular expression is
+    compiled when the first flag is processed.
+    """
+
+    __slots__ = ['pattern', 'handlers', '_match']
+
+    def __init__(self, rules):
+        self.pattern = LazyPattern('|'.join(
+            '(?P<r{0}>{1})'.format(index, rule)
+            for index, (rule, _) in enumerate(rules)))
+        self.handlers = {'r{0}'.format(index): handler
+                         for index, (_, handler) in enumerate(rules)}
+        self._match = None
+
+    def process(self, flag_iterator, details):
+        """
+        Process the flag the iterator points to. Return False if no rule
+        matches the flag.
+        """
+        if self._match is None:
+            self._match = self.pattern.compiled().match
+
+        m = self._match(flag_iterator.item)
+        if m is None:
+            return False
+
+        name = m.lastgroup
+        self.handlers[name](flag_iterator, details, m.group(name))
         return True
 
-    return False
+
+def __exactly(*flags):
+    """Return a pattern matching only the given flags as a whole."""
+    return r'(?:{0})\Z'.format('|'.join(map(re.escape, flags)))
+
+
+# Source files are skipped first so they are not collected
+# with the other compiler flags together. Source file is handled
+# separately from the compile command json.
+CLANG_FLAG_DISPATCHER = FlagDispatcher([
+    ('[^-]', __skip),
+    (IGNORED_OPTIONS_CLANG.pattern, __skip),
+    (__exactly('-Xclang'), __collect_transform_xclang_opts),
+    (__exactly('-o'), __get_output),
+    (__exactly('-c'), __set_compile_action),
+    ('-print-prog-name', __set_info_action),
+    (PRECOMPILATION_OPTION.pattern, __set_preprocess_action),
+    (__exactly('-arch'), __get_arch),
+    ('-x', __get_language),
+    (COMPILE_OPTIONS_MERGED.pattern, __collect_transform_include_opts),
+    (CLANG_OPTIONS.pattern, __collect_clang_compile_opts)])
+
+GCC_FLAG_DISPATCHER = FlagDispatcher(
+    [(IGNORED_OPTIONS_GCC.pattern, __skip)] +
+    [(pattern.pattern, functools.partial(__skip_with_params, arg_num))
+     for pattern, arg_num in IGNORED_PARAM_OPTIONS.items()] +
+    [(__exactly(*REPLACE_OPTIONS_MAP), __replace),
+     (COMPILE_OPTIONS.pattern, __collect_compile_opts),
+     (COMPILE_OPTIONS_MERGED.pattern, __collect_transform_include_opts),
+     (__exactly('-c'), __set_compile_action),
+     ('-print-prog-name', __set_info_action),
+     (PRECOMPILATION_OPTION.pattern, __set_preprocess_action),
+     ('[^-]', __skip),
+     (__exactly('-arch'), __get_arch),
+     ('-x', __get_language),
+     (__exactly('-o'), __get_output)])
+
+
+class OptionParseCache(object):
+    """
+    A bounded LRU cache of parsed compile commands. The compile commands of
+    a project often differ only in the source file and the output, so the
+    commands are cached with the source file and the output masked out, and
+    only these fields are substituted for each entry.
+    """
+
+    __slots__ = ['maxsize', 'hits', 'misses', '_entries']
+
+    def __init__(self, maxsize=DEFAULT_PARSE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value of the key, or None."""
+        try:
+            value = self._entries[key]
+            self._entries.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    @property
+    def hit_rate(self):
+        """The ratio of the lookups which found a cached value."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
 
 
-def __skip_gcc(flag_iterator, _):
+def split_command(command):
     """
-    This function skips the flag pointed by the given flag_iterator with its
-    parameters if any.
+    Split a command line like shlex.split. Commands without quotes and
+    backslashes are simply split at whitespace, which is much faster.
     """
-    if IGNORED_OPTIONS_GCC.match(flag_iterator.item):
-        return True
+    if SHELL_QUOTING.compiled().search(command):
+        return shlex.split(command)
+    return COMMAND_WORD.compiled().findall(command)
 
-    for pattern, arg_num in IGNORED_PARAM_OPTIONS.items():
-        if pattern.match(flag_iterator.item):
-            for _ in range(arg_num):
-                next(flag_iterator)
-            return True
 
-    return False
+def __command_template(gcc_command, directory, source):
+    """
+    Return the command with the source file and the output replaced by
+    placeholders, and the output. The output is only replaced if it is
+    given exactly once.
+    """
+    template = list(gcc_command)
 
+    output = None
+    if template.count('-o') == 1:
+        index = template.index('-o') + 1
+        if index < len(template) and not template[index].startswith('-'):
+            output = template[index]
+            template[index] = OUTPUT_PLACEHOLDER
 
-def parse_options(compilation_db_entry,
-                  compiler_info_file=None,
-                  keep_gcc_include_fixed=False,
-                  keep_gcc_intrin=False,
-                  get_clangsa_version_func=None,
-                  env=None):
+    base_name = os.path.basename(source)
+    if base_name and not source.startswith('-'):
+        abs_source = os.path.normpath(os.path.join(directory, source))
+        for index, arg in enumerate(template):
+            if arg.endswith(base_name) and (arg == source or os.path.normpath(
+                    os.path.join(directory, arg)) == abs_source):
+                template[index] = SOURCE_PLACEHOLDER
+
+    return template, output
+
+
+def __contains_placeholder(details):
     """
-    This function parses a GCC compilation action and returns a BuildAction
-    object which can be the input of Clang analyzer tools.
+    Return True if a placeholder of a command template was not skipped like
+    a source file, or collected as the output.
+    """
+    return any(PLACEHOLDER_MARK in option
+               for option in details['analyzer_options']) or \
+        (details['output'] != OUTPUT_PLACEHOLDER and
+         PLACEHOLDER_MARK in details['output']) or \
+        PLACEHOLDER_MARK in details['arch'] or \
+        PLACEHOLDER_MARK in (details['lang'] or '')
 
-    compilation_db_entry -- An entry from a valid compilation database JSON
-                            file, i.e. a dictionary with the compilation
-                            command, the compiled file and the current working
-                            directory.
-    compiler_info_file -- Contains the path to a compiler info file.
-    keep_gcc_include_fixed -- There are some implicit include paths which are
-                              only used by GCC (include-fixed). This flag
-                              determines whether these should be kept among
-                              the implicit include paths.
-    keep_gcc_intrin -- There are some implicit include paths which contain
-                       GCC-specific header files (those which end with
-                       intrin.h). This flag determines whether these should be
-                       kept among the implicit include paths. Use this flag if
-                       Clang analysis fails with error message related to
-                       __builtin symbols.
-    get_clangsa_version_func -- Is a function which should return the
-                            version information for a clang compiler.
-                            It requires the compiler binary and an env.
-                            get_clangsa_version_func(compiler_binary, env)
-                            Should return false for a non clang compiler.
-    env -- Is the environment where a subprocess call should be executed.
+
+def __new_details(directory):
+    """
+    Return the initial details of a compile command.
     """
-    details = {
+    return {
         'analyzer_options': [],
         'compiler_includes': defaultdict(dict),  # For each language c/cpp.
         'compiler_standard': defaultdict(dict),  # For each language c/cpp.
         'analyzer_type': -1,
         'original_command': '',
-        'directory': '',
+        'directory': directory,
         'output': '',
         'lang': None,
         'arch': '',  # Target in the compile command set by -arch.
         'target': defaultdict(dict),
-        'source': ''}
+        'source': '',
+        'implicit_info': None,
+        'action_type': None}
 
-    if 'arguments' in compilation_db_entry:
-        gcc_command = compilation_db_entry['arguments']
-        details['original_command'] = ' '.join(gcc_command)
-    elif 'command' in compilation_db_entry:
-        details['original_command'] = compilation_db_entry['command']
-        gcc_command = shlex.split(compilation_db_entry['command'])
-    else:
-        raise KeyError("No valid 'command' or 'arguments' entry found!")
 
-    details['directory'] = compilation_db_entry['directory']
-    details['action_type'] = None
+def __compiler_binary(compiler, env):
+    """
+    Return the resolved compiler binary, which identifies the version
+    information shared by the names of the same binary.
+    """
+    return resolve_compiler(compiler, env.get('PATH') if env else None) \
+        or compiler
+
+
+def __clang_version(compiler, get_clangsa_version_func, env):
+    """
+    Return the clang version information of the compiler, or False if the
+    compiler is not clang, from the persistent cache or by invoking the
+    compiler. The result is not stored in ImplicitCompilerInfo, so it can run
+    in a background thread.
+    """
+    cache = ImplicitCompilerInfo.compiler_cache
+    compiler_version_info = None
+    if cache is not None:
+        compiler_version_info = cache.get_version(compiler)
+    if compiler_version_info is not None:
+        return compiler_version_info
+
+    try:
+        compiler_version_info = get_clangsa_version_func(compiler, env)
+    except (subprocess.CalledProcessError, OSError) as cerr:
+        LOG.error('Failed to get and parse version of: %s', compiler)
+        LOG.error(cerr)
+        return False
+
+    if cache is not None:
+        cache.put_version(compiler, compiler_version_info)
+    return compiler_version_info
+
+
+def __get_compiler_version(compiler, get_clangsa_version_func, env):
+    """
+    Return the clang version information of the compiler, or False if the
+    compiler is not clang. Every compiler binary is probed only once, even if
+    it is called by several names.
+    """
+    ICI = ImplicitCompilerInfo
+    if compiler in ICI.compiler_versions:
+        return ICI.compiler_versions[compiler]
+
+    if not get_clangsa_version_func:
+        return False
+
+    binary = __compiler_binary(compiler, env)
+    if binary not in ICI.binary_versions:
+        ICI.binary_versions[binary] = \
+            __clang_version(compiler, get_clangsa_version_func, env)
+
+    ICI.compiler_versions[compiler] = ICI.binary_versions[binary]
+    return ICI.compiler_versions[compiler]
+
+
+def __probe_compiler(compiler, version_probe, gcc_command, directory):
+    """
+    Collect the information of the compiler in the same way as
+    __parse_command does for the first compile command of the compiler.
+    Return the version information, the variant of the compile command and
+    the implicit compiler information, which is None if it would not be
+    collected for the compile command. The results are not stored in
+    ImplicitCompilerInfo, so it can run in a background thread.
+
+    version_probe -- The future of the version information of the compiler.
+    """
+    version_info = version_probe.result()
+    if version_info:
+        return version_info, None, None
+
+    details = __new_details(directory)
+    for it in OptionIterator(gcc_command[1:]):
+        GCC_FLAG_DISPATCHER.process(it, details)
+
+    compiler_flags = details['analyzer_options']
+    if gcc_toolchain.toolchain_in_args(compiler_flags):
+        return version_info, None, None
+
+    return version_info, ImplicitCompilerInfo.variant(compiler_flags), \
+        ImplicitCompilerInfo.probe(compiler, compiler_flags)
+
+
+def __completed(result):
+    """Return a future which is already done with the given result."""
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def __parse_command(gcc_command,
+                    directory,
+                    compiler_info_file,
+                    keep_gcc_include_fixed,
+                    keep_gcc_intrin,
+                    get_clangsa_version_func,
+                    env):
+    """
+    Parse the flags of a compile command, and collect the implicit compiler
+    information. The details which depend on the source file are set by
+    __build_action.
+    """
+    details = __new_details(directory)
     details['compiler'] = \
         determine_compiler(gcc_command,
                            ImplicitCompilerInfo.is_executable_compiler)
     if '++' in os.path.basename(details['compiler']):
         details['lang'] = 'c++'
 
-    # Source files are skipped first so they are not collected
-    # with the other compiler flags together. Source file is handled
-    # separately from the compile command json.
-    clang_flag_collectors = [
-        __skip_sources,
-        __skip_clang,
-        __collect_transform_xclang_opts,
-        __get_output,
-        __determine_action_type,
-        __get_arch,
-        __get_language,
-        __collect_transform_include_opts,
-        __collect_clang_compile_opts
-    ]
-
-    gcc_flag_transformers = [
-        __skip_gcc,
-        __replace,
-        __collect_compile_opts,
-        __collect_transform_include_opts,
-        __determine_action_type,
-        __skip_sources,
-        __get_arch,
-        __get_language,
-        __get_output]
-
-    flag_processors = gcc_flag_transformers
-
-    compiler_version_info = \
-        ImplicitCompilerInfo.compiler_versions.get(
-            details['compiler'], False)
-
-    if not compiler_version_info and get_clangsa_version_func:
-
-        # did not find in the cache yet
-        try:
-            compiler_version_info = \
-                get_clangsa_version_func(details['compiler'], env)
-        except (subprocess.CalledProcessError, OSError) as cerr:
-            LOG.error('Failed to get and parse version of: %s',
-                      details['compiler'])
-            LOG.error(cerr)
-            compiler_version_info = False
+    flag_dispatcher = GCC_FLAG_DISPATCHER
 
-    ImplicitCompilerInfo.compiler_versions[details['compiler']] \
-        = compiler_version_info
+    ImplicitCompilerInfo.wait_for_probe(details['compiler'])
+    compiler_version_info = __get_compiler_version(
+        details['compiler'], get_clangsa_version_func, env)
 
     using_clang_to_compile_and_analyze = False
-    if ImplicitCompilerInfo.compiler_versions[details['compiler']]:
+    if compiler_version_info:
         # Based on the version information the compiler is clang.
         using_clang_to_compile_and_analyze = True
-        flag_processors = clang_flag_collectors
+        flag_dispatcher = CLANG_FLAG_DISPATCHER
 
     for it in OptionIterator(gcc_command[1:]):
-        for flag_processor in flag_processors:
-            if flag_processor(it, details):
-                break
-        else:
-            pass
-            # print('Unhandled argument: ' + it.item)
-
-    if details['action_type'] is None:
-        details['action_type'] = BuildAction.COMPILE
-
-    details['source'] = compilation_db_entry['file']
-
-    # In case the file attribute in the entry is empty.
-    if details['source'] == '.':
-        details['source'] = ''
-
-    lang = get_language(os.path.splitext(details['source'])[1])
-    if lang:
-        if details['lang'] is None:
-            details['lang'] = lang
-    else:
-        details['action_type'] = BuildAction.LINK
-
-    # Option parser detects target architecture but does not know about the
-    # language during parsing. Set the collected compilation target for the
-    # language detected language.
-    details['target'][lang] = details['arch']
+        flag_dispatcher.process(it, details)
 
     # With gcc-toolchain a non default compiler toolchain can be set. Clang
     # will search for include paths and libraries based on the gcc-toolchain
@@ -1050,7 +1389,8 @@ def parse_options(compilation_db_entry,
     # do not collect the implicit include paths.
     if (not toolchain and not using_clang_to_compile_and_analyze) or \
             (compiler_info_file and os.path.exists(compiler_info_file)):
-        ImplicitCompilerInfo.set(details, compiler_info_file)
+        details['implicit_info'] = \
+            ImplicitCompilerInfo.set(details, compiler_info_file)
 
     if not keep_gcc_include_fixed:
         for lang, includes in details['compiler_includes'].items():
@@ -1065,9 +1405,10 @@ def parse_options(compilation_db_entry,
         # filter out intrin directories
         aop_without_intrin = []
         analyzer_options = iter(details['analyzer_options'])
+        match_include_option = INCLUDE_OPTIONS_MERGED.compiled().match
 
         for aopt in analyzer_options:
-            m = INCLUDE_OPTIONS_MERGED.match(aopt)
+            m = match_include_option(aopt)
             if m:
                 flag = m.group(0)
                 together = len(flag) != len(aopt)
@@ -1077,8 +1418,8 @@ def parse_options(compilation_db_entry,
                 else:
                     flag = aopt
                     value = next(analyzer_options)
-                if os.path.isdir(value) and __contains_no_intrinsic_headers(
-                        value) or not os.path.isdir(value):
+                if not PROBE_CACHE.isdir(value) or \
+                        __contains_no_intrinsic_headers(value):
                     if together:
                         aop_without_intrin.append(aopt)
                     else:
@@ -1090,15 +1431,215 @@ def parse_options(compilation_db_entry,
 
         details['analyzer_options'] = aop_without_intrin
 
+    return details
+
+
+def __build_action(command_details, original_command, source, output):
+    """
+    Create the build action of an entry from the details of its parsed
+    compile command, and the per-entry fields.
+    """
+    details = dict(command_details)
+    details['analyzer_options'] = list(details['analyzer_options'])
+    details['compiler_includes'] = copy.copy(details['compiler_includes'])
+    details['compiler_standard'] = copy.copy(details['compiler_standard'])
+    details['original_command'] = original_command
+
+    if details['output'] == OUTPUT_PLACEHOLDER:
+        details['output'] = output
+
+    if details['action_type'] is None:
+        details['action_type'] = BuildAction.COMPILE
+
+    details['source'] = source
+
+    # In case the file attribute in the entry is empty.
+    if details['source'] == '.':
+        details['source'] = ''
+
+    lang = get_language(os.path.splitext(details['source'])[1])
+    if lang:
+        if details['lang'] is None:
+            details['lang'] = lang
+    else:
+        details['action_type'] = BuildAction.LINK
+
+    # Option parser detects target architecture but does not know about the
+    # language during parsing. Set the collected compilation target for the
+    # language detected language.
+    details['target'] = defaultdict(dict)
+    details['target'][lang] = details['arch']
+
+    implicit_info = details.pop('implicit_info')
+    if implicit_info is not None:
+        for info_lang in (ImplicitCompilerInfo.c(),
+                          ImplicitCompilerInfo.cpp()):
+            ImplicitCompilerInfo.set_details_from_ICI(
+                details, 'target', info_lang, implicit_info)
+
     return BuildAction(**details)
 
 
-def process_response_file(response_file):
+def parse_options(compilation_db_entry,
+                  compiler_info_file=None,
+                  keep_gcc_include_fixed=False,
+                  keep_gcc_intrin=False,
+                  get_clangsa_version_func=None,
+                  env=None,
+                  parse_cache=None):
+    """
+    This function parses a GCC compilation action and returns a BuildAction
+    object which can be the input of Clang analyzer tools.
+
+    compilation_db_entry -- An entry from a valid compilation database JSON
+                            file, i.e. a dictionary with the compilation
+                            command, the compiled file and the current working
+                            directory.
+    compiler_info_file -- Contains the path to a compiler info file.
+    keep_gcc_include_fixed -- There are some implicit include paths which are
+                              only used by GCC (include-fixed). This flag
+                              determines whether these should be kept among
+                              the implicit include paths.
+    keep_gcc_intrin -- There are some implicit include paths which contain
+                       GCC-specific header files (those which end with
+                       intrin.h). This flag determines whether these should be
+                       kept among the implicit include paths. Use this flag if
+                       Clang analysis fails with error message related to
+                       __builtin symbols.
+    get_clangsa_version_func -- Is a function which should return the
+                            version information for a clang compiler.
+                            It requires the compiler binary and an env.
+                            get_clangsa_version_func(compiler_binary, env)
+                            Should return false for a non clang compiler.
+    env -- Is the environment where a subprocess call should be executed.
+    parse_cache -- An OptionParseCache, which is used to parse the compile
+                   commands differing only in the source file and the output
+                   only once.
+    """
+    if 'arguments' in compilation_db_entry:
+        gcc_command = compilation_db_entry['arguments']
+        original_command = ' '.join(gcc_command)
+    elif 'command' in compilation_db_entry:
+        original_command = compilation_db_entry['command']
+        gcc_command = split_command(compilation_db_entry['command'])
+    else:
+        raise KeyError("No valid 'command' or 'arguments' entry found!")
+
+    directory = compilation_db_entry['directory']
+    source = compilation_db_entry['file']
+    options = (compiler_info_file, keep_gcc_include_fixed, keep_gcc_intrin,
+               get_clangsa_version_func, env)
+
+    if parse_cache is None:
+        return __build_action(
+            __parse_command(gcc_command, directory, *options),
+            original_command, source, None)
+
+    template, output = __command_template(gcc_command, directory, source)
+    key = (directory, tuple(template), compiler_info_file,
+           keep_gcc_include_fixed, keep_gcc_intrin, get_clangsa_version_func)
+
+    command_details = parse_cache.get(key)
+    if command_details is None:
+        command_details = __parse_command(template, directory, *options)
+        if __contains_placeholder(command_details):
+            # A placeholder is the parameter of a flag, e.g. -include.
+            command_details = False
+        parse_cache.put(key, command_details)
+
+    if command_details is False:
+        command_details = __parse_command(gcc_command, directory, *options)
+
+    return __build_action(command_details, original_command, source, output)
+
+
+def prefetch_compiler_info(executor, compilation_database,
+                           get_clangsa_version_func=None, env=None,
+                           parse_cache=None):
+    """
+    Start probing the compilers of the compilation database in the
+    background. Every compiler is probed with the flags of its first compile
+    command, so the collected information is the same as if the compiler was
+    probed when parse_options reaches that command, which waits only for the
+    probe of its own compiler. The version of every compiler binary is probed
+    only once. The background probes do not change the shared state, their
+    results are stored by the thread calling parse_options.
+
+    executor -- The concurrent.futures.Executor running the probes.
+    parse_cache -- The OptionParseCache passed to parse_options.
+    """
+    ICI = ImplicitCompilerInfo
+    for entry in compilation_database:
+        if 'arguments' in entry:
+            gcc_command = entry['arguments']
+        elif 'command' in entry:
+            gcc_command = split_command(entry['command'])
+        else:
+            continue
+
+        if not gcc_command:
+            continue
+
+        compiler = determine_compiler(gcc_command, ICI.is_executable_compiler)
+        if compiler in ICI.pending_probes or \
+                compiler in ICI.compiler_versions or \
+                ICI.compiler_info.get(compiler):
+            continue
+
+        directory = entry['directory']
+        if parse_cache is not None:
+            # parse_options parses the template of the first compile command.
+            gcc_command, _ = \
+                __command_template(gcc_command, directory, entry['file'])
+
+        binary = None
+        if compiler in ICI.compiler_versions:
+            version_probe = __completed(ICI.compiler_versions[compiler])
+        elif not get_clangsa_version_func:
+            version_probe = __completed(False)
+        else:
+            binary = __compiler_binary(compiler, env)
+            if binary in ICI.binary_versions:
+                version_probe = __completed(ICI.binary_versions[binary])
+            elif binary in ICI.pending_versions:
+                version_probe = ICI.pending_versions[binary]
+            else:
+                version_probe = executor.submit(
+                    __clang_version, compiler, get_clangsa_version_func, env)
+                ICI.pending_versions[binary] = version_probe
+
+        ICI.pending_probes[compiler] = (binary, executor.submit(
+            __probe_compiler, compiler, version_probe, gcc_command,
+            directory))
+
+
+def prefetched(executor, entries, window, get_clangsa_version_func=None,
+               env=None, parse_cache=None):
+    """
+    Generate the entries, while the compilers of the next entries, at most
+    window of them, are probed in the background by prefetch_compiler_info.
+    Only the entries in the window are kept in memory.
+    """
+    ahead = deque()
+    for entry in entries:
+        prefetch_compiler_info(executor, (entry,), get_clangsa_version_func,
+                               env, parse_cache)
+        ahead.append(entry)
+        if len(ahead) > window:
+            yield ahead.popleft()
+
+    yield from ahead
+
+
+def process_response_file(response_file, directory=None):
     """
     Return list of options and source files from the given response file.
+    The nested response files, which are relative to the given directory
+    (the directory of the response file by default), are expanded.
     """
-    with open(response_file, encoding="utf-8", errors="ignore") as r_file:
-        options = shlex.split(r_file)
+    if directory is None:
+        directory = os.path.dirname(response_file)
+    options = RESPONSE_FILE_CACHE.expand(response_file, directory)
 
     sources = [opt for opt in options if not opt.startswith('-') and
                os.path.splitext(opt)[1].lower() in SOURCE_EXTENSIONS]
@@ -1110,9 +1651,9 @@ def extend_compilation_database_entries(compilation_database):
     """
     Loop through the compilation database entries and whether compilation
     command contains a response file we read those files and replace the
-    response file with the options from the file.
+    response file with the options from the file. The entries are generated
+    one by one.
     """
-    entries = []
     for entry in compilation_database:
         if 'command' in entry and '@' in entry['command']:
             cmd = []
@@ -1128,7 +1669,8 @@ def extend_compilation_database_entries(compilation_database):
                                     response_file)
                         continue
 
-                    opts, sources = process_response_file(response_file)
+                    opts, sources = \
+                        process_response_file(response_file, source_dir)
                     cmd.extend(opts)
                     source_files.extend(sources)
                 else:
@@ -1140,12 +1682,10 @@ def extend_compilation_database_entries(compilation_database):
                 for source_file in source_files:
                     new_entry = dict(entry)
                     new_entry['file'] = source_file
-                    entries.append(new_entry)
+                    yield new_entry
                 continue
 
-        entries.append(entry)
-
-    return entries
+        yield entry
 
 
 class CompileCommandEncoder(json.JSONEncoder):
@@ -1166,6 +1706,33 @@ class CompileActionUniqueingType(object):
     STRICT = 3  # Gives error in case of duplicate
 
 
+def entry_digest(entry):
+    """
+    Return the digest of the normalized directory, compile command and
+    source file of a compilation database entry. The byte-identical entries
+    have the same digest. The source file is expected to be normalized.
+    """
+    command = entry['arguments'] if 'arguments' in entry \
+        else entry['command'].strip()
+    return stable_digest_bytes([os.path.normpath(entry['directory']),
+                                command, entry['file']])
+
+
+def dump_compiler_info(report_dir, compiler_info=None):
+    """
+    Write the compiler info, the collected one by default, into
+    <report_dir>/compiler_info.json.
+    """
+    if compiler_info is None:
+        compiler_info = ImplicitCompilerInfo.get()
+
+    compiler_info_out = os.path.join(report_dir, "compiler_info.json")
+    with open(compiler_info_out, 'w',
+              encoding="utf-8", errors="ignore") as f:
+        LOG.debug("Writing compiler info into:"+compiler_info_out)
+        json.dump(compiler_info, f)
+
+
 def parse_unique_log(compilation_database,
                      report_dir,
                      compile_uniqueing="none",
@@ -1175,7 +1742,11 @@ def parse_unique_log(compilation_database,
                      analysis_skip_handler=None,
                      pre_analysis_skip_handler=None,
                      ctu_or_stats_enabled=False,
-                     env=None):
+                     env=None,
+                     parse_cache=None,
+                     probe_workers=DEFAULT_PROBE_WORKERS,
+                     compiler_cache=None,
+                     probe_executor=None):
     """
     This function reads up the compilation_database
     and returns with a list of build actions that is
@@ -1197,9 +1768,13 @@ def parse_unique_log(compilation_database,
                             command this way.
     report_dir  -- The output report directory. The compiler infos
                    will be written to <report_dir>/compiler.info.json.
+                   They are not written if it is None.
     compile_uniqueing -- Compilation database uniqueing mode.
                          If there are more than one compile commands for a
-                         target file, only a single one is kept.
+                         target file, only a single one is kept. In the
+                         "none" and "alpha" modes the identical entries are
+                         dropped before parsing them. The "strict" and the
+                         regex modes still report them as an error.
     compiler_info_file -- compiler_info.json. If exists, it will be used for
                     analysis.
     keep_gcc_include_fixed -- There are some implicit include paths which are
@@ -1225,7 +1800,23 @@ def parse_unique_log(compilation_database,
     ctu_or_stats_enabled -- ctu or statistics based analysis was enabled
                             influences the behavior which files are skipped.
     env -- Is the environment where a subprocess call should be executed.
+    parse_cache -- The OptionParseCache of the parsed compile commands. A new
+                   cache is used for every compilation database by default.
+    probe_workers -- The number of threads which probe the compilers of the
+                     compilation database in the background, while the
+                     compile commands are parsed. The compilers are probed
+                     when they are first needed if it is 0.
+    compiler_cache -- The CompilerCache, which stores the results of probing
+                      the compilers for the later runs.
+    probe_executor -- The ThreadPoolExecutor probing the compilers in the
+                      background, which can be shared by several calls. A
+                      new one with probe_workers threads is used by default.
     """
+    if parse_cache is None:
+        parse_cache = OptionParseCache()
+
+    executor = None
+    ImplicitCompilerInfo.compiler_cache = compiler_cache
     try:
         uniqued_build_actions = dict()
 
@@ -1240,37 +1831,75 @@ def parse_unique_log(compilation_database,
             uniqueing_re = re.compile(compile_uniqueing)
 
         skipped_cmp_cmd_count = 0
-
-        for entry in extend_compilation_database_entries(compilation_database):
-            # Normalization needs to be done here, because the skip regex
-            # won't match properly in the skiplist handler.
-            entry['file'] = os.path.normpath(
-                os.path.join(entry['directory'], entry['file']))
-            # Skip parsing the compilaton commands if it should be skipped
-            # at both analysis phases (pre analysis and analysis).
-            # Skipping of the compile commands is done differently if no
-            # CTU or statistics related feature was enabled.
-            if analysis_skip_handler \
-                and analysis_skip_handler.should_skip(entry['file']) \
-                and (not ctu_or_stats_enabled or pre_analysis_skip_handler
-                     and pre_analysis_skip_handler.should_skip(entry['file'])):
-                skipped_cmp_cmd_count += 1
-                continue
-
+        duplicate_entry_count = 0
+        compile_action_count = 0
+
+        entry_digests = set()
+        drop_duplicate_entries = build_action_uniqueing in (
+            CompileActionUniqueingType.NONE,
+            CompileActionUniqueingType.SOURCE_ALPHA)
+
+        def parsed_entries():
+            """Generate the entries which are not skipped or dropped."""
+            nonlocal skipped_cmp_cmd_count, duplicate_entry_count
+
+            for entry in extend_compilation_database_entries(
+                    compilation_database):
+                # Normalization needs to be done here, because the skip
+                # regex won't match properly in the skiplist handler.
+                entry['file'] = os.path.normpath(
+                    os.path.join(entry['directory'], entry['file']))
+                # Skip parsing the compilaton commands if it should be
+                # skipped at both analysis phases (pre analysis and
+                # analysis). Skipping of the compile commands is done
+                # differently if no CTU or statistics related feature was
+                # enabled.
+                if analysis_skip_handler \
+                    and analysis_skip_handler.should_skip(entry['file']) \
+                    and (not ctu_or_stats_enabled or
+                         pre_analysis_skip_handler and
+                         pre_analysis_skip_handler.should_skip(
+                             entry['file'])):
+                    skipped_cmp_cmd_count += 1
+                    continue
+
+                # Drop the exact duplicates before the expensive parsing,
+                # where the uniqueing would drop them anyway.
+                if drop_duplicate_entries:
+                    digest = entry_digest(entry)
+                    if digest in entry_digests:
+                        duplicate_entry_count += 1
+                        continue
+                    entry_digests.add(digest)
+                yield entry
+
+        entries = parsed_entries()
+        if not (compiler_info_file and os.path.exists(compiler_info_file)):
+            if probe_executor is None and probe_workers > 0:
+                executor = probe_executor = \
+                    ThreadPoolExecutor(max_workers=probe_workers)
+            if probe_executor is not None:
+                entries = prefetched(probe_executor, entries, PREFETCH_WINDOW,
+                                     clangsa_version_get, env, parse_cache)
+
+        for entry in entries:
             action = parse_options(entry,
                                    compiler_info_file,
                                    keep_gcc_include_fixed,
                                    keep_gcc_intrin,
                                    clangsa_version_get,
-                                   env)
+                                   env,
+                                   parse_cache)
 
             if not action.lang:
                 continue
             if action.action_type != BuildAction.COMPILE:
                 continue
+            compile_action_count += 1
             if build_action_uniqueing == CompileActionUniqueingType.NONE:
-                if action.__hash__ not in uniqued_build_actions:
-                    uniqued_build_actions[action.__hash__] = action
+                key = action.uniqueing_key()
+                if key not in uniqued_build_actions:
+                    uniqued_build_actions[key] = action
             elif build_action_uniqueing == CompileActionUniqueingType.STRICT:
                 if action.source not in uniqued_build_actions:
                     uniqued_build_actions[action.source] = action
@@ -1308,13 +1937,29 @@ def parse_unique_log(compilation_database,
                               compile_uniqueing)
                     sys.exit(1)
 
-        compiler_info_out = os.path.join(report_dir, "compiler_info.json")
-        with open(compiler_info_out, 'w',
-                  encoding="utf-8", errors="ignore") as f:
-            LOG.debug("Writing compiler info into:"+compiler_info_out)
-            json.dump(ImplicitCompilerInfo.get(), f)
-
-        LOG.debug('Parsing log file done.')
+        if report_dir is not None:
+            dump_compiler_info(report_dir)
+
+        LOG.debug('Dropped %d duplicate compilation database entries '
+                  'before parsing, and %d duplicate build actions after '
+                  'parsing.', duplicate_entry_count,
+                  compile_action_count - len(uniqued_build_actions))
+        LOG.debug('Parsing log file done. Parse cache hit rate: %.1f%% '
+                  '(%d hits, %d misses).', parse_cache.hit_rate * 100,
+                  parse_cache.hits, parse_cache.misses)
+        LOG.debug('File system probe cache hit rate: %.1f%% '
+                  '(%d hits, %d misses).', PROBE_CACHE.hit_rate * 100,
+                  PROBE_CACHE.hits, PROBE_CACHE.misses)
+        LOG.debug('Response file cache hit rate: %.1f%% '
+                  '(%d hits, %d misses).', RESPONSE_FILE_CACHE.hit_rate * 100,
+                  RESPONSE_FILE_CACHE.hits, RESPONSE_FILE_CACHE.misses)
+        LOG.debug('Probed %d compiler variants, reused them %d times.',
+                  ImplicitCompilerInfo.variant_probes,
+                  ImplicitCompilerInfo.variant_hits)
+        if compiler_cache is not None:
+            LOG.debug('Compiler cache hit rate: %.1f%% (%d hits, %d misses).',
+                      compiler_cache.hit_rate * 100, compiler_cache.hits,
+                      compiler_cache.misses)
         return list(uniqued_build_actions.values()), skipped_cmp_cmd_count
 
     except (ValueError, KeyError, TypeError) as ex:
@@ -1325,3 +1970,14 @@ def parse_unique_log(compilation_database,
         LOG.debug(traceback.format_exc())
         LOG.debug(ex)
         sys.exit(1)
+    finally:
+        # The probes which did not start are not needed any more.
+        for _, future in ImplicitCompilerInfo.pending_probes.values():
+            future.cancel()
+        for future in ImplicitCompilerInfo.pending_versions.values():
+            future.cancel()
+        if executor is not None:
+            executor.shutdown()
+        ImplicitCompilerInfo.pending_probes.clear()
+        ImplicitCompilerInfo.pending_versions.clear()
+        ImplicitCompilerInfo.compiler_cache = None
@@ -0,0 +1,103 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Resolution of executable names in the search path, like shutil.which, with
+an in-memory index of the search path directories.
+"""
+
+import os
+import threading
+
+
+class PathIndex(object):
+    """
+    Index of the executables in the directories of a search path. Every
+    directory is scanned only once, when the first name is looked up. The
+    indexed files are only checked to be executable, which follows the
+    symbolic links, when their name is looked up.
+    """
+
+    __slots__ = ['directories', '_index', '_results', '_lock']
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.environ.get('PATH', os.defpath)
+        self.directories = [directory or os.curdir
+                            for directory in path.split(os.pathsep)]
+        self._index = None
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def _build(self):
+        """
+        Map the names in the directories of the search path to the paths of
+        the files in the order of the search path.
+        """
+        index = {}
+        for directory in dict.fromkeys(self.directories):
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        index.setdefault(entry.name, []).append(entry.path)
+            except OSError:
+                continue
+        return index
+
+    @staticmethod
+    def _is_executable(path):
+        return os.path.isfile(path) and os.access(path, os.X_OK)
+
+    def which(self, name):
+        """
+        Return the path of the executable with the given name, or None if it
+        is not found. Names with a directory part are not searched in the
+        search path.
+        """
+        if os.path.dirname(name):
+            return name if self._is_executable(name) else None
+
+        if name in self._results:
+            return self._results[name]
+
+        with self._lock:
+            if self._index is None:
+                self._index = self._build()
+
+        result = next((path for path in self._index.get(name, ())
+                       if self._is_executable(path)), None)
+        self._results[name] = result
+        return result
+
+    def clear(self):
+        """Scan the directories again at the next lookup."""
+        with self._lock:
+            self._index = None
+            self._results = {}
+
+
+_INDEXES = {}
+
+
+def get_index(path=None):
+    """
+    Return the PathIndex of the search path, which is the PATH environment
+    variable by default.
+    """
+    if path is None:
+        path = os.environ.get('PATH', os.defpath)
+
+    index = _INDEXES.get(path)
+    if index is None:
+        index = _INDEXES.setdefault(path, PathIndex(path))
+    return index
+
+
+def which(name, path=None):
+    """
+    Return the path of the executable with the given name in the search
+    path, or None if it is not found.
+    """
+    return get_index(path).which(name)
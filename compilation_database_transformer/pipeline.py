@@ -1,8 +1,32 @@
 import collections
+import collections.abc
 import functools
 import json
-from itertools import chain
-from typing import Any, Callable, IO, List, Iterable
+import os
+import traceback
+from itertools import chain, islice
+from typing import Any, Callable, IO, List, Iterable, Tuple
+
+from compilation_database_transformer.checkpoint import \
+    checkpointed, Journal
+from compilation_database_transformer.instrumentation import count_items, \
+    StepClock, StepStats
+from compilation_database_transformer.json_stream import iter_json_array, \
+    write_json_array
+from compilation_database_transformer.staging import DEFAULT_QUEUE_SIZE, \
+    run_staged
+from compilation_database_transformer.util import stable_digest_bytes
+
+
+class PipelineStepError(Exception):
+    """
+    Raised when a step of the pipeline fails while processing an entry.
+    The offending entry is available as the entry attribute.
+    """
+
+    def __init__(self, message: str, entry: Any):
+        super().__init__(message)
+        self.entry = entry
 
 
 def inv_compose(*fs: [Callable]):
@@ -23,132 +47,803 @@ def eager_map(f: Callable):
     return inv_compose(functools.partial(map, f), list)
 
 
+def lazy_map(f: Callable):
+    """
+    Map without forcing the evaluation of the resulting generator. The items
+    are only computed when the next step of the pipeline consumes them.
+    """
+    return functools.partial(map, f)
+
+
+def eager_flatten():
+    """
+    Flatten doubly nested lists one level deep, and force the evaluation of
+    the result.
+    """
+    return inv_compose(chain.from_iterable, list)
+
+
+def lazy_flatten():
+    """
+    Flatten doubly nested iterables one level deep without forcing the
+    evaluation of the result.
+    """
+    return chain.from_iterable
+
+
+def eager_filter(predicate: Callable):
+    """
+    Keep the items for which the predicate is true, and force the evaluation
+    of the result.
+    """
+    return inv_compose(functools.partial(filter, predicate), list)
+
+
+def lazy_filter(predicate: Callable):
+    """
+    Keep the items for which the predicate is true without forcing the
+    evaluation of the result.
+    """
+    return functools.partial(filter, predicate)
+
+
+def unique(key: Callable = None, keep: str = 'first'):
+    """
+    Return a function, which drops the items with the same key as another
+    item. The keys have to be JSON serializable, and only their digests are
+    stored. If the first item of each key is kept, the items are yielded
+    while they arrive, in their original order. If the last item is kept,
+    the items are buffered until the end of the input, and they are yielded
+    in the order of their last occurrence.
+    """
+    if keep not in ('first', 'last'):
+        raise ValueError("keep must be 'first' or 'last'.")
+
+    def digest(item: Any):
+        return stable_digest_bytes(item if key is None else key(item))
+
+    def keep_first(items: Iterable):
+        seen = set()
+        for item in items:
+            item_digest = digest(item)
+            if item_digest not in seen:
+                seen.add(item_digest)
+                yield item
+
+    def keep_last(items: Iterable):
+        last = {}
+        for item in items:
+            item_digest = digest(item)
+            # Move the key to the end of the insertion order.
+            last.pop(item_digest, None)
+            last[item_digest] = item
+        yield from last.values()
+
+    return keep_first if keep == 'first' else keep_last
+
+
+def chunked(iterable: Iterable, size: int):
+    """
+    Split the iterable into lists of the given size. The last list may be
+    shorter.
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def batch_map(f: Callable, batch_size: int):
+    """
+    Return a function, which maps an iterable of entries by calling f with
+    lists of at most batch_size entries, and yields the results one by one.
+    f has to return exactly one result for every entry in the batch, in the
+    order of the batch.
+    """
+    if batch_size < 1:
+        raise ValueError("The batch size must be positive.")
+
+    def run(entries: Iterable):
+        for batch in chunked(entries, batch_size):
+            results = f(batch)
+            if len(results) != len(batch):
+                raise PipelineStepError(
+                    "Batch mapping returned {0} results for {1} entries."
+                    .format(len(results), len(batch)), batch)
+            yield from results
+
+    return run
+
+
+def _map_chunk(mapping_func: Callable, chunk: List):
+    """
+    Map a chunk of entries in a worker process. If the mapping fails, the
+    results computed so far are returned together with the position of the
+    offending entry and the exception, so the parent process can report
+    which entry caused the failure.
+    """
+    results = []
+    for index, entry in enumerate(chunk):
+        try:
+            results.append(mapping_func(entry))
+        except Exception as ex:
+            return results, (index, ex, traceback.format_exc())
+    return results, None
+
+
+def parallel_map(f: Callable, workers: int = None, chunksize: int = 1,
+                 initializer: Callable = None, initargs: Tuple = ()):
+    """
+    Map over a pool of worker processes. The entries are sent to the workers
+    in chunks, and the results are yielded in the order of the input. Only a
+    bounded number of chunks are in flight at the same time, so the input is
+    consumed gradually. The mapping function and the entries have to be
+    picklable. The initializer is called with the initargs once in every
+    worker process, before it maps any entries.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    def run(entries: Iterable):
+        # Imported on first use, to keep the startup of the tool fast.
+        import concurrent.futures
+
+        with concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=initializer,
+                initargs=initargs) as executor:
+            max_pending = workers * 2
+            chunks = chunked(entries, chunksize)
+            pending = collections.deque(
+                (chunk, executor.submit(_map_chunk, f, chunk))
+                for chunk in islice(chunks, max_pending))
+
+            while pending:
+                chunk, future = pending.popleft()
+                results, failure = future.result()
+
+                if failure is not None:
+                    index, ex, trace = failure
+                    raise PipelineStepError(
+                        "Failed to process entry {0!r}:\n{1}".format(
+                            chunk[index], trace),
+                        chunk[index]) from ex
+
+                for next_chunk in islice(chunks, 1):
+                    pending.append((next_chunk, executor.submit(
+                        _map_chunk, f, next_chunk)))
+
+                yield from results
+
+    return run
+
+
+async def _semaphore(value: int):
+    """Create a semaphore bound to the running event loop."""
+    import asyncio
+
+    return asyncio.Semaphore(value)
+
+
+def async_map(f: Callable, concurrency: int = 16):
+    """
+    Map a coroutine function over the entries on a private event loop. At
+    most concurrency coroutines run at the same time, and the results are
+    yielded in the order of the input. The input is consumed gradually, as
+    the results are consumed.
+    """
+    def run(entries: Iterable):
+        # Imported on first use, to keep the startup of the tool fast.
+        import asyncio
+
+        loop = asyncio.new_event_loop()
+        semaphore = loop.run_until_complete(_semaphore(concurrency))
+
+        async def limited(entry):
+            async with semaphore:
+                return await f(entry)
+
+        entries = iter(entries)
+        pending = collections.deque()
+
+        def schedule(count):
+            for entry in islice(entries, count):
+                pending.append((entry, loop.create_task(limited(entry))))
+
+        try:
+            # Keep more tasks scheduled than allowed to run, so a slow entry
+            # at the head does not stop the others from starting.
+            schedule(concurrency * 2)
+            while pending:
+                entry, task = pending.popleft()
+                try:
+                    result = loop.run_until_complete(task)
+                except Exception as ex:
+                    raise PipelineStepError(
+                        "Failed to process entry {0!r}: {1}".format(entry, ex),
+                        entry) from ex
+
+                schedule(1)
+                yield result
+        finally:
+            for _, task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(
+                    *(task for _, task in pending), return_exceptions=True))
+            loop.close()
+
+    return run
+
+
+def step_name(func: Callable):
+    """Return a human readable name of a function used as a pipeline step."""
+    if isinstance(func, functools.partial):
+        return step_name(func.func)
+    return getattr(func, '__name__', None) or repr(func)
+
+
+class PipelineStep(object):
+    """
+    A step of the pipeline, with a label describing the builder method and
+    the function it was created from. Map steps also keep the mapping
+    function, so consecutive map and flatten steps can be fused. Concurrent
+    and batched map steps produce one result for each entry in order, like
+    map steps, but they are never fused. Filter steps keep their predicate
+    in place of the mapping function, and they are fused as well. Map and
+    concurrent map steps also keep the lazy form of their function, which
+    yields the results one by one even in an eager pipeline.
+    """
+
+    __slots__ = ['func', 'label', 'kind', 'mapping_func', 'queue_size',
+                 'lazy_func']
+
+    TRANSFORM = 0
+    MAP = 1
+    FLATTEN = 2
+    CONCURRENT_MAP = 3
+    FILTER = 4
+
+    def __init__(self, func: Callable, label: str, kind: int = TRANSFORM,
+                 mapping_func: Callable = None, queue_size: int = None,
+                 lazy_func: Callable = None):
+        self.func = func
+        self.label = label
+        self.kind = kind
+        self.mapping_func = mapping_func
+        self.queue_size = queue_size
+        self.lazy_func = lazy_func
+
+    def __call__(self, source: Any):
+        return self.func(source)
+
+    def __repr__(self):
+        return 'PipelineStep({0})'.format(self.label)
+
+
+def fuse_steps(steps: List[PipelineStep], lazy: bool):
+    """
+    Fuse a sequence of map and flatten steps into a single step, which
+    processes the items in one pass. The intermediate steps are chained as
+    iterators, and an eager step only collects the final results in a list.
+    If an eager sequence ends with a flatten, optionally followed by a single
+    map, the final results are collected with a list comprehension.
+    """
+    stages = [chain.from_iterable if step.kind == PipelineStep.FLATTEN else
+              functools.partial(
+                  filter if step.kind == PipelineStep.FILTER else map,
+                  step.mapping_func)
+              for step in steps]
+    label = ' + '.join(step.label for step in steps)
+    queue_size = steps[-1].queue_size
+
+    kinds = [step.kind for step in steps]
+    flat_end = kinds[-1] == PipelineStep.FLATTEN != kinds[-2]
+    flat_map_end = kinds[-2:] == [PipelineStep.FLATTEN, PipelineStep.MAP]
+    if lazy or not (flat_end or flat_map_end):
+        def run(source: Iterable):
+            for stage in stages:
+                source = stage(source)
+            return source if lazy else list(source)
+
+        return PipelineStep(run, label, queue_size=queue_size)
+
+    if flat_end:
+        def run_flatten(source: Iterable):
+            for stage in stages[:-1]:
+                source = stage(source)
+            return [item for items in source for item in items]
+
+        return PipelineStep(run_flatten, label, queue_size=queue_size)
+
+    last_func = steps[-1].mapping_func
+
+    def run_flat_map(source: Iterable):
+        for stage in stages[:-2]:
+            source = stage(source)
+        return [last_func(item) for items in source for item in items]
+
+    return PipelineStep(run_flat_map, label, queue_size=queue_size)
+
+
+def optimize_steps(steps: Iterable[PipelineStep], lazy: bool):
+    """
+    Return the steps with every run of consecutive map, filter and flatten
+    steps fused into a single step.
+    """
+    optimized = []
+    fusable = []
+    for step in chain(steps, [None]):
+        if step is not None and \
+                step.kind in (PipelineStep.MAP, PipelineStep.FLATTEN,
+                              PipelineStep.FILTER):
+            fusable.append(step)
+            continue
+
+        if len(fusable) > 1:
+            optimized.append(fuse_steps(fusable, lazy))
+        else:
+            optimized.extend(fusable)
+        fusable = []
+
+        if step is not None:
+            optimized.append(step)
+
+    return optimized
+
+
 class Pipeline:
     """
     A series of functions, intended to be executed sequentially,
     passing their results on the next step with each execution step.
+
+    By default every map and flatten step evaluates its whole input before
+    passing it on. A lazy pipeline chains generators instead, so the items
+    flow through the steps one at a time, and the result of feed is an
+    iterator which has to be consumed by the caller.
+
+    An instrumented pipeline measures the wall and CPU time, and the number
+    of items received and produced for each step. The measurements of the
+    last execution are available in the stats attribute. In a lazy pipeline
+    they are complete once the result of feed is consumed.
+
+    Before execution, consecutive map and flatten steps are fused, so the
+    items pass through them in a single pass, even in an eager pipeline.
+    This means that a map step may process an item before the previous map
+    step processed every item. Instrumented pipelines are not optimized, so
+    every step keeps its own measurements, and neither are staged pipelines,
+    so every step keeps its own thread.
+
+    A staged pipeline runs every step in its own thread, connected by
+    bounded queues, so the steps waiting for I/O overlap with the others,
+    and a slow step applies backpressure to the previous ones. Staged
+    pipelines are always lazy. The wall time of a staged step includes the
+    time it waits for its input, and the peak number of items in its output
+    queue is measured too.
     """
 
-    def __init__(self, pipeline: Iterable[Callable] = None):
+    def __init__(self, pipeline: Iterable[Callable] = None,
+                 lazy: bool = False, instrument: bool = False,
+                 optimize: bool = True, staged: bool = False,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.lazy = lazy or staged
+        self.instrument = instrument
+        self.optimize = optimize
+        self.staged = staged
+        self.queue_size = queue_size
+        self.stats = []
         self.pipeline = collections.deque()
         if pipeline is not None:
-            self.pipeline.extend(pipeline)
+            self.pipeline.extend(
+                PipelineStep(func, 'transform({0})'.format(step_name(func)))
+                for func in pipeline)
+
+    @staticmethod
+    def _step(func: Callable, builder: str, name: str = '',
+              kind: int = PipelineStep.TRANSFORM):
+        return PipelineStep(func, '{0}({1})'.format(builder, name), kind)
+
+    def _map_step(self, mapping_func: Callable, builder: str, name: str = ''):
+        return PipelineStep(self._map(mapping_func),
+                            '{0}({1})'.format(builder, name),
+                            PipelineStep.MAP, mapping_func,
+                            lazy_func=lazy_map(mapping_func))
+
+    def _concurrent_map_step(self, run: Callable, builder: str, name: str):
+        return PipelineStep(run if self.lazy else inv_compose(run, list),
+                            '{0}({1})'.format(builder, name),
+                            PipelineStep.CONCURRENT_MAP, lazy_func=run)
+
+    def _flatten_step(self, builder: str):
+        return PipelineStep(self._flatten(), '{0}()'.format(builder),
+                            PipelineStep.FLATTEN)
+
+    def _prepend(self, step: PipelineStep):
+        self.pipeline.appendleft(step)
+        return self
+
+    def _append(self, step: PipelineStep):
+        self.pipeline.append(step)
+        return self
+
+    def _map(self, mapping_func: Callable):
+        return lazy_map(mapping_func) if self.lazy else eager_map(mapping_func)
+
+    def _filter(self, predicate: Callable):
+        return lazy_filter(predicate) if self.lazy else eager_filter(predicate)
+
+    def _unique(self, key: Callable, keep: str):
+        run = unique(key, keep)
+        return run if self.lazy else inv_compose(run, list)
+
+    def _flatten(self):
+        return lazy_flatten() if self.lazy else eager_flatten()
 
     def prepend_transform(self, transform_func: Callable):
         """
         Prepend an action, which feeds the input data in the pipeline to the
         transform_func.
         """
-        self.pipeline.appendleft(transform_func)
-        return self
+        return self._prepend(self._step(transform_func, 'prepend_transform',
+                                        step_name(transform_func)))
 
     def append_transform(self, transform_func: Callable):
         """
         Append an action, which feeds the data at this point in the pipeline
         to the transform_func.
         """
-        self.pipeline.append(transform_func)
-        return self
+        return self._append(self._step(transform_func, 'append_transform',
+                                       step_name(transform_func)))
 
     def prepend_map(self, mapping_func: Callable):
         """
         Prepend an action, which maps the input data in the pipeline to the
         mapping_func.
         """
-        self.pipeline.appendleft(eager_map(mapping_func))
-        return self
+        return self._prepend(self._map_step(mapping_func, 'prepend_map',
+                                            step_name(mapping_func)))
 
     def append_map(self, mapping_func: Callable):
         """
         Append an action, which maps the data at this point in the pipeline
         to the mapping_func.
         """
-        self.pipeline.append(eager_map(mapping_func))
-        return self
+        return self._append(self._map_step(mapping_func, 'append_map',
+                                           step_name(mapping_func)))
+
+    def append_parallel_map(self, mapping_func: Callable,
+                            workers: int = None, chunksize: int = 1,
+                            initializer: Callable = None,
+                            initargs: Tuple = ()):
+        """
+        Append an action, which maps the data at this point in the pipeline
+        to the mapping_func using a pool of worker processes. The order of
+        the results is the same as the order of the input. If the mapping
+        fails on an entry, a PipelineStepError is raised with the offending
+        entry attached.
+
+        workers -- The number of worker processes. The number of CPUs is
+                   used by default.
+        chunksize -- The number of entries sent to a worker at once.
+        initializer -- Called with the initargs once in every worker process,
+                       e.g. to create the state shared by the mappings.
+        """
+        return self._append(self._concurrent_map_step(
+            parallel_map(mapping_func, workers, chunksize, initializer,
+                         initargs),
+            'append_parallel_map', step_name(mapping_func)))
+
+    def append_batch_map(self, batch_func: Callable, batch_size: int = 64):
+        """
+        Append an action, which maps the data at this point in the pipeline
+        to the batch_func in batches, so its fixed costs are amortized over
+        several entries. The batch_func receives a list of at most batch_size
+        entries, the last batch may be shorter, and it has to return a list
+        of the results in the same order. If the number of results differs,
+        a PipelineStepError is raised with the batch attached.
+        """
+        return self._append(self._concurrent_map_step(
+            batch_map(batch_func, batch_size),
+            'append_batch_map', step_name(batch_func)))
+
+    def append_async_map(self, coroutine_func: Callable,
+                         concurrency: int = 16):
+        """
+        Append an action, which maps the data at this point in the pipeline
+        to the coroutine function. The coroutines run concurrently on an
+        event loop, which suits steps waiting for subprocesses or other I/O.
+        The order of the results is the same as the order of the input. If
+        the coroutine fails on an entry, a PipelineStepError is raised with
+        the offending entry attached.
+
+        concurrency -- The maximal number of coroutines running at the same
+                       time.
+        """
+        return self._append(self._concurrent_map_step(
+            async_map(coroutine_func, concurrency),
+            'append_async_map', step_name(coroutine_func)))
+
+    def append_filter(self, predicate: Callable):
+        """
+        Append an action, which drops the data at this point in the pipeline
+        for which the predicate is false.
+        """
+        return self._append(PipelineStep(
+            self._filter(predicate),
+            'append_filter({0})'.format(step_name(predicate)),
+            PipelineStep.FILTER, predicate))
+
+    def append_unique(self, key: Callable = None, keep: str = 'first'):
+        """
+        Append an action, which drops the data at this point in the pipeline
+        with the same key as another item. The key function should return a
+        JSON serializable value, by default the item itself is the key.
+
+        keep -- 'first' keeps the first item of each key, and passes the
+                items on while they arrive. 'last' keeps the last one, which
+                needs the whole input before passing anything on.
+        """
+        return self._append(self._step(
+            self._unique(key, keep), 'append_unique',
+            step_name(key) if key is not None else ''))
 
     def prepend_pipe(self, pipe: 'Pipeline'):
         """
         Prepend an action, which feeds the input data in the pipeline to the
         first step of the pipe given.
         """
-        self.prepend_transform(pipe.feed)
-        return self
+        return self._prepend(self._step(pipe.feed, 'prepend_pipe'))
 
     def append_pipe(self, pipe: 'Pipeline'):
         """
         Append an action, which feeds the data at this point in the pipeline
         to the first step of the pipe given.
         """
-        self.append_transform(pipe.feed)
-        return self
+        return self._append(self._step(pipe.feed, 'append_pipe'))
 
     def prepend_pipe_map(self, pipe: 'Pipeline'):
         """
         Prepend an action, which maps the input data in the pipeline to the
         first step of the pipe given.
         """
-        self.prepend_map(pipe.feed)
-        return self
+        return self._prepend(self._map_step(pipe.feed, 'prepend_pipe_map'))
 
     def append_pipe_map(self, pipe: 'Pipeline'):
         """
         Append an action, which maps the data at this point in the pipeline
         to the first step of the pipe given.
         """
-        self.append_map(pipe.feed)
-        return self
+        return self._append(self._map_step(pipe.feed, 'append_pipe_map'))
 
     def pre_flatten(self):
         """
         Prepend an action, which transforms doubly nested lists only one
         level deep.
         """
-        self.prepend_transform(inv_compose(
-            chain.from_iterable,
-            list
-        ))
-        return self
+        return self._prepend(self._flatten_step('pre_flatten'))
 
     def flatten(self):
         """
         Append an action, which transforms doubly nested lists only one
         level deep.
         """
-        self.append_transform(inv_compose(
-            chain.from_iterable,
-            list
-        ))
+        return self._append(self._flatten_step('flatten'))
+
+    def queue(self, queue_size: int):
+        """
+        Set the size of the queue which passes the results of the last step
+        to the next one in a staged pipeline.
+        """
+        self.pipeline[-1].queue_size = queue_size
         return self
 
+    def checkpoint(self, journal: Journal):
+        """
+        Record the results of the last map step in the journal, and skip the
+        entries which already have a result in it. Entries are identified by
+        a digest of their content, so they have to be JSON serializable, and
+        so do the results. This makes a pipeline, which was interrupted while
+        running an expensive map step, resumable from the journal. The
+        results are recorded one by one also in an eager pipeline, so an
+        interruption keeps the results computed before it.
+        """
+        for index in range(len(self.pipeline) - 1, -1, -1):
+            step = self.pipeline[index]
+            if step.kind in (PipelineStep.MAP, PipelineStep.CONCURRENT_MAP):
+                break
+        else:
+            raise ValueError("The pipeline has no map step to checkpoint.")
+
+        run = checkpointed(step.lazy_func, journal)
+        self.pipeline[index] = PipelineStep(
+            run if self.lazy else inv_compose(run, list),
+            'checkpoint({0})'.format(step.label), queue_size=step.queue_size)
+        return self
+
+    def compile(self):
+        """
+        Return an immutable execution plan of the pipeline, which can be fed
+        any number of times. The steps are optimized only once, and adding
+        steps to the pipeline later does not change the plan.
+        """
+        steps = self.pipeline \
+            if self.instrument or self.staged or not self.optimize \
+            else optimize_steps(self.pipeline, self.lazy)
+        return CompiledPipeline(steps, self.instrument, self.staged,
+                                self.queue_size)
+
     def feed(self, source: Any):
         """
         Execute the steps of the pipeline by feeding input into the first one,
         and executing every step using the intermediate results.
         """
-        for pipeline_step in self.pipeline:
+        plan = self.compile()
+        result = plan.feed(source)
+        self.stats = plan.stats
+        return result
+
+
+class CompiledPipeline(object):
+    """
+    The execution plan of a pipeline, created by Pipeline.compile. The steps
+    of the plan can not be changed, so the same plan can be fed several
+    times. The measurements of an instrumented plan are available in the
+    stats attribute after each execution. Every execution is measured
+    separately, but the stats attribute holds the measurements of the last
+    one started, so only an uninstrumented plan should be fed from several
+    threads at the same time.
+    """
+
+    __slots__ = ['steps', 'queue_sizes', 'instrument', 'staged', 'stats']
+
+    def __init__(self, steps: Iterable[PipelineStep], instrument: bool,
+                 staged: bool, queue_size: int):
+        self.steps = tuple(steps)
+        self.queue_sizes = tuple(queue_size if step.queue_size is None
+                                 else step.queue_size for step in self.steps)
+        self.instrument = instrument
+        self.staged = staged
+        self.stats = []
+
+    def feed(self, source: Any):
+        """
+        Execute the steps of the plan by feeding input into the first one,
+        and executing every step using the intermediate results.
+        """
+        return self._run(self.steps, self.queue_sizes, source)
+
+    def _run(self, steps: Tuple[PipelineStep, ...],
+             queue_sizes: Tuple[int, ...], source: Any):
+        stats = []
+        if self.instrument:
+            steps = self._instrumented_steps(steps, source, stats)
+            self.stats = stats
+
+        if self.staged and steps:
+            return self._feed_staged(steps, queue_sizes, source, stats)
+
+        for pipeline_step in steps:
             source = pipeline_step(source)
         return source
 
+    @staticmethod
+    def _instrumented_steps(steps: Iterable[PipelineStep], source: Any,
+                            stats: List[StepStats]):
+        clock = StepClock()
+        measured = []
+        for pipeline_step in steps:
+            step_stats = StepStats(pipeline_step.label,
+                                   stats[-1] if stats else None)
+            if not stats:
+                step_stats.items_in = count_items(source)
+            stats.append(step_stats)
+            measured.append(PipelineStep(
+                functools.partial(clock.measure, step_stats, pipeline_step),
+                pipeline_step.label))
+        return measured
+
+    @staticmethod
+    def _feed_staged(steps: List[PipelineStep], queue_sizes: Tuple[int, ...],
+                     source: Any, stats: List[StepStats]):
+        result, channels = run_staged(steps, source, queue_sizes)
+
+        if not stats:
+            return result
+
+        def record_peaks():
+            for step_stats, channel in zip(stats, channels):
+                step_stats.queue_peak = channel.peak
+
+        if not isinstance(result, collections.abc.Iterator):
+            record_peaks()
+            return result
+
+        def items():
+            try:
+                yield from result
+            finally:
+                record_peaks()
+
+        return items()
+
 
 class JsonPipeline(Pipeline):
     """
     JsonPipeline has a fixed prefix step for reading a list of JSON
     IO-sources, and fixed postfix step for serializing the result in JSON
     format.
+
+    If streaming is requested, the sources are decoded incrementally, and
+    every source is passed on as an iterator over its entries instead of a
+    list. The results are always serialized one by one as they arrive, with
+    indentation or, in compact mode, without any whitespace.
     """
 
-    def __init__(self, output: IO, pipeline: List[Callable] = None):
-        super().__init__(pipeline)
-        self.prepend_map(json.load)
+    def __init__(self, output: IO, pipeline: List[Callable] = None,
+                 lazy: bool = False, stream: bool = False,
+                 compact: bool = False, instrument: bool = False,
+                 optimize: bool = True, staged: bool = False,
+                 queue_size: int = DEFAULT_QUEUE_SIZE):
+        super().__init__(pipeline, lazy, instrument, optimize, staged,
+                         queue_size)
+        self.prepend_map(iter_json_array if stream else json.load)
         self.output = output
+        self.compact = compact
+
+    def compile(self):
+        """
+        Return an immutable execution plan of the pipeline, which can be fed
+        any number of times, with a different output each time.
+        """
+        plan = super().compile()
+        return CompiledJsonPipeline(plan.steps, self.instrument, self.staged,
+                                    self.queue_size, self.output,
+                                    self.compact)
 
-    def feed(self, json_sources: List[IO]):
+    def feed(self, json_sources: List[IO], output: IO = None):
         """
         Using the provided inputs, process every step in the pipeline, and
-        return the results.
+        write the results to the output, which is the output of the pipeline
+        by default. Return the number of results written.
         """
+        plan = self.compile()
+        result = plan.feed(json_sources, output)
+        self.stats = plan.stats
+        return result
 
-        # Write the results in a JSON format.
-        self.append_transform(
-            lambda results: json.dump(results, self.output, indent=2))
-        return super().feed(json_sources)
+    def write(self, results: Iterable):
+        """
+        Serialize the results to the output, and return the number of
+        results written.
+        """
+        return write_json_array(results, self.output, self.compact)
+
+
+class CompiledJsonPipeline(CompiledPipeline):
+    """
+    The execution plan of a JsonPipeline. The serialization of the results
+    is not part of the precomposed steps, as the output may change with
+    every execution.
+    """
+
+    __slots__ = ['output', 'compact']
+
+    def __init__(self, steps: Iterable[PipelineStep], instrument: bool,
+                 staged: bool, queue_size: int, output: IO, compact: bool):
+        super().__init__(steps, instrument, staged, queue_size)
+        self.output = output
+        self.compact = compact
+        self.queue_sizes = self.queue_sizes + (queue_size,)
+
+    def feed(self, json_sources: List[IO], output: IO = None):
+        """
+        Using the provided inputs, process every step in the plan, and write
+        the results to the output, which is the output of the pipeline by
+        default. Return the number of results written.
+        """
+        write = functools.partial(
+            write_json_array,
+            output=self.output if output is None else output,
+            compact=self.compact)
+        write_step = PipelineStep(write, 'append_transform(write)')
+        return self._run(self.steps + (write_step,), self.queue_sizes,
+                         json_sources)
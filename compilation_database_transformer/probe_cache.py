@@ -0,0 +1,111 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Caching of the file system probes of include directories, so every directory
+is examined only once, even if it is used by many compile commands.
+"""
+
+import glob
+import os
+import stat
+
+
+def _stat(path):
+    try:
+        return os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _stamp(status):
+    """Identify a version of a directory, which changes with its content."""
+    if status is None:
+        return None
+    return status.st_mtime_ns, status.st_ino, status.st_dev
+
+
+class _Probe(object):
+    """The cached results of probing a path."""
+
+    __slots__ = ['stamp', 'exists', 'is_dir', 'no_intrinsic_headers']
+
+    def __init__(self, status):
+        self.stamp = _stamp(status)
+        self.exists = status is not None
+        self.is_dir = status is not None and stat.S_ISDIR(status.st_mode)
+        self.no_intrinsic_headers = None
+
+
+class ProbeCache(object):
+    """
+    Cache the results of the file system probes of paths. By default every
+    path is examined only once. If validation is requested, the path is
+    stat'ed for every query, and the results are computed again only if its
+    modification time changed, which is the case if files were added to or
+    removed from a directory.
+
+    Every query is counted as a hit, if it is answered without reading the
+    file system apart from the validation, otherwise as a miss.
+    """
+
+    __slots__ = ['validate', 'hits', 'misses', '_probes']
+
+    def __init__(self, validate=False):
+        self.validate = validate
+        self.hits = 0
+        self.misses = 0
+        self._probes = {}
+
+    def _probe(self, path):
+        """Return the probe of the path, and whether it was cached."""
+        probe = self._probes.get(path)
+        if probe is not None and not self.validate:
+            return probe, True
+
+        status = _stat(path)
+        if probe is not None and probe.stamp == _stamp(status):
+            return probe, True
+
+        probe = _Probe(status)
+        self._probes[path] = probe
+        return probe, False
+
+    def _count(self, cached):
+        if cached:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def isdir(self, path):
+        """Same as os.path.isdir."""
+        probe, cached = self._probe(path)
+        self._count(cached)
+        return probe.is_dir
+
+    def contains_no_intrinsic_headers(self, dirname):
+        """
+        Returns True if the given directory doesn't contain any intrinsic
+        headers.
+        """
+        probe, cached = self._probe(dirname)
+        if probe.exists and probe.no_intrinsic_headers is None:
+            probe.no_intrinsic_headers = \
+                not glob.glob(os.path.join(dirname, "*intrin.h"))
+            cached = False
+
+        self._count(cached)
+        return not probe.exists or probe.no_intrinsic_headers
+
+    @property
+    def hit_rate(self):
+        """The ratio of the queries answered from the cache."""
+        queries = self.hits + self.misses
+        return self.hits / queries if queries else 0.0
+
+    def clear(self):
+        self._probes.clear()
+        self.hits = 0
+        self.misses = 0
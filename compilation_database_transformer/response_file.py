@@ -0,0 +1,111 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Reading and tokenizing the response files of compile commands, which are
+given as @file parameters.
+"""
+
+import logging
+import mmap
+import os
+import shlex
+
+LOG = logging.getLogger('response_file')
+
+# Response files of at least this size are memory mapped instead of read.
+MMAP_THRESHOLD = 1 << 20
+
+
+def read_response_file(path, size=None):
+    """
+    Return the content of the response file as text. Large files are memory
+    mapped.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+
+    if size < MMAP_THRESHOLD:
+        with open(path, encoding='utf-8', errors='ignore') as handle:
+            return handle.read()
+
+    with open(path, 'rb') as handle, \
+            mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return mapped[:].decode('utf-8', errors='ignore')
+
+
+class ResponseFileCache(object):
+    """
+    Cache the tokens of the response files, so a response file referenced
+    by many compile commands is read and tokenized only once. The cached
+    tokens are keyed by the path, and are valid as long as the modification
+    time and the size of the file do not change.
+    """
+
+    __slots__ = ['hits', 'misses', '_tokens']
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._tokens = {}
+
+    def __len__(self):
+        return len(self._tokens)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def tokens(self, path):
+        """Return the tokens of the response file as a tuple."""
+        status = os.stat(path)
+        stamp = (status.st_mtime_ns, status.st_size)
+
+        cached = self._tokens.get(path)
+        if cached is not None and cached[0] == stamp:
+            self.hits += 1
+            return cached[1]
+
+        self.misses += 1
+        tokens = tuple(shlex.split(read_response_file(path,
+                                                      status.st_size)))
+        self._tokens[path] = (stamp, tokens)
+        return tokens
+
+    def expand(self, path, directory, active=()):
+        """
+        Return the tokens of the response file as a list, where the nested
+        @file references are replaced by the tokens of the referenced
+        response files. The nested references are relative to directory.
+        A response file which references itself, directly or through other
+        response files, is not expanded again.
+
+        active -- The real paths of the response files being expanded.
+        """
+        real_path = os.path.realpath(path)
+        if real_path in active:
+            LOG.warning("Response file '%s' references itself.", path)
+            return []
+        active = active + (real_path,)
+
+        options = []
+        for token in self.tokens(path):
+            if not token.startswith('@'):
+                options.append(token)
+                continue
+
+            nested = os.path.join(directory, token[1:])
+            if not os.path.exists(nested):
+                LOG.warning("Response file '%s' does not exists.", nested)
+                continue
+            options.extend(self.expand(nested, directory, active))
+
+        return options
+
+    def clear(self):
+        self._tokens.clear()
+        self.hits = 0
+        self.misses = 0
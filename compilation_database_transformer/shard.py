@@ -0,0 +1,136 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Splitting of compilation databases into shards, which can be processed
+independently, and merging the results of the shards in the original order.
+"""
+
+import argparse
+import collections
+import hashlib
+import logging
+import os
+from typing import Dict, Iterable, Tuple
+
+from compilation_database_transformer.util import stable_digest
+
+LOG = logging.getLogger('shard')
+
+
+def parse_shard(text: str):
+    """
+    Parse a shard specification of the form i/N, where N is the number of
+    shards, and i is the zero based index of the selected shard.
+    """
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "Shard must be given as INDEX/COUNT, e.g. 0/4: {0}".format(text))
+
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(
+            "Shard index must be between 0 and {0}: {1}"
+            .format(count - 1, text))
+
+    return index, count
+
+
+def shard_of(entry: Dict, count: int):
+    """
+    Return the shard of a compilation database entry. The shard only depends
+    on the directory and the file of the entry, so it is the same on every
+    machine and in every run.
+    """
+    key = '{0}\0{1}'.format(entry.get('directory', ''), entry.get('file', ''))
+    digest = hashlib.blake2b(key.encode('utf-8', errors='surrogatepass'),
+                             digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % count
+
+
+def in_shard(shard: Tuple[int, int], entry: Dict):
+    """Return True if the entry belongs to the shard given as (i, N)."""
+    index, count = shard
+    return shard_of(entry, count) == index
+
+
+def select_shard(shard: Tuple[int, int], entries: Iterable[Dict]):
+    """Yield the entries of the compilation database in the shard."""
+    index, count = shard
+    for entry in entries:
+        if shard_of(entry, count) == index:
+            yield entry
+
+
+def entry_keys(entry: Dict):
+    """
+    Return the keys which identify the source file of an entry: the
+    normalized absolute path if the entry has a directory, and the
+    normalized file as it is written in the entry.
+    """
+    file_path = os.path.normpath(entry['file'])
+    if 'directory' not in entry:
+        return file_path, file_path
+    return os.path.normpath(os.path.join(entry['directory'], file_path)), \
+        file_path
+
+
+def merge_shards(order: Iterable[Dict], shard_results: Iterable[Iterable]):
+    """
+    Yield the results of the shards in the order of the entries of the
+    original compilation database they were created from. The results of
+    the shards have to be given in the order of the shard indices. Every
+    entry is matched to the next result of its shard with the same source
+    file, so several entries of the same file keep their order too. Entries
+    without a result are skipped, and the results which can not be matched
+    to any entry are yielded at the end.
+
+    If a source file has fewer results than entries, e.g. because clangify
+    dropped the duplicate entries, the entries identical to an earlier
+    entry of the same file are the ones without a result.
+    """
+    shards = []
+    for shard in shard_results:
+        results = collections.OrderedDict()
+        for result in shard:
+            results.setdefault(entry_keys(result)[0], collections.deque()) \
+                .append(result)
+        shards.append(results)
+
+    matched = []
+    entry_counts = collections.Counter()
+    for entry in order:
+        index = shard_of(entry, len(shards))
+        key = next((key for key in entry_keys(entry) if key in shards[index]),
+                   None)
+        matched.append((entry, index, key))
+        entry_counts[index, key] += 1
+
+    # The number of entries of every source file without a result.
+    missing = {shard_key: count - len(shards[shard_key[0]][shard_key[1]])
+               for shard_key, count in entry_counts.items()
+               if shard_key[1] is not None}
+    seen = set()
+    for entry, index, key in matched:
+        if key is None:
+            continue
+
+        digest = stable_digest(entry)
+        if missing[index, key] > 0 and digest in seen:
+            missing[index, key] -= 1
+            continue
+        seen.add(digest)
+
+        matching = shards[index][key]
+        if matching:
+            yield matching.popleft()
+
+    for results in shards:
+        for key, unmatched in results.items():
+            if unmatched:
+                LOG.warning("%d results for %s do not match any entry.",
+                            len(unmatched), key)
+                yield from unmatched
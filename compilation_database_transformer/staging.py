@@ -0,0 +1,184 @@
+# -------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -------------------------------------------------------------------------
+"""
+Staged execution of pipeline steps, where every step runs in its own thread,
+and the steps are connected by bounded queues.
+"""
+
+import collections.abc
+import queue
+import threading
+from typing import Any, Callable, Iterable, List
+
+DEFAULT_QUEUE_SIZE = 256
+
+# The time in seconds a blocked stage waits before checking whether the
+# execution was stopped.
+POLL_INTERVAL = 0.05
+
+# The kinds of messages passed between the stages.
+ITEM = 0
+END = 1
+RESULT = 2
+
+
+class Stopped(BaseException):
+    """
+    Raised in a stage when the execution is stopped, because another stage
+    failed, or the consumer of the results closed them. It is not an
+    Exception, so the steps do not catch it accidentally.
+    """
+
+
+class StageControl(object):
+    """The state shared by the stages of an execution."""
+
+    __slots__ = ['stop', 'error']
+
+    def __init__(self):
+        self.stop = threading.Event()
+        self.error = None
+
+    def fail(self, error: BaseException):
+        """Stop every stage, and keep the first error."""
+        if self.error is None:
+            self.error = error
+        self.stop.set()
+
+
+class Channel(object):
+    """
+    A bounded queue between two stages. A producer is blocked while the
+    queue is full, so a slow stage slows down the previous ones instead of
+    letting the queued items grow without limit. The peak number of queued
+    messages is recorded.
+    """
+
+    __slots__ = ['queue', 'control', 'peak']
+
+    def __init__(self, size: int, control: StageControl):
+        self.queue = queue.Queue(size)
+        self.control = control
+        self.peak = 0
+
+    def put(self, kind: int, value: Any = None):
+        while True:
+            if self.control.stop.is_set():
+                raise Stopped()
+            try:
+                self.queue.put((kind, value), timeout=POLL_INTERVAL)
+                break
+            except queue.Full:
+                pass
+
+        self.peak = max(self.peak, self.queue.qsize())
+
+    def get(self):
+        while True:
+            if self.control.stop.is_set():
+                raise Stopped()
+            try:
+                return self.queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def send(self, result: Any):
+        """
+        Send the result of a step. Iterators are sent item by item, other
+        results as a single message.
+        """
+        if not isinstance(result, collections.abc.Iterator):
+            self.put(RESULT, result)
+            return
+
+        for item in result:
+            self.put(ITEM, item)
+        self.put(END)
+
+    def _items(self, first: Any):
+        yield first
+        while True:
+            kind, value = self.get()
+            if kind == END:
+                return
+            yield value
+
+    def receive(self):
+        """
+        Receive the result of the previous step. If it was sent item by item,
+        an iterator over the items is returned.
+        """
+        kind, value = self.get()
+        if kind == RESULT:
+            return value
+        if kind == END:
+            return iter(())
+        return self._items(value)
+
+
+def _run_stage(step: Callable, source: Any, channel: Channel):
+    try:
+        if isinstance(source, Channel):
+            source = source.receive()
+        channel.send(step(source))
+    except Stopped:
+        pass
+    except BaseException as ex:
+        channel.control.fail(ex)
+
+
+def run_staged(steps: List[Callable], source: Any,
+               queue_sizes: Iterable[int]):
+    """
+    Execute the steps, each in its own thread, connected by queues of the
+    given sizes. If the last step returns an iterator, an iterator over its
+    items is returned, which has to be consumed or closed by the caller.
+    Otherwise the result of the last step is returned once every step
+    finished. An exception raised by any of the steps is raised again to the
+    caller. Return the result, and the channels after the steps.
+    """
+    control = StageControl()
+    channels = [Channel(size, control) for size in queue_sizes]
+    threads = []
+    for step, channel in zip(steps, channels):
+        thread = threading.Thread(target=_run_stage,
+                                  args=(step, source, channel), daemon=True)
+        thread.start()
+        threads.append(thread)
+        source = channel
+
+    def finish():
+        control.stop.set()
+        for thread in threads:
+            thread.join()
+
+    def items(first: Any):
+        try:
+            yield first
+            while True:
+                kind, value = channels[-1].get()
+                if kind == END:
+                    break
+                yield value
+        except Stopped:
+            raise control.error
+        finally:
+            finish()
+
+    try:
+        kind, value = channels[-1].get()
+    except Stopped:
+        finish()
+        raise control.error
+    except BaseException:
+        finish()
+        raise
+
+    if kind == ITEM:
+        return items(value), channels
+
+    finish()
+    return (iter(()) if kind == END else value), channels
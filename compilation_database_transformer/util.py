@@ -1,5 +1,7 @@
+import hashlib
 import json
 import logging
+import re
 
 LOG = logging.getLogger('util')
 
@@ -35,3 +37,43 @@ def load_json_or_empty(path, default=None, kind=None):
         LOG.warning(ex)
 
     return ret
+
+
+def stable_digest_bytes(obj, digest_size=16):
+    """
+    Return a digest of a JSON serializable object, which is the same in
+    every process and run, as opposed to the builtin hash.
+    """
+    serialized = json.dumps(obj, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(serialized.encode('utf-8', errors='surrogatepass'),
+                           digest_size=digest_size).digest()
+
+
+def stable_digest(obj, digest_size=16):
+    """
+    Return the digest of a JSON serializable object as a hexadecimal string.
+    """
+    return stable_digest_bytes(obj, digest_size).hex()
+
+
+class LazyPattern(object):
+    """
+    A regular expression, which is compiled when it is first used. The
+    source of the pattern is available without compiling it.
+    """
+
+    __slots__ = ['pattern', 'flags', '_compiled']
+
+    def __init__(self, pattern, flags=0):
+        self.pattern = pattern
+        self.flags = flags
+        self._compiled = None
+
+    def compiled(self):
+        """Return the compiled regular expression."""
+        if self._compiled is None:
+            self._compiled = re.compile(self.pattern, self.flags)
+        return self._compiled
+
+    def __getattr__(self, name):
+        return getattr(self.compiled(), name)
@@ -0,0 +1,75 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+Measure the throughput of the compiler flag processing of parse_options for
+GCC and Clang compile commands with a realistic mix of flags, with and
+without the parse cache. The commands differ only in the source file and the
+output, like in the compilation databases generated by CMake.
+
+    python3 -m tests.benchmark.bench_parse_options [number of entries]
+"""
+
+import sys
+import timeit
+
+from compilation_database_transformer import log_parser
+
+
+FLAGS = [
+    '-c', '-O2', '-g', '-pipe', '-fPIC', '-fno-strict-aliasing',
+    '-fstack-protector-strong', '-fvisibility=hidden', '-m64',
+    '-march=x86-64', '-mtune=generic', '-std=gnu++17', '-pedantic',
+    '-Wall', '-Wextra', '-Werror', '-Wno-unused-parameter', '-Wshadow',
+    '-Wformat=2', '-DNDEBUG', '-D_GNU_SOURCE', '-DVERSION="1.0"',
+    '-DHAVE_CONFIG_H', '-I.', '-Iinclude', '-I', 'third_party/include',
+    '-isystem', '/usr/local/include', '-include', 'config.h', '-MD',
+    '-MF', 'obj/main.o.d', '-MT', 'obj/main.o', '-x', 'c++',
+    '-flto', '-ffunction-sections', '-fdata-sections', '--param',
+    'max-inline-insns-single=1000', '-save-temps']
+
+FLAGS = FLAGS + ['-I' + 'include/module{0}'.format(i) for i in range(20)] + \
+    ['-DFEATURE_{0}=1'.format(i) for i in range(20)]
+
+
+def entries(compiler, count):
+    return [{'directory': '/tmp/build',
+             'arguments': [compiler] + FLAGS + [
+                 '-o', 'obj/main{0}.o'.format(i), 'src/main{0}.cpp'.format(i)],
+             'file': 'src/main{0}.cpp'.format(i)}
+            for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    tokens = count * (len(FLAGS) + 3)
+
+    # Pretend to know the compilers, so no compiler is invoked.
+    ici = log_parser.ImplicitCompilerInfo
+    ici.compiler_versions.update({'bench-gcc': False, 'bench-clang': True})
+    ici.compiler_info['bench-gcc'] = {'c': {}, 'c++': {}}
+
+    for compiler in ['bench-gcc', 'bench-clang']:
+        source = entries(compiler, count)
+        for cached in [False, True]:
+            def run():
+                parse_cache = log_parser.OptionParseCache() if cached \
+                    else None
+                for entry in source:
+                    log_parser.parse_options(entry,
+                                             keep_gcc_include_fixed=True,
+                                             keep_gcc_intrin=True,
+                                             parse_cache=parse_cache)
+
+            seconds = min(timeit.repeat(run, number=1, repeat=3))
+            print("{0:12} cached={1!s:5} {2:12,.0f} tokens/s "
+                  "{3:8.1f} us/entry".format(compiler, cached,
+                                             tokens / seconds,
+                                             seconds / count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+Measure the resolution of compiler names in the search path with the indexed
+lookup, compared with walking the search path like shutil.which does, and
+the time of the first lookup which scans the search path directories.
+
+    python3 -m tests.benchmark.bench_path_lookup [number of lookups]
+"""
+
+import shutil
+import sys
+import time
+import timeit
+
+from compilation_database_transformer.path_lookup import PathIndex
+
+
+NAMES = ['gcc', 'g++', 'cc', 'c++', 'clang', 'clang++',
+         'arm-none-eabi-gcc', 'aarch64-linux-gnu-g++', 'ccache', 'icc']
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    names = [NAMES[i % len(NAMES)] for i in range(count)]
+
+    start = time.perf_counter()
+    PathIndex().which('gcc')
+    print("{0:12} {1:8.1f} ms".format('index build',
+                                      (time.perf_counter() - start) * 1e3))
+
+    def walk():
+        for name in names:
+            shutil.which(name)
+
+    def indexed():
+        index = PathIndex()
+        for name in names:
+            index.which(name)
+
+    for label, run in [('shutil.which', walk), ('PathIndex', indexed)]:
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        print("{0:12} {1:8.2f} us/lookup".format(label,
+                                                 seconds / count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+Measure the per-entry overhead of the Pipeline steps with and without step
+fusion on a synthetic input.
+
+    python3 -m tests.benchmark.bench_pipeline [number of entries]
+"""
+
+import collections
+import operator
+import sys
+import timeit
+
+from compilation_database_transformer.pipeline import Pipeline
+
+
+def build(optimize, lazy=False):
+    """
+    A pipeline with the same shape as the one of the clangify command, with
+    trivial step functions, so the overhead of the pipeline dominates.
+    """
+    return Pipeline(lazy=lazy, optimize=optimize) \
+        .append_map(lambda entry: ([entry], 0)) \
+        .append_map(operator.itemgetter(0)) \
+        .flatten() \
+        .append_map(str) \
+        .append_transform(collections.deque(maxlen=0).extend)
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    source = list(range(entries))
+
+    for lazy in [False, True]:
+        for optimize in [False, True]:
+            pipeline = build(optimize, lazy)
+            seconds = min(timeit.repeat(lambda: pipeline.feed(source),
+                                        number=1, repeat=3))
+            print("lazy={0!s:5} optimize={1!s:5} {2:8.1f} ns/entry".format(
+                lazy, optimize, seconds / entries * 1e9))
+
+
+if __name__ == '__main__':
+    main()
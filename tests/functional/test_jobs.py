@@ -0,0 +1,68 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests the parallel execution of the ccdb-tool commands.
+"""
+
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+
+class TestParallelExecution(unittest.TestCase):
+    """ The output with several jobs is the same as with a single one. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # The compiler cache of the user is not touched.
+        self.env = dict(os.environ, XDG_CACHE_HOME=self.tmp_dir)
+        entries = []
+        for index in range(200):
+            # The entries repeat after 70 entries, so the duplicates are in
+            # different chunks of the database.
+            number = index % 70
+            # A compiler used only in the second chunk of the database.
+            compiler = 'g++' if 64 <= index < 74 else 'gcc'
+            entries.append({
+                'directory': self.tmp_dir,
+                'command': '{0} -DN={1} -c f{2}.c -o f{2}.o'.format(
+                    compiler, number, number % 7),
+                'file': 'f{0}.c'.format(number % 7)})
+        self.database = os.path.join(self.tmp_dir, 'compile_commands.json')
+        with open(self.database, 'w', encoding='utf-8') as database:
+            json.dump(entries, database)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_command(self, *options):
+        """
+        Run clangify, and return its output, and the compiler information
+        written by it.
+        """
+        output = subprocess.check_output(
+            ['ccdb-tool', 'clangify', '--input', self.database] +
+            list(options), cwd=self.tmp_dir, env=self.env)
+        with open(os.path.join(self.tmp_dir, 'compiler_info.json'),
+                  encoding='utf-8') as compiler_info:
+            return output, json.load(compiler_info)
+
+    def test_clangify(self):
+        """ The entries of a single database are parsed in parallel. """
+        expected, expected_info = self.run_command()
+        self.assertEqual(len(json.loads(expected)), 80)
+        self.assertEqual(len(expected_info), 2)
+
+        for options in [['--jobs', '3'], ['--jobs', '3', '--stream']]:
+            with self.subTest(options=options):
+                output, compiler_info = self.run_command(*options)
+                self.assertEqual(output, expected)
+                self.assertEqual(compiler_info, expected_info)
@@ -0,0 +1,103 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests the sharded execution of ccdb-tool, and the merging of the
+outputs of the shards.
+"""
+
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+
+SHARDS = 3
+
+
+class TestShardedExecution(unittest.TestCase):
+    """ The merged output of the shards is the same as an unsharded run. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        # The compiler cache of the user is not touched.
+        self.env = dict(os.environ, XDG_CACHE_HOME=self.tmp_dir)
+        entries = []
+        for index in range(12):
+            directory = os.path.join(self.tmp_dir, 'dir{0}'.format(index % 4))
+            entries.append({
+                'directory': directory,
+                'command': 'gcc -DN={0} -c f{1}.c -o f{1}.o'.format(
+                    index, index % 5),
+                'file': 'f{0}.c'.format(index % 5)})
+        # A duplicate entry, and a later entry of the same file, which are
+        # dropped and kept by clangify.
+        entries.insert(1, dict(entries[0]))
+        entries.append(dict(entries[0], command='gcc -DN=99 -c f0.c'))
+        self.database = self.path('compile_commands.json')
+        with open(self.database, 'w', encoding='utf-8') as database:
+            json.dump(entries, database)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def run_sharded(self, command, *options):
+        """
+        Run the command unsharded and in shards, and return the unsharded
+        output, and the merged output of the shards.
+        """
+        def start(output, *extra):
+            return subprocess.Popen(
+                ['ccdb-tool', command, '--input', self.database,
+                 '--output', self.path(output)] + list(options + extra),
+                cwd=self.tmp_dir, env=self.env)
+
+        processes = [start('full.json')]
+        processes.extend(
+            start('shard{0}.json'.format(index),
+                  '--shard', '{0}/{1}'.format(index, SHARDS))
+            for index in range(SHARDS))
+        for process in processes:
+            self.assertEqual(process.wait(), 0)
+
+        shard_outputs = [self.path('shard{0}.json'.format(index))
+                         for index in range(SHARDS)]
+        subprocess.check_call(
+            ['ccdb-tool', 'merge-shards', '--order', self.database,
+             '--output', self.path('merged.json'), '--input'] +
+            shard_outputs + list(options), cwd=self.tmp_dir, env=self.env)
+
+        with open(self.path('full.json'), 'rb') as full, \
+                open(self.path('merged.json'), 'rb') as merged:
+            return full.read(), merged.read()
+
+    def test_print(self):
+        """ The shards are disjoint, and the order is restored. """
+        full, merged = self.run_sharded('print', '--compact')
+        self.assertEqual(full, merged)
+
+        sizes = []
+        for index in range(SHARDS):
+            with open(self.path('shard{0}.json'.format(index)),
+                      encoding='utf-8') as shard:
+                sizes.append(len(json.load(shard)))
+        self.assertEqual(sum(sizes), 14)
+
+    def test_clangify(self):
+        """ Merging clangified shards is byte-identical. """
+        full, merged = self.run_sharded('clangify')
+        self.assertEqual(full, merged)
+
+    def test_check(self):
+        """ Merging checked shards is byte-identical. """
+        full, merged = self.run_sharded('check', '--stream')
+        self.assertEqual(full, merged)
@@ -0,0 +1,95 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests that ccdb-tool starts fast: the commands which do not need
+them do not import the heavy modules, and the imports fit in a time budget.
+"""
+
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+# The maximal time of the imports done by ccdb-tool in microseconds.
+IMPORT_BUDGET = 120000
+
+# The modules which are only needed by some of the commands.
+HEAVY_MODULES = ['asyncio', 'concurrent.futures', 'distutils', 'subprocess',
+                 'tempfile', 'compilation_database_transformer.log_parser',
+                 'compilation_database_transformer.compiler_cache']
+
+IMPORT_TIME = re.compile(r'import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)')
+
+RUN_MAIN = """
+import sys
+from compilation_database_transformer.cli import main
+sys.argv = ['ccdb-tool'] + sys.argv[1:]
+main()
+"""
+
+
+def import_times(*args):
+    """
+    Return the cumulative import times of the top-level modules, and the
+    names of all modules imported by the Python interpreter run with the
+    arguments.
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + list(args),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True,
+        universal_newlines=True)
+
+    top_level = {}
+    modules = set()
+    for line in process.stderr.splitlines():
+        m = IMPORT_TIME.match(line)
+        if m:
+            modules.add(m.group(3))
+            if not m.group(2):
+                top_level[m.group(3)] = int(m.group(1))
+    return top_level, modules
+
+
+class TestStartup(unittest.TestCase):
+    """ The commands import only the modules they need. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.database = os.path.join(self.tmp_dir, 'compile_commands.json')
+        with open(self.database, 'w', encoding='utf-8') as database:
+            json.dump([{'directory': self.tmp_dir,
+                        'command': 'gcc -c main.c',
+                        'file': 'main.c'}], database)
+
+        # The modules imported by the interpreter itself.
+        self.startup, _ = import_times('-c', 'pass')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check_imports(self, *args):
+        top_level, modules = import_times('-c', RUN_MAIN, *args)
+        self.assertFalse([module for module in HEAVY_MODULES
+                          if module in modules])
+
+        import_time = sum(time for module, time in top_level.items()
+                          if module not in self.startup)
+        self.assertLess(import_time, IMPORT_BUDGET)
+
+    def test_help(self):
+        """ Printing the help is fast. """
+        self.check_imports('--help')
+
+    def test_print(self):
+        """ Printing a compilation database is fast. """
+        self.check_imports('print', '--input', self.database)
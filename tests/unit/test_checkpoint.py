@@ -0,0 +1,174 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests the journal of completed entries, and the resumption of
+checkpointed pipelines.
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from compilation_database_transformer.checkpoint import Journal
+from compilation_database_transformer.pipeline import Pipeline
+from compilation_database_transformer.util import stable_digest
+
+
+def square(x):
+    """Picklable mapping function for the parallel map tests."""
+    return x * x
+
+
+class JournalTestCase(unittest.TestCase):
+    """ Test the recording and loading of results. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        """The recorded results are loaded when the journal is resumed."""
+        with Journal(self.path, sync_every=2) as journal:
+            journal.record('a', {'status': 'OK'})
+            journal.record('b', [1, 2])
+            journal.record('c', None)
+
+        with Journal(self.path, resume=True) as journal:
+            self.assertEqual(len(journal), 3)
+            self.assertIn('c', journal)
+            self.assertEqual(journal.get('a'), {'status': 'OK'})
+            self.assertEqual(journal.get('b'), [1, 2])
+            self.assertNotIn('d', journal)
+
+    def test_truncated_record(self):
+        """A line truncated by an interruption is ignored."""
+        with Journal(self.path) as journal:
+            journal.record('a', 1)
+        with open(self.path, 'a', encoding='utf-8') as journal_file:
+            journal_file.write('{"digest": "b", "res')
+
+        with self.assertLogs('checkpoint', 'WARNING'):
+            with Journal(self.path, resume=True) as journal:
+                self.assertEqual(list(journal.results), ['a'])
+                journal.record('c', 3)
+
+        with Journal(self.path, resume=True) as journal:
+            self.assertEqual(journal.results, {'a': 1, 'c': 3})
+
+    def test_restart(self):
+        """Without resumption the previous journal is discarded."""
+        with Journal(self.path) as journal:
+            journal.record('a', 1)
+        with Journal(self.path) as journal:
+            self.assertEqual(len(journal), 0)
+
+    def test_stable_digest(self):
+        """The digest does not depend on the order of the keys."""
+        self.assertEqual(stable_digest({'a': 1, 'b': [2]}),
+                         stable_digest({'b': [2], 'a': 1}))
+        self.assertNotEqual(stable_digest({'a': 1}), stable_digest({'a': 2}))
+
+
+class CheckpointedPipelineTestCase(unittest.TestCase):
+    """ Test the resumption of pipelines from a journal. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_pipeline(self, build, source, resume=False):
+        with Journal(self.path, resume=resume) as journal:
+            return list(build(journal).feed(source))
+
+    def test_resume(self):
+        """Entries with a recorded result are not mapped again."""
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                calls = []
+
+                def double(x):
+                    calls.append(x)
+                    return x * 2
+
+                def build(journal):
+                    return Pipeline(lazy=lazy) \
+                        .append_map(lambda x: x + 1) \
+                        .append_map(double) \
+                        .checkpoint(journal) \
+                        .append_map(str)
+
+                self.assertEqual(self.run_pipeline(build, [1, 2, 3]),
+                                 ['4', '6', '8'])
+                self.assertEqual(calls, [2, 3, 4])
+
+                calls.clear()
+                self.assertEqual(
+                    self.run_pipeline(build, [0, 3, 1, 5, 2], resume=True),
+                    ['2', '8', '4', '12', '6'])
+                self.assertEqual(calls, [1, 6])
+
+    def test_interrupted(self):
+        """The results recorded before an interruption are kept."""
+        def fail_on_three(x):
+            if x == 3:
+                raise KeyboardInterrupt()
+            return -x
+
+        def build(func, lazy):
+            return lambda journal: \
+                Pipeline(lazy=lazy).append_map(func).checkpoint(journal)
+
+        for lazy in [False, True]:
+            with self.subTest(lazy=lazy):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.run_pipeline(build(fail_on_three, lazy), range(5))
+
+                calls = []
+
+                def negate(x):
+                    calls.append(x)
+                    return -x
+
+                self.assertEqual(
+                    self.run_pipeline(build(negate, lazy), range(5),
+                                      resume=True),
+                    [0, -1, -2, -3, -4])
+                self.assertEqual(calls, [3, 4])
+
+    def test_concurrent_order(self):
+        """The order is kept when the checkpointed step is concurrent."""
+        async def delayed_square(x):
+            await asyncio.sleep(0.001 * (x % 3))
+            return x * x
+
+        builders = [
+            lambda journal: Pipeline()
+            .append_parallel_map(square, workers=2)
+            .checkpoint(journal),
+            lambda journal: Pipeline(lazy=True)
+            .append_async_map(delayed_square, 4)
+            .checkpoint(journal)]
+
+        for build in builders:
+            self.run_pipeline(build, range(0, 20, 2))
+            self.assertEqual(
+                self.run_pipeline(build, range(20), resume=True),
+                [x * x for x in range(20)])
+
+    def test_no_map_step(self):
+        """Only map steps can be checkpointed."""
+        with Journal(self.path) as journal:
+            with self.assertRaises(ValueError):
+                Pipeline().flatten().checkpoint(journal)
@@ -0,0 +1,170 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests the persistent cache of the compiler probe results.
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import compilation_database_transformer.log_parser as log_parser
+from compilation_database_transformer.clangsa_version import \
+    ClangVersionInfo
+from compilation_database_transformer.compiler_cache import CompilerCache, \
+    default_cache_dir
+
+
+class CompilerCacheTestCase(unittest.TestCase):
+    """ Test the fingerprints and the records of the compiler cache. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        self.compiler = os.path.join(self.tmp_dir, 'gcc-7')
+        self.write_compiler(self.compiler, 'gcc')
+        self.alias = os.path.join(self.tmp_dir, 'cc')
+        os.symlink(self.compiler, self.alias)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @staticmethod
+    def write_compiler(path, name):
+        with open(path, 'w', encoding='utf-8') as script:
+            script.write('#!/bin/sh\necho {0} "$@" >&2\n'.format(name))
+        os.chmod(path, 0o755)
+
+    def test_default_cache_dir(self):
+        """The cache is in the XDG cache directory."""
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self.tmp_dir}):
+            self.assertEqual(default_cache_dir(),
+                             os.path.join(self.tmp_dir, 'ccdb-tool'))
+
+    def test_fingerprint(self):
+        """
+        The aliases of a binary share the fingerprint, and a changed binary
+        gets a new one.
+        """
+        cache = CompilerCache(self.cache_dir)
+        fingerprint = cache.fingerprint(self.compiler)
+        self.assertEqual(cache.fingerprint(self.alias), fingerprint)
+        self.assertIsNone(cache.fingerprint(
+            os.path.join(self.tmp_dir, 'missing')))
+
+        self.write_compiler(self.compiler, 'clang')
+        self.assertNotEqual(
+            CompilerCache(self.cache_dir).fingerprint(self.compiler),
+            fingerprint)
+
+    def test_ccache_fingerprint(self):
+        """The compilers called through ccache symlinks are different."""
+        ccache = os.path.join(self.tmp_dir, 'ccache')
+        self.write_compiler(ccache, 'ccache')
+        for name in ['gcc', 'g++']:
+            os.symlink(ccache, os.path.join(self.tmp_dir, name))
+
+        cache = CompilerCache(self.cache_dir)
+        self.assertNotEqual(
+            cache.fingerprint(os.path.join(self.tmp_dir, 'gcc')),
+            cache.fingerprint(os.path.join(self.tmp_dir, 'g++')))
+
+    def test_records(self):
+        """The records are shared by the cache instances and the aliases."""
+        cache = CompilerCache(self.cache_dir)
+        self.assertIsNone(cache.get_version(self.compiler))
+        self.assertIsNone(cache.get_info(self.compiler, ['-m32']))
+
+        info = {'c': {'compiler_includes': ['/usr/include'],
+                      'target': 'x86_64-linux-gnu',
+                      'compiler_standard': '-std=gnu11'}}
+        cache.put_version(self.compiler, False)
+        cache.put_info(self.compiler, ['-m32'], info)
+
+        other = CompilerCache(self.cache_dir)
+        self.assertIs(other.get_version(self.alias), False)
+        self.assertEqual(other.get_info(self.alias, ['-m32']), info)
+        self.assertIsNone(other.get_info(self.alias, ['-m64']))
+        self.assertEqual((other.hits, other.misses), (2, 1))
+
+        clang = os.path.join(self.tmp_dir, 'clang')
+        self.write_compiler(clang, 'clang')
+        version = ClangVersionInfo(9, 0, 1, '/usr/bin', 'clang')
+        other.put_version(clang, version)
+        cached = CompilerCache(self.cache_dir).get_version(clang)
+        self.assertEqual(vars(cached), vars(version))
+
+        self.assertFalse([name for name in os.listdir(self.cache_dir)
+                          if name.endswith('.tmp')])
+
+    def test_threads(self):
+        """The lookups of several threads are all counted."""
+        cache = CompilerCache(self.cache_dir)
+        cache.put_version(self.compiler, False)
+
+        def lookup(_):
+            return cache.get_version(self.alias)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lookup, range(400)))
+
+        self.assertEqual(results, [False] * 400)
+        self.assertEqual((cache.hits, cache.misses), (400, 0))
+
+        # The cache is sent to worker processes by pickling it.
+        self.assertIs(pickle.loads(pickle.dumps(cache))
+                      .get_version(self.compiler), False)
+
+    def test_invalid_record(self):
+        """An unreadable record is a cache miss."""
+        cache = CompilerCache(self.cache_dir)
+        cache.put_version(self.compiler, False)
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'w',
+                      encoding='utf-8') as record:
+                record.write('{"version"')
+
+        self.assertIsNone(CompilerCache(self.cache_dir)
+                          .get_version(self.compiler))
+
+    def test_parse_unique_log(self):
+        """A later run does not probe the compiler again."""
+        ICI = log_parser.ImplicitCompilerInfo
+        database = [{'directory': self.tmp_dir, 'file': 'a.c',
+                     'command': self.compiler + ' -m32 -c a.c'}]
+
+        results = []
+        probe_counts = []
+        probe = mock.Mock(wraps=ICI.probe_language)
+        version = mock.Mock(wraps=log_parser.clangsa_version_get)
+        try:
+            with mock.patch.object(ICI, 'probe_language', probe), \
+                    mock.patch.object(log_parser, 'clangsa_version_get',
+                                      version):
+                for _ in range(2):
+                    ICI.compiler_info.pop(self.compiler, None)
+                    ICI.compiler_versions.pop(self.compiler, None)
+                    ICI.variant_info.clear()
+                    ICI.binary_versions.clear()
+                    build_actions, _ = log_parser.parse_unique_log(
+                        list(map(dict, database)), self.tmp_dir,
+                        compiler_cache=CompilerCache(self.cache_dir))
+                    results.append(build_actions[0].to_dict())
+                    probe_counts.append(probe.call_count)
+        finally:
+            ICI.compiler_info.pop(self.compiler, None)
+            ICI.compiler_versions.pop(self.compiler, None)
+
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(probe_counts[0], probe_counts[1])
+        self.assertGreater(probe_counts[0], 0)
+        self.assertEqual(version.call_count, 1)
+        self.assertIsNone(ICI.compiler_cache)
@@ -0,0 +1,211 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests the incremental processing of JSON arrays.
+"""
+
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from compilation_database_transformer.json_stream import iter_json_array, \
+    JsonArrayWriter, write_json_array
+from compilation_database_transformer.pipeline import JsonPipeline
+
+
+DOCUMENT = """
+[
+  {"directory": "/tmp", "command": "gcc -c a.c -o a.o", "file": "a.c"},
+  {"directory": "/tmp/\\u00e1rv\\u00edz", "arguments": ["g++", "-c", "b.cpp"],
+   "file": "b.cpp", "nested": [[1, 2], {"x": "[]{},"}]},
+  12345,
+  "\\u00e9kezet és [ , ]",
+  null,
+  true,
+  -1.5e10
+]
+"""
+
+
+class JsonArrayReaderTestCase(unittest.TestCase):
+    """ Test the incremental JSON array reader. """
+
+    def test_chunk_sizes(self):
+        """The elements are the same as with json.loads for any chunk size."""
+        expected = json.loads(DOCUMENT)
+
+        for chunk_size in [1, 2, 3, 7, 64, 1 << 20]:
+            result = list(iter_json_array(io.StringIO(DOCUMENT), chunk_size))
+            self.assertEqual(result, expected)
+
+    def test_empty_array(self):
+        """Test an empty array with and without whitespace."""
+        self.assertEqual(list(iter_json_array(io.StringIO('[]'))), [])
+        self.assertEqual(list(iter_json_array(io.StringIO(' [\n ] \n'), 1)),
+                         [])
+
+    def test_lazy_decoding(self):
+        """Elements are available before the rest of the input is read."""
+        source = io.StringIO('[{"a": 1}, {"b": 2}, garbage')
+        elements = iter_json_array(source, 4)
+
+        self.assertEqual(next(elements), {"a": 1})
+        self.assertEqual(next(elements), {"b": 2})
+        with self.assertRaises(json.JSONDecodeError):
+            next(elements)
+
+    def test_invalid_documents(self):
+        """Malformed documents raise a JSONDecodeError."""
+        for document in ['', '{"a": 1}', '[1, 2', '[1 2]', '[1,]',
+                         '[1] [2]', '[{"a": 1]']:
+            with self.assertRaises(json.JSONDecodeError, msg=document):
+                list(iter_json_array(io.StringIO(document), 2))
+
+    def test_memory_mapped_file(self):
+        """Regular files are read with the same result."""
+        expected = json.loads(DOCUMENT)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'compile_commands.json')
+            with open(path, 'w', encoding='utf-8') as source:
+                source.write(DOCUMENT)
+
+            # Small chunks split the multi-byte characters.
+            for chunk_size in [1, 5, 1 << 20]:
+                with open(path, 'r', encoding='utf-8') as source:
+                    self.assertEqual(
+                        list(iter_json_array(source, chunk_size)), expected)
+
+    def test_invalid_encoding(self):
+        """Invalid UTF-8 raises an error, like json.load does."""
+        document = b'[{"file": "a\xff.c"}]'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'compile_commands.json')
+            with open(path, 'wb') as source:
+                source.write(document)
+
+            with open(path, 'r', encoding='utf-8') as source:
+                with self.assertRaises(UnicodeDecodeError):
+                    json.load(source)
+
+            with open(path, 'r', encoding='utf-8') as source:
+                with self.assertRaises(UnicodeDecodeError):
+                    list(iter_json_array(source, 4))
+
+        with self.assertRaises(UnicodeDecodeError):
+            list(iter_json_array(io.BytesIO(document), 4))
+
+    def test_binary_stream(self):
+        """Streams of bytes are decoded."""
+        source = io.BytesIO(DOCUMENT.encode('utf-8'))
+
+        self.assertEqual(list(iter_json_array(source, 3)),
+                         json.loads(DOCUMENT))
+
+
+class JsonArrayWriterTestCase(unittest.TestCase):
+    """ Test the streaming JSON array writer. """
+
+    def test_same_as_json_dump(self):
+        """The output is the same as the output of json.dump."""
+        for elements in [[], json.loads(DOCUMENT), [[]], [{}], [[1, [2]]]]:
+            expected = io.StringIO()
+            json.dump(elements, expected, indent=2)
+
+            output = io.StringIO()
+            count = write_json_array(iter(elements), output)
+
+            self.assertEqual(output.getvalue(), expected.getvalue())
+            self.assertEqual(count, len(elements))
+
+    def test_compact(self):
+        """The compact output contains no whitespace between tokens."""
+        elements = json.loads(DOCUMENT)
+
+        output = io.StringIO()
+        write_json_array(elements, output, compact=True)
+
+        self.assertEqual(output.getvalue(),
+                         json.dumps(elements, separators=(',', ':')))
+
+        output = io.StringIO()
+        write_json_array([], output, compact=True)
+        self.assertEqual(output.getvalue(), '[]')
+
+    def test_first_element_written_early(self):
+        """The first element is written before the array is closed."""
+        output = io.StringIO()
+        writer = JsonArrayWriter(output, buffer_size=1 << 20,
+                                 flush_interval=3600)
+
+        writer.write({"a": 1})
+        self.assertEqual(output.getvalue(), '[\n  {\n    "a": 1\n  }')
+
+        # The following elements wait in the buffer.
+        writer.write({"b": 2})
+        self.assertEqual(output.getvalue(), '[\n  {\n    "a": 1\n  }')
+
+        writer.close()
+        self.assertEqual(json.loads(output.getvalue()), [{"a": 1}, {"b": 2}])
+
+    def test_buffer_size(self):
+        """The buffer is written when it is full."""
+        output = io.StringIO()
+        writer = JsonArrayWriter(output, compact=True, buffer_size=8,
+                                 flush_interval=3600)
+
+        writer.write(1)
+        writer.write(2)
+        self.assertEqual(output.getvalue(), '[1')
+
+        writer.write("long string")
+        self.assertEqual(output.getvalue(), '[1,2,"long string"')
+
+    def test_interrupted(self):
+        """The array is not closed if writing the elements failed."""
+        def elements():
+            yield 1
+            raise KeyboardInterrupt()
+
+        output = io.StringIO()
+        with self.assertRaises(KeyboardInterrupt):
+            write_json_array(elements(), output, compact=True)
+
+        self.assertEqual(output.getvalue(), '[1')
+
+
+class StreamingJsonPipelineTestCase(unittest.TestCase):
+    """ Test the JsonPipeline with streaming input. """
+
+    def test_stream_input(self):
+        """The streaming pipeline produces the same output."""
+        sources = [DOCUMENT, '[{"a": 1}]']
+
+        eager_output = io.StringIO()
+        JsonPipeline(eager_output) \
+            .flatten() \
+            .feed([io.StringIO(source) for source in sources])
+
+        stream_output = io.StringIO()
+        JsonPipeline(stream_output, lazy=True, stream=True) \
+            .flatten() \
+            .feed([io.StringIO(source) for source in sources])
+
+        self.assertEqual(stream_output.getvalue(), eager_output.getvalue())
+
+    def test_compact_output(self):
+        """The pipeline writes compact output on request."""
+        output = io.StringIO()
+        JsonPipeline(output, lazy=True, stream=True, compact=True) \
+            .flatten() \
+            .feed([io.StringIO(DOCUMENT)])
+
+        self.assertEqual(output.getvalue(),
+                         json.dumps(json.loads(DOCUMENT),
+                                    separators=(',', ':')))
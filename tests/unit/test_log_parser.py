@@ -9,11 +9,14 @@
 
 import json
 import os
+import shlex
 import shutil
 import tempfile
 import unittest
+from unittest import mock
 
 import compilation_database_transformer.log_parser as log_parser
+from compilation_database_transformer import response_file
 from compilation_database_transformer.util import load_json_or_empty
 from .skiplist_handler import SkipListHandler
 
@@ -524,3 +527,445 @@ class LogParserTest(unittest.TestCase):
                           if b.source == b_file_path][0]
         self.assertEqual(len(b_build_action.analyzer_options), 1)
         self.assertEqual(b_build_action.analyzer_options[0], '-DVARIABLE=some')
+
+    def test_response_file_nested(self):
+        """
+        The nested response files are expanded, and the cyclic references
+        are not expanded again.
+        """
+        outer = os.path.join(self.tmp_dir, "outer.rsp")
+        inner = os.path.join(self.tmp_dir, "inner.rsp")
+        with open(outer, "w", encoding="utf-8") as rsp_file:
+            rsp_file.write("-DOUTER @inner.rsp @outer.rsp -DLAST")
+        with open(inner, "w", encoding="utf-8") as rsp_file:
+            rsp_file.write("-DINNER='a b' @outer.rsp @missing.rsp")
+
+        options, sources = log_parser.process_response_file(outer)
+        self.assertEqual(options, ['-DOUTER', '-DINNER=a b', '-DLAST'])
+        self.assertEqual(sources, [])
+
+    def test_response_file_cache(self):
+        """
+        A response file shared by the compile commands is read once, and
+        again only when it changes. The entries are extended lazily.
+        """
+        rsp_file_path = os.path.join(self.tmp_dir, "shared.rsp")
+        with open(rsp_file_path, "w", encoding="utf-8") as rsp_file:
+            rsp_file.write("-DSHARED -Iinclude")
+
+        cache = log_parser.ResponseFileCache()
+        database = [{'directory': self.tmp_dir, 'file': 'f{0}.c'.format(i),
+                     'command': 'gcc @shared.rsp -c f{0}.c'.format(i)}
+                    for i in range(100)]
+        with mock.patch.object(log_parser, 'RESPONSE_FILE_CACHE', cache), \
+                mock.patch.object(
+                    response_file, 'read_response_file',
+                    wraps=response_file.read_response_file) as read:
+            entries = log_parser.extend_compilation_database_entries(
+                database)
+            self.assertEqual(next(entries)['command'],
+                             'gcc -DSHARED -Iinclude -c f0.c')
+            self.assertEqual(database[1]['command'],
+                             'gcc @shared.rsp -c f1.c')
+
+            self.assertEqual(len(list(entries)), 99)
+            self.assertEqual(read.call_count, 1)
+            self.assertEqual((cache.hits, cache.misses), (99, 1))
+
+            with open(rsp_file_path, "w", encoding="utf-8") as rsp_file:
+                rsp_file.write("-DCHANGED")
+            self.assertEqual(log_parser.process_response_file(
+                rsp_file_path)[0], ['-DCHANGED'])
+            self.assertEqual(read.call_count, 2)
+
+    def test_flag_dispatch_order(self):
+        """
+        The first matching rule handles a flag, like in the GCC flag
+        processing order: skipped flags are not collected, and parameters of
+        skipped flags are consumed.
+        """
+        action = log_parser.parse_options({
+            "directory": "/tmp",
+            "arguments": ["g++", "-mips32", "-fPIC", "-flto", "-Werror",
+                          "-sectorder", "a", "-b", "c", "-g3", "-O2",
+                          "-Iinc", "-isystem", "sys", "-DNDEBUG", "-DA",
+                          "-x", "c", "-arch", "armv7", "-o", "a.o",
+                          "-c", "a.c"],
+            "file": "a.c"})
+
+        self.assertEqual(action.analyzer_options,
+                         ['-target', 'mips', '-mips32', '-fPIC', '-O2',
+                          '-I/tmp/inc', '-isystem', '/tmp/sys', '-DA'])
+        self.assertEqual(action.lang, 'c')
+        self.assertEqual(action.output, 'a.o')
+        self.assertEqual(action.target['c'], 'armv7')
+
+    def test_duplicate_entries(self):
+        """
+        The identical entries are parsed once, and the compile commands
+        building the same action are uniqued.
+        """
+        def entry(output, directory="/tmp"):
+            return {"directory": directory,
+                    "command": "g++ -DX -c a.cpp -o {0}".format(output),
+                    "file": "a.cpp"}
+
+        database = [entry('a.o'), entry('a.o', '/tmp/'), entry('a.o'),
+                    entry('b.o'),
+                    dict(entry('a.o'), command='g++ -DX  -c a.cpp -o a.o')]
+        parse = mock.Mock(wraps=log_parser.parse_options)
+        with mock.patch.object(log_parser, 'parse_options', parse), \
+                self.assertLogs('buildlogger', 'DEBUG') as logs:
+            build_actions, _ = log_parser.parse_unique_log(
+                database, self.__this_dir, probe_workers=0)
+
+        self.assertEqual(parse.call_count, 3)
+        self.assertEqual(sorted(action.output for action in build_actions),
+                         ['a.o', 'b.o'])
+        self.assertIn('Dropped 2 duplicate compilation database entries '
+                      'before parsing, and 1 duplicate build actions after '
+                      'parsing.', '\n'.join(logs.output))
+
+        action = build_actions[0]
+        for attr, value in [('output', 'c.o'), ('directory', '/'),
+                            ('analyzer_options', ['-DY'])]:
+            self.assertNotEqual(action.uniqueing_key(),
+                                action.with_attr(attr, value).uniqueing_key())
+
+    def test_duplicate_entries_strict(self):
+        """The identical entries are an error in the strict mode."""
+        entry = {"directory": "/tmp", "command": "g++ -c a.cpp",
+                 "file": "a.cpp"}
+
+        with self.assertRaises(SystemExit):
+            log_parser.parse_unique_log([entry, dict(entry)],
+                                        self.__this_dir, 'strict')
+
+    def test_unique_languages(self):
+        """The C and the C++ build of the same source file are kept."""
+        build_actions, _ = log_parser.parse_unique_log(
+            [{"directory": "/tmp", "command": "g++ -x c++ c.c",
+              "file": "c.c"},
+             {"directory": "/tmp", "command": "gcc -x c c.c",
+              "file": "c.c"}], self.__this_dir)
+
+        self.assertEqual(sorted(action.lang for action in build_actions),
+                         ['c', 'c++'])
+
+    def test_parse_cache(self):
+        """
+        Commands differing only in the source file and the output are parsed
+        once, and the per-entry fields are substituted.
+        """
+        def entry(name):
+            return {"directory": "/tmp",
+                    "command": "g++ -Iinc -DX -x c -arch armv7 -c {0}.cpp "
+                               "-o out/{0}.o".format(name),
+                    "file": "{0}.cpp".format(name)}
+
+        cache = log_parser.OptionParseCache(maxsize=2)
+        for name in ['a', 'b', 'c']:
+            cached = log_parser.parse_options(entry(name), parse_cache=cache)
+            action = log_parser.parse_options(entry(name))
+            for slot in action.__slots__:
+                self.assertEqual(getattr(cached, slot), getattr(action, slot))
+
+        self.assertEqual(cached.source, 'c.cpp')
+        self.assertEqual(cached.output, 'out/c.o')
+        self.assertEqual(cached.analyzer_options, ['-I/tmp/inc', '-DX'])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        self.assertAlmostEqual(cache.hit_rate, 2 / 3)
+
+        other = dict(entry('d'), command='g++ -DY -c d.cpp')
+        log_parser.parse_options(other, parse_cache=cache)
+        log_parser.parse_options(dict(other, directory='/'),
+                                 parse_cache=cache)
+        self.assertEqual(len(cache), 2)
+
+    def test_parse_cache_source_as_parameter(self):
+        """
+        A source file given as the parameter of a flag is not substituted.
+        """
+        cache = log_parser.OptionParseCache()
+        for name in ['a.c', 'b.c']:
+            action = log_parser.parse_options(
+                {"directory": "/tmp",
+                 "command": "gcc -include {0} -c {0}".format(name),
+                 "file": name}, parse_cache=cache)
+            self.assertEqual(action.analyzer_options, ['-include', name])
+
+    def test_split_command(self):
+        """Commands are split like with shlex."""
+        for command in ['gcc -c a.c  -o\ta.o\n', 'gcc -DX="a b" a.c',
+                        "gcc '-DY=1' a\\ b.c", '', 'gcc -DZ=#1 x.c']:
+            self.assertEqual(log_parser.split_command(command),
+                             shlex.split(command))
+
+    def test_prefetch_compiler_info(self):
+        """
+        The distinct compilers are probed in the background with the flags
+        of their first compile command, and the collected information is the
+        same as without probing in the background.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        ICI = log_parser.ImplicitCompilerInfo
+        compilers = [os.path.join(tmp_dir, name) for name in ['cc-a', 'cc-b']]
+        try:
+            for compiler in compilers:
+                with open(compiler, 'w', encoding='utf-8') as script:
+                    script.write(
+                        '#!/bin/sh\n'
+                        '[ "$1" = --version ] && exit 0\n'
+                        'echo "#include <...> search starts here:" >&2\n'
+                        'echo " /$(basename $0)/include $*" >&2\n'
+                        'echo "End of search list." >&2\n'
+                        'echo "Target: $(basename $0)-target" >&2\n')
+                os.chmod(compiler, 0o755)
+
+            def entries():
+                return [{"directory": tmp_dir, "file": name + ".c",
+                         "command": "{0} {1} -c {2}.c".format(
+                             compiler, flag, name)}
+                        for compiler, flag, name in [
+                            (compilers[0], '-m32', 'a'),
+                            (compilers[1], '-DX', 'b'),
+                            (compilers[0], '-m64', 'c')]]
+
+            results = []
+            for probe_workers in [0, 2]:
+                for compiler in compilers:
+                    ICI.compiler_info.pop(compiler, None)
+                    ICI.compiler_versions.pop(compiler, None)
+                ICI.variant_info.clear()
+                ICI.binary_versions.clear()
+
+                build_actions, _ = log_parser.parse_unique_log(
+                    entries(), tmp_dir, probe_workers=probe_workers)
+                results.append(
+                    ([action.to_dict() for action in build_actions],
+                     {compiler: ICI.compiler_info[compiler]
+                      for compiler in compilers}))
+
+            self.assertEqual(results[0], results[1])
+            self.assertEqual(
+                results[1][1][compilers[0]]['c']['compiler_includes'],
+                ['/cc-a/include -m32 -E -dM -x c - -v'])
+            self.assertEqual(results[1][1][compilers[1]]['c++']['target'],
+                             'cc-b-target')
+            self.assertFalse(ICI.pending_probes)
+
+            with log_parser.ThreadPoolExecutor(max_workers=2) as executor:
+                log_parser.prefetch_compiler_info(executor, entries())
+                self.assertFalse(ICI.pending_probes)
+
+            # The background probes leave the shared state to the caller.
+            for compiler in compilers:
+                ICI.compiler_info.pop(compiler, None)
+                ICI.compiler_versions.pop(compiler, None)
+            ICI.variant_info.clear()
+            with log_parser.ThreadPoolExecutor(max_workers=2) as executor:
+                log_parser.prefetch_compiler_info(
+                    executor, entries(), log_parser.clangsa_version_get)
+                for _, future in ICI.pending_probes.values():
+                    future.result()
+            self.assertEqual(len(ICI.pending_probes), 2)
+            self.assertFalse(ICI.variant_info)
+            self.assertFalse([compiler for compiler in compilers
+                              if compiler in ICI.compiler_versions])
+
+            ICI.wait_for_probe(compilers[0])
+            self.assertIs(ICI.compiler_versions[compilers[0]], False)
+            self.assertEqual(len(ICI.variant_info), 2)
+        finally:
+            ICI.pending_probes.clear()
+            ICI.pending_versions.clear()
+            for compiler in compilers:
+                ICI.compiler_info.pop(compiler, None)
+                ICI.compiler_versions.pop(compiler, None)
+            shutil.rmtree(tmp_dir)
+
+    def test_prefetch_window(self):
+        """
+        The compilation database is read only a window ahead of the parsing.
+        """
+        consumed = []
+
+        def database():
+            for index in range(20):
+                consumed.append(index)
+                yield {"directory": "/tmp", "file": "f{0}.c".format(index),
+                       "command": "gcc -c f{0}.c".format(index)}
+
+        ahead = []
+        parse_options = log_parser.parse_options
+
+        def parse(*args):
+            ahead.append(len(consumed))
+            return parse_options(*args)
+
+        with mock.patch.object(log_parser, 'PREFETCH_WINDOW', 4), \
+                mock.patch.object(log_parser, 'parse_options', parse):
+            build_actions, _ = log_parser.parse_unique_log(
+                database(), self.__this_dir, probe_workers=2)
+
+        self.assertEqual(len(build_actions), 20)
+        self.assertEqual(ahead, [min(index + 5, 20) for index in range(20)])
+
+    def test_compiler_variants(self):
+        """
+        Every variant of the flags affecting the implicit include paths is
+        probed once, and the compile commands get the information of their
+        own variant.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        ICI = log_parser.ImplicitCompilerInfo
+        compiler = os.path.join(tmp_dir, 'cc-variant')
+        try:
+            with open(compiler, 'w', encoding='utf-8') as script:
+                script.write(
+                    '#!/bin/sh\n'
+                    'echo "#include <...> search starts here:" >&2\n'
+                    'echo " /include $*" >&2\n'
+                    'echo "End of search list." >&2\n')
+            os.chmod(compiler, 0o755)
+
+            probes, hits = ICI.variant_probes, ICI.variant_hits
+            includes = [
+                log_parser.parse_options(
+                    {"directory": tmp_dir, "file": "a.c",
+                     "command": "{0} {1} -DX -c a.c".format(compiler, flag)}
+                ).compiler_includes['c']
+                for flag in ['-m32', '-m64', '-m32']]
+
+            self.assertEqual(includes,
+                             [['/include -m32 -E -dM -x c - -v'],
+                              ['/include -m64 -E -dM -x c - -v'],
+                              ['/include -m32 -E -dM -x c - -v']])
+            self.assertEqual(ICI.variant_probes - probes, 2)
+            self.assertEqual(ICI.variant_hits - hits, 1)
+            self.assertEqual(ICI.get()[compiler]['c']['compiler_includes'],
+                             includes[0])
+        finally:
+            ICI.compiler_info.pop(compiler, None)
+            for key in list(ICI.variant_info):
+                if key[0] == compiler:
+                    del ICI.variant_info[key]
+            shutil.rmtree(tmp_dir)
+
+    @unittest.skipIf(shutil.which('gcc') is None, "gcc is not installed")
+    def test_compiler_probe_spawns(self):
+        """
+        The compiler of a large database is probed only once, including its
+        version.
+        """
+        ICI = log_parser.ImplicitCompilerInfo
+        gcc = shutil.which('gcc')
+        alias = os.path.join(self.tmp_dir, 'gcc-alias')
+        if not os.path.lexists(alias):
+            os.symlink(gcc, alias)
+
+        database = [{"directory": self.tmp_dir,
+                     "command": "{0} -DN={1} -c f{1}.c -o f{1}.o".format(
+                         gcc if index % 2 else alias, index),
+                     "file": "f{0}.c".format(index)}
+                    for index in range(10000)]
+
+        popen = mock.Mock(wraps=log_parser.subprocess.Popen)
+        with mock.patch.object(ICI, 'compiler_info', {}), \
+                mock.patch.object(ICI, 'compiler_versions', {}), \
+                mock.patch.object(ICI, 'binary_versions', {}), \
+                mock.patch.object(ICI, 'variant_info', {}), \
+                mock.patch.object(log_parser.subprocess, 'Popen', popen):
+            build_actions, _ = log_parser.parse_unique_log(
+                database, self.tmp_dir, probe_workers=0)
+
+        self.assertEqual(len(build_actions), 10000)
+        version_probes = [args for args, _ in popen.call_args_list
+                          if '--version' in args[0]]
+        self.assertEqual(len(version_probes), 1)
+        # A single probe for C and C++ of both names.
+        self.assertEqual(popen.call_count, 1 + 2 * 2)
+
+    def test_probe_language(self):
+        """
+        A single invocation of the compiler gives the same implicit
+        information as the separate probes.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        ICI = log_parser.ImplicitCompilerInfo
+        compiler = os.path.join(tmp_dir, 'cc-fake')
+        calls = os.path.join(tmp_dir, 'calls')
+        try:
+            with open(compiler, 'w', encoding='utf-8') as script:
+                script.write(
+                    '#!/bin/sh\n'
+                    'echo "$*" >> ' + calls + '\n'
+                    'echo "Using built-in specs." >&2\n'
+                    'echo "Target: fake-linux-gnu" >&2\n'
+                    'case "$*" in *-v*) ;; *.c) '
+                    'echo "error: CC_FOUND_STANDARD_VER#11" >&2; exit 1;; '
+                    '*.cpp) echo "error: CC_FOUND_STANDARD_VER#14" >&2; '
+                    'exit 1;; esac\n'
+                    'case "$*" in *-E*) '
+                    'echo "#include <...> search starts here:" >&2; '
+                    'echo " /fake/include/$1" >&2; '
+                    'echo " /fake/Frameworks (framework directory)" >&2; '
+                    'echo "End of search list." >&2;; esac\n'
+                    'case "$*" in *-dM*-x\\ c\\ *) '
+                    'echo "#define __STDC_VERSION__ 201112L";; '
+                    '*-dM*-x\\ c++*) '
+                    'echo "#define __cplusplus 201402L";; esac\n')
+            os.chmod(compiler, 0o755)
+
+            for flags in [[], ['-m32'], ['-std=c99', '-O2']]:
+                for lang in [ICI.c(), ICI.cpp()]:
+                    if os.path.exists(calls):
+                        os.remove(calls)
+                    info = ICI.probe_language(compiler, lang, flags)
+                    with open(calls, encoding='utf-8') as call_log:
+                        call_count = len(call_log.readlines())
+
+                    self.assertEqual(info, {
+                        'compiler_includes': ICI.get_compiler_includes(
+                            compiler, lang, flags),
+                        'target': ICI.get_compiler_target(compiler),
+                        'compiler_standard': ICI.get_compiler_standard(
+                            compiler, lang)})
+                    self.assertEqual(
+                        call_count, 2 if '-std=c99' in flags else 1)
+
+            self.assertEqual(
+                ICI.probe_language(compiler, ICI.cpp(), []),
+                {'compiler_includes': ['/fake/include/-E',
+                                       '/fake/Frameworks'],
+                 'target': 'fake-linux-gnu',
+                 'compiler_standard': '-std=gnu++14'})
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_probe_language_cxx_driver(self):
+        """
+        A C++ driver probed for C reports the default C standard, while a
+        .c file compiled by it is C++, without __STDC_VERSION__.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        ICI = log_parser.ImplicitCompilerInfo
+        compiler = os.path.join(tmp_dir, 'c++')
+        try:
+            with open(compiler, 'w', encoding='utf-8') as script:
+                script.write(
+                    '#!/bin/sh\n'
+                    'echo "Target: fake-linux-gnu" >&2\n'
+                    'case "$*" in *-dM*-x\\ c\\ *) '
+                    'echo "#define __STDC_VERSION__ 201710L";; '
+                    '*.c) echo "error: CC_FOUND_STANDARD_VER#90" >&2; '
+                    'exit 1;; esac\n')
+            os.chmod(compiler, 0o755)
+
+            self.assertEqual(
+                ICI.probe_language(compiler, ICI.c(), [])
+                ['compiler_standard'], '-std=gnu17')
+            self.assertEqual(ICI.get_compiler_standard(compiler, ICI.c()),
+                             '-std=gnu90')
+        finally:
+            shutil.rmtree(tmp_dir)
@@ -0,0 +1,89 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests the indexed lookup of executables in the search path.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from compilation_database_transformer import path_lookup
+from compilation_database_transformer.path_lookup import PathIndex
+
+
+class PathIndexTestCase(unittest.TestCase):
+    """ The lookup gives the same results as shutil.which. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.first = os.path.join(self.tmp_dir, 'first')
+        self.second = os.path.join(self.tmp_dir, 'second')
+        os.mkdir(self.first)
+        os.mkdir(self.second)
+        self.path = os.pathsep.join([self.first, self.second,
+                                     os.path.join(self.tmp_dir, 'missing')])
+
+        self.executable(os.path.join(self.first, 'gcc'))
+        self.executable(os.path.join(self.second, 'gcc'))
+        self.executable(os.path.join(self.second, 'clang'))
+        os.symlink(os.path.join(self.second, 'clang'),
+                   os.path.join(self.first, 'cc'))
+        os.symlink(os.path.join(self.tmp_dir, 'dangling'),
+                   os.path.join(self.first, 'c++'))
+        os.mkdir(os.path.join(self.first, 'clang'))
+        with open(os.path.join(self.first, 'g++'), 'w', encoding='utf-8'):
+            pass
+        self.executable(os.path.join(self.second, 'g++'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @staticmethod
+    def executable(path):
+        with open(path, 'w', encoding='utf-8') as script:
+            script.write('#!/bin/sh\n')
+        os.chmod(path, 0o755)
+
+    def test_which(self):
+        """Every name is resolved like with shutil.which."""
+        index = PathIndex(self.path)
+        for name in ['gcc', 'g++', 'clang', 'cc', 'c++', 'ld', 'missing',
+                     os.path.join(self.second, 'clang'),
+                     os.path.join(self.first, 'g++')]:
+            self.assertEqual(index.which(name),
+                             shutil.which(name, path=self.path), name)
+
+    def test_scanned_once(self):
+        """The directories are scanned only once, until cleared."""
+        index = PathIndex(self.path)
+        self.assertIsNone(index.which('ld'))
+        self.executable(os.path.join(self.first, 'ld'))
+        self.assertIsNone(index.which('ld'))
+
+        index.clear()
+        self.assertEqual(index.which('ld'), os.path.join(self.first, 'ld'))
+
+    def test_shared_index(self):
+        """The indexes are shared by the lookups of the same search path."""
+        self.assertIs(path_lookup.get_index(self.path),
+                      path_lookup.get_index(self.path))
+        self.assertEqual(path_lookup.which('gcc', self.path),
+                         os.path.join(self.first, 'gcc'))
+
+    def test_no_distutils(self):
+        """The log parser does not import distutils."""
+        modules = subprocess.check_output(
+            [sys.executable, '-c',
+             'import sys\n'
+             'import compilation_database_transformer.log_parser\n'
+             'print(" ".join(sys.modules))'],
+            universal_newlines=True).split()
+        self.assertNotIn('distutils', modules)
@@ -9,9 +9,42 @@ This module tests the Pipeline and JsonPipeline classes, which are used
 to implement a sequence of transformations on input data.
 """
 
+import asyncio
+import io
+import json
+import time
+import tracemalloc
 import unittest
 
-from compilation_database_transformer.pipeline import Pipeline
+from compilation_database_transformer.instrumentation import format_stats
+from compilation_database_transformer.pipeline import JsonPipeline, \
+    optimize_steps, Pipeline, PipelineStepError
+
+
+def square(x):
+    """Picklable mapping function for the parallel map tests."""
+    return x * x
+
+
+def fail_on_three(x):
+    """Picklable mapping function which fails on a specific input."""
+    if x == 3:
+        raise ValueError("three")
+    return x
+
+
+# The initializations of a parallel map worker process.
+WORKER_INITS = []
+
+
+def init_worker(value):
+    """Picklable initializer of the parallel map worker processes."""
+    WORKER_INITS.append(value)
+
+
+def initialized(x):
+    """Picklable mapping function using the state of the worker process."""
+    return x, WORKER_INITS
 
 
 class PipelineTestCase(unittest.TestCase):
@@ -205,3 +238,623 @@ class PipelineTestCase(unittest.TestCase):
         pipeline.append_pipe_map(pipeline2)
 
         self.assertEqual(pipeline.feed([[10]]), [15, 15, 15])
+
+
+class LazyPipelineTestCase(unittest.TestCase):
+    """ Test the evaluation of pipeline steps in lazy mode. """
+
+    def test_single_map_empty_list(self):
+        """Test single lazy map with an empty list as input."""
+        pipeline = Pipeline(lazy=True).append_map(str.upper)
+
+        self.assertEqual(list(pipeline.feed([])), [])
+
+    def test_single_map_non_empty(self):
+        """Test single lazy map with a non-empty list as input."""
+        pipeline = Pipeline(lazy=True).append_map(str.upper)
+
+        result = pipeline.feed(['input1', 'input2'])
+
+        self.assertNotIsInstance(result, list)
+        self.assertEqual(list(result), ['INPUT1', 'INPUT2'])
+
+    def test_prepend_map(self):
+        """Test lazy pipeline building with prepend map operation."""
+        pipeline = Pipeline(lazy=True) \
+            .prepend_map(lambda x: x * 2) \
+            .prepend_map(lambda x: x + 10)
+
+        self.assertEqual(list(pipeline.feed([10, 20])), [40, 60])
+
+    def test_append_pipeline_map(self):
+        """Test lazy append pipe map operation."""
+        pipeline = Pipeline(lazy=True).append_map(lambda x: x * 2)
+
+        pipeline2 = Pipeline(lazy=True) \
+            .append_transform(lambda x: x + 10) \
+            .append_transform(lambda x: x / 2)
+
+        pipeline.append_pipe_map(pipeline2)
+
+        # for each element ((x * 2) + 10) / 2
+        self.assertEqual(list(pipeline.feed([10, 20])), [15, 25])
+
+    def test_flatten(self):
+        """Test lazy flatten operation."""
+        pipeline = Pipeline(lazy=True) \
+            .append_map(lambda x: [x] * 3) \
+            .flatten() \
+            .append_map(lambda x: x + 1)
+
+        self.assertEqual(list(pipeline.feed([10, 20])),
+                         [11, 11, 11, 21, 21, 21])
+
+    def test_prepend_flatten(self):
+        """Test lazy prepend flatten operation."""
+        pipeline = Pipeline(lazy=True) \
+            .append_map(lambda x: x + 1) \
+            .pre_flatten()
+
+        self.assertEqual(list(pipeline.feed([[10], [20, 30]])), [11, 21, 31])
+
+    def test_items_flow_one_at_a_time(self):
+        """Every step processes an item before the next item is read."""
+        trace = []
+
+        def step(name):
+            def record(x):
+                trace.append((name, x))
+                return x
+            return record
+
+        pipeline = Pipeline(lazy=True) \
+            .append_map(step('first')) \
+            .append_map(step('second'))
+
+        self.assertEqual(list(pipeline.feed([1, 2])), [1, 2])
+        self.assertEqual(trace, [('first', 1), ('second', 1),
+                                 ('first', 2), ('second', 2)])
+
+    def test_peak_memory(self):
+        """A lazy pipeline does not hold the intermediate results."""
+
+        def peak_memory(lazy):
+            pipeline = Pipeline(lazy=lazy) \
+                .append_map(lambda x: {'file': str(x)}) \
+                .append_map(lambda x: [x['file']]) \
+                .flatten() \
+                .append_transform(lambda xs: sum(1 for _ in xs))
+
+            tracemalloc.start()
+            try:
+                self.assertEqual(pipeline.feed(range(100000)), 100000)
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.assertLess(peak_memory(lazy=True) * 10, peak_memory(lazy=False))
+
+
+class ParallelPipelineTestCase(unittest.TestCase):
+    """ Test the parallel map step of the pipeline. """
+
+    def test_parallel_map_keeps_order(self):
+        """The results of the parallel map are in the order of the input."""
+        pipeline = Pipeline().append_parallel_map(square, workers=2)
+
+        self.assertEqual(pipeline.feed(range(100)),
+                         [x * x for x in range(100)])
+
+    def test_parallel_map_chunks(self):
+        """The last partial chunk is mapped as well."""
+        pipeline = Pipeline() \
+            .append_parallel_map(square, workers=2, chunksize=7)
+
+        self.assertEqual(pipeline.feed(range(20)),
+                         [x * x for x in range(20)])
+
+    def test_parallel_map_empty(self):
+        """Test parallel map with an empty list as input."""
+        pipeline = Pipeline().append_parallel_map(square, workers=2)
+
+        self.assertEqual(pipeline.feed([]), [])
+
+    def test_parallel_map_lazy(self):
+        """Test parallel map in a lazy pipeline."""
+        pipeline = Pipeline(lazy=True) \
+            .append_parallel_map(square, workers=2, chunksize=3) \
+            .append_map(lambda x: x + 1)
+
+        self.assertEqual(list(pipeline.feed(iter(range(10)))),
+                         [x * x + 1 for x in range(10)])
+
+    def test_parallel_map_initializer(self):
+        """Every worker process is initialized once."""
+        pipeline = Pipeline() \
+            .append_parallel_map(initialized, workers=2, chunksize=3,
+                                 initializer=init_worker, initargs=('a',))
+
+        self.assertEqual(pipeline.feed(range(20)),
+                         [(x, ['a']) for x in range(20)])
+        self.assertEqual(WORKER_INITS, [])
+
+    def test_parallel_map_error(self):
+        """The exception of a worker is raised with the offending entry."""
+        pipeline = Pipeline() \
+            .append_parallel_map(fail_on_three, workers=2, chunksize=2)
+
+        with self.assertRaises(PipelineStepError) as context:
+            pipeline.feed(range(10))
+
+        self.assertEqual(context.exception.entry, 3)
+        self.assertIsInstance(context.exception.__cause__, ValueError)
+
+
+class InstrumentedPipelineTestCase(unittest.TestCase):
+    """ Test the measurements of an instrumented pipeline. """
+
+    @staticmethod
+    def slow(x):
+        """Mapping function which takes a measurable amount of time."""
+        time.sleep(0.01)
+        return x
+
+    def build(self, lazy):
+        return Pipeline(lazy=lazy, instrument=True) \
+            .append_map(self.slow) \
+            .append_map(lambda x: [x, x]) \
+            .flatten() \
+            .append_transform(sum)
+
+    def test_labels_and_counts(self):
+        """Every step is labeled, and the items are counted."""
+        for lazy in [False, True]:
+            pipeline = self.build(lazy)
+
+            self.assertEqual(pipeline.feed([1, 2, 3]), 12)
+            self.assertEqual([s.label for s in pipeline.stats],
+                             ['append_map(slow)', 'append_map(<lambda>)',
+                              'flatten()', 'append_transform(sum)'])
+            self.assertEqual([(s.items_in, s.items_out)
+                              for s in pipeline.stats],
+                             [(3, 3), (3, 3), (3, 6), (6, None)])
+
+    def test_exclusive_times(self):
+        """The time of a step is not accounted to the following steps."""
+        for lazy in [False, True]:
+            pipeline = self.build(lazy)
+            pipeline.feed([1, 2, 3])
+
+            slow, *rest = pipeline.stats
+            self.assertGreaterEqual(slow.wall_time, 0.03)
+            for stats in rest:
+                self.assertLess(stats.wall_time, 0.01)
+                self.assertGreaterEqual(stats.cpu_time, 0)
+
+    def test_lazy_counts_after_consumption(self):
+        """The counts of a lazy pipeline are final after consumption."""
+        pipeline = Pipeline(lazy=True, instrument=True) \
+            .append_map(lambda x: x + 1)
+
+        result = pipeline.feed(iter([1, 2]))
+        self.assertEqual(pipeline.stats[0].items_out, 0)
+        self.assertEqual(list(result), [2, 3])
+        self.assertEqual(pipeline.stats[0].items_out, 2)
+        self.assertEqual(pipeline.stats[0].items_in, None)
+
+    def test_not_instrumented(self):
+        """Measurements are only collected on request."""
+        pipeline = Pipeline().append_map(str.upper)
+        pipeline.feed(['a'])
+
+        self.assertEqual(pipeline.stats, [])
+
+    def test_format(self):
+        """The measurements can be formatted as a table or as JSON."""
+        pipeline = self.build(False)
+        pipeline.feed([1])
+
+        table = format_stats(pipeline.stats).splitlines()
+        self.assertEqual(len(table), 5)
+        self.assertTrue(table[1].startswith('append_map(slow) '))
+
+        stats = json.loads(format_stats(pipeline.stats, 'json'))
+        self.assertEqual(stats[2]['step'], 'flatten()')
+        self.assertEqual(stats[2]['items_out'], 2)
+
+
+class OptimizedPipelineTestCase(unittest.TestCase):
+    """ Test the fusion of consecutive map and flatten steps. """
+
+    @staticmethod
+    def build(optimize, lazy=False):
+        return Pipeline(lazy=lazy, optimize=optimize) \
+            .append_transform(list) \
+            .append_map(lambda x: x + 1) \
+            .append_map(lambda x: x * 2) \
+            .append_transform(list) \
+            .append_map(lambda x: [x]) \
+            .flatten() \
+            .append_transform(list) \
+            .append_map(lambda x: [[x]]) \
+            .flatten() \
+            .flatten() \
+            .append_transform(list) \
+            .append_map(lambda x: [x, -x]) \
+            .flatten() \
+            .append_map(str)
+
+    def test_fused_steps(self):
+        """Runs of map and flatten steps are fused into single steps."""
+        pipeline = self.build(True)
+        optimized = optimize_steps(pipeline.pipeline, pipeline.lazy)
+
+        self.assertEqual(len(optimized), 8)
+        self.assertEqual(optimized[1].label,
+                         'append_map(<lambda>) + append_map(<lambda>)')
+        self.assertEqual(optimized[-1].label,
+                         'append_map(<lambda>) + flatten() + append_map(str)')
+
+    def test_same_results(self):
+        """The optimized pipeline computes the same results."""
+        for lazy in [False, True]:
+            expected = list(self.build(False, lazy).feed(range(5)))
+            result = self.build(True, lazy).feed(range(5))
+
+            self.assertEqual(list(result), expected)
+            self.assertEqual(type(result) is list, not lazy)
+
+    def test_prepend_flatten(self):
+        """Prepended map and flatten steps are fused as well."""
+        pipeline = Pipeline() \
+            .append_map(lambda x: x + 1) \
+            .pre_flatten() \
+            .prepend_map(lambda x: [x, x])
+
+        self.assertEqual(len(optimize_steps(pipeline.pipeline, False)), 1)
+        self.assertEqual(pipeline.feed([1, 2]), [2, 2, 3, 3])
+
+    def test_single_pass(self):
+        """The items pass through the fused map steps one at a time."""
+        trace = []
+
+        def step(name):
+            def record(x):
+                trace.append((name, x))
+                return x
+            return record
+
+        Pipeline() \
+            .append_map(step('first')) \
+            .append_map(step('second')) \
+            .feed([1, 2])
+
+        self.assertEqual(trace, [('first', 1), ('second', 1),
+                                 ('first', 2), ('second', 2)])
+
+
+class AsyncPipelineTestCase(unittest.TestCase):
+    """ Test the coroutine map step of the pipeline. """
+
+    def test_order_and_concurrency(self):
+        """The results are in input order, and the concurrency is bounded."""
+        running = []
+        peak = []
+
+        async def slow_square(x):
+            running.append(x)
+            peak.append(len(running))
+            # Later entries finish earlier.
+            await asyncio.sleep(0.001 * (20 - x))
+            running.remove(x)
+            return x * x
+
+        pipeline = Pipeline().append_async_map(slow_square, concurrency=4)
+
+        self.assertEqual(pipeline.feed(range(20)),
+                         [x * x for x in range(20)])
+        self.assertEqual(max(peak), 4)
+
+    def test_subprocesses_overlap(self):
+        """Subprocesses started by the coroutines run concurrently."""
+        async def run(_):
+            proc = await asyncio.create_subprocess_exec('sleep', '0.2')
+            return await proc.wait()
+
+        pipeline = Pipeline().append_async_map(run, concurrency=10)
+
+        start = time.perf_counter()
+        self.assertEqual(pipeline.feed(range(10)), [0] * 10)
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+    def test_lazy(self):
+        """Test coroutine map in a lazy pipeline."""
+        async def increment(x):
+            return x + 1
+
+        pipeline = Pipeline(lazy=True) \
+            .append_async_map(increment, concurrency=2) \
+            .append_map(str)
+
+        self.assertEqual(list(pipeline.feed(iter(range(5)))),
+                         ['1', '2', '3', '4', '5'])
+
+    def test_error(self):
+        """The exception of a coroutine is raised with the offending entry."""
+        async def fail(x):
+            return fail_on_three(x)
+
+        pipeline = Pipeline().append_async_map(fail, concurrency=3)
+
+        with self.assertRaises(PipelineStepError) as context:
+            pipeline.feed(range(10))
+
+        self.assertEqual(context.exception.entry, 3)
+        self.assertIsInstance(context.exception.__cause__, ValueError)
+
+
+class BatchPipelineTestCase(unittest.TestCase):
+    """ Test the batched map step of the pipeline. """
+
+    def test_batches(self):
+        """The entries are passed in batches, the last one is partial."""
+        for lazy in (False, True):
+            with self.subTest(lazy=lazy):
+                batches = []
+
+                def negate_all(batch):
+                    batches.append(list(batch))
+                    return [-x for x in batch]
+
+                pipeline = Pipeline(lazy=lazy) \
+                    .append_batch_map(negate_all, batch_size=3) \
+                    .append_map(str)
+
+                self.assertEqual(list(pipeline.feed(iter(range(7)))),
+                                 [str(-x) for x in range(7)])
+                self.assertEqual(batches, [[0, 1, 2], [3, 4, 5], [6]])
+
+    def test_streaming(self):
+        """A lazy pipeline only reads the entries of the current batch."""
+        read = []
+
+        def source():
+            for x in range(10):
+                read.append(x)
+                yield x
+
+        results = Pipeline(lazy=True) \
+            .append_batch_map(lambda batch: batch, batch_size=4) \
+            .feed(source())
+
+        self.assertEqual(next(results), 0)
+        self.assertEqual(read, [0, 1, 2, 3])
+
+    def test_empty(self):
+        """The function is not called without entries."""
+        def fail(_):
+            raise AssertionError("called")
+
+        self.assertEqual(Pipeline().append_batch_map(fail).feed([]), [])
+
+    def test_result_count(self):
+        """A batch function returning too few results is an error."""
+        pipeline = Pipeline().append_batch_map(lambda batch: batch[1:], 2)
+
+        with self.assertRaises(PipelineStepError) as context:
+            pipeline.feed(range(5))
+        self.assertEqual(context.exception.entry, [0, 1])
+
+        with self.assertRaises(ValueError):
+            Pipeline().append_batch_map(list, batch_size=0)
+
+
+class StagedPipelineTestCase(unittest.TestCase):
+    """ Test the execution of steps in threads connected by queues. """
+
+    def test_results(self):
+        """The results are the same as in a sequential pipeline."""
+        def build(**kwargs):
+            return Pipeline(**kwargs) \
+                .append_map(lambda x: x + 1) \
+                .append_transform(sorted) \
+                .append_map(lambda x: [x, -x]) \
+                .flatten()
+
+        expected = list(build(lazy=True).feed(range(10)))
+        for optimize in (False, True):
+            self.assertEqual(
+                list(build(staged=True, optimize=optimize).feed(range(10))),
+                expected)
+
+        pipeline = build(staged=True).append_transform(sum)
+        self.assertEqual(pipeline.feed(range(10)), 0)
+        self.assertEqual(Pipeline(staged=True).feed([1]), [1])
+
+    def test_not_fused(self):
+        """Every step of a staged pipeline runs in its own stage."""
+        def build(**kwargs):
+            return Pipeline(**kwargs) \
+                .append_map(lambda x: [x] * x) \
+                .flatten() \
+                .append_map(str)
+
+        self.assertEqual(len(build().compile().steps), 1)
+        pipeline = build(staged=True)
+        self.assertEqual(len(pipeline.compile().steps), 3)
+        self.assertEqual(list(pipeline.feed(range(3))), ['1', '2', '2'])
+
+    def test_overlap(self):
+        """Steps waiting for I/O run at the same time."""
+        def wait(x):
+            time.sleep(0.05)
+            return x
+
+        pipeline = Pipeline(staged=True, optimize=False) \
+            .append_map(wait) \
+            .append_map(wait) \
+            .append_map(wait)
+
+        start = time.perf_counter()
+        self.assertEqual(list(pipeline.feed(range(6))), list(range(6)))
+        self.assertLess(time.perf_counter() - start, 0.6)
+
+    def test_backpressure(self):
+        """A slow consumer limits the number of entries read ahead."""
+        read = []
+
+        def source():
+            for x in range(1000):
+                read.append(x)
+                yield x
+
+        pipeline = Pipeline(staged=True, optimize=False, queue_size=4) \
+            .append_map(str) \
+            .queue(2) \
+            .append_map(int)
+
+        results = pipeline.feed(source())
+        self.assertEqual(next(results), 0)
+        time.sleep(0.1)
+        # Two full queues, and an item in each of the two stages.
+        self.assertLessEqual(len(read), 4 + 2 + 2 + 1)
+        results.close()
+
+    def test_error(self):
+        """An exception of a step is raised to the caller."""
+        for transform in (list, iter):
+            pipeline = Pipeline(staged=True, optimize=False) \
+                .append_map(fail_on_three) \
+                .append_transform(transform) \
+                .append_map(str)
+
+            with self.assertRaises(ValueError):
+                list(pipeline.feed(range(1000)))
+
+    def test_queue_peak(self):
+        """The queue peaks are reported in the measurements."""
+        pipeline = Pipeline(staged=True, instrument=True, queue_size=3) \
+            .append_map(str) \
+            .append_map(lambda x: time.sleep(0.001) or x) \
+            .append_transform(lambda items: sum(1 for _ in items))
+
+        self.assertEqual(pipeline.feed(range(20)), 20)
+        self.assertEqual([s.items_out for s in pipeline.stats],
+                         [20, 20, None])
+        self.assertEqual(pipeline.stats[0].queue_peak, 3)
+        self.assertEqual(pipeline.stats[2].queue_peak, 1)
+
+        self.assertIn('queue peak', format_stats(pipeline.stats))
+        stats = json.loads(format_stats(pipeline.stats, 'json'))
+        self.assertEqual(stats[0]['queue_peak'], 3)
+
+
+class CompiledPipelineTestCase(unittest.TestCase):
+    """ Test the reusable execution plans of pipelines. """
+
+    def test_reuse(self):
+        """A plan can be fed several times, and does not change."""
+        pipeline = Pipeline().flatten().append_map(lambda x: x + 1)
+        plan = pipeline.compile()
+        pipeline.append_transform(len)
+
+        self.assertEqual(plan.feed([[1], [2, 3]]), [2, 3, 4])
+        self.assertEqual(plan.feed([[5]]), [6])
+        self.assertEqual(len(plan.steps), 1)
+        self.assertEqual(pipeline.feed([[1], [2, 3]]), 3)
+
+    def test_instrumented(self):
+        """Every execution of an instrumented plan is measured."""
+        plan = Pipeline(instrument=True).append_map(str).compile()
+
+        plan.feed([1, 2])
+        self.assertEqual(plan.stats[0].items_out, 2)
+        plan.feed([1, 2, 3])
+        self.assertEqual(plan.stats[0].items_out, 3)
+
+    def test_json_outputs(self):
+        """A JSON plan writes to the output given for the execution."""
+        pipeline = JsonPipeline(io.StringIO(), compact=True) \
+            .flatten() \
+            .append_map(lambda entry: entry['file'])
+        plan = pipeline.compile()
+
+        outputs = [io.StringIO() for _ in range(3)]
+        for index, output in enumerate(outputs):
+            source = io.StringIO(json.dumps([{'file': str(index)}]))
+            self.assertEqual(plan.feed([source], output), 1)
+
+        self.assertEqual([output.getvalue() for output in outputs],
+                         ['["0"]', '["1"]', '["2"]'])
+        self.assertEqual(pipeline.output.getvalue(), '')
+
+    def test_json_feed_twice(self):
+        """Feeding a JsonPipeline twice writes each output once."""
+        pipeline = JsonPipeline(io.StringIO(), compact=True).flatten()
+
+        pipeline.feed([io.StringIO('[1, 2]')])
+        pipeline.feed([io.StringIO('[3]')])
+
+        self.assertEqual(pipeline.output.getvalue(), '[1,2][3]')
+        self.assertEqual(len(pipeline.pipeline), 2)
+
+
+class FilterUniquePipelineTestCase(unittest.TestCase):
+    """ Test the filter and unique steps of the pipeline. """
+
+    def test_filter(self):
+        """Filter steps drop items, also when fused with other steps."""
+        for lazy in (False, True):
+            for optimize in (False, True):
+                pipeline = Pipeline(lazy=lazy, optimize=optimize) \
+                    .flatten() \
+                    .append_filter(lambda x: x % 2) \
+                    .append_map(str) \
+                    .append_filter(None)
+
+                self.assertEqual(list(pipeline.feed([[1, 2], [3, 4, 5]])),
+                                 ['1', '3', '5'])
+
+        pipeline = Pipeline() \
+            .flatten() \
+            .append_filter(lambda x: x > 2)
+        self.assertEqual(pipeline.feed([[1, 2], [3, 4]]), [3, 4])
+        self.assertEqual(len(optimize_steps(pipeline.pipeline, False)), 1)
+
+    def test_unique(self):
+        """The first or the last item of each key is kept."""
+        entries = [{'file': 'a.c', 'n': 1}, {'file': 'b.c', 'n': 2},
+                   {'file': 'a.c', 'n': 3}, {'file': 'c.c', 'n': 4},
+                   {'file': 'b.c', 'n': 5}]
+
+        def numbers(pipeline):
+            return [entry['n'] for entry in pipeline.feed(iter(entries))]
+
+        for lazy in (False, True):
+            def build(keep):
+                return Pipeline(lazy=lazy).append_unique(
+                    lambda entry: entry['file'], keep=keep)
+
+            self.assertEqual(numbers(build('first')), [1, 2, 4])
+            self.assertEqual(numbers(build('last')), [3, 4, 5])
+
+        self.assertEqual(Pipeline().append_unique().feed(
+            [[1], {'a': 1}, [1], {'a': 1}, 1]), [[1], {'a': 1}, 1])
+
+        with self.assertRaises(ValueError):
+            Pipeline().append_unique(keep='middle')
+
+    def test_unique_streaming(self):
+        """Keeping the first items does not wait for the whole input."""
+        read = []
+
+        def source():
+            for x in [1, 1, 2, 3]:
+                read.append(x)
+                yield x
+
+        results = Pipeline(lazy=True).append_unique().feed(source())
+
+        self.assertEqual(next(results), 1)
+        self.assertEqual(next(results), 2)
+        self.assertEqual(read, [1, 1, 2])
@@ -0,0 +1,84 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests the cache of the file system probes of include
+directories.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from compilation_database_transformer.probe_cache import ProbeCache
+
+
+class ProbeCacheTestCase(unittest.TestCase):
+    """ Test the caching and validation of the file system probes. """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.plain = os.path.join(self.tmp_dir, 'plain')
+        self.intrin = os.path.join(self.tmp_dir, 'intrin')
+        os.mkdir(self.plain)
+        os.mkdir(self.intrin)
+        self.touch(os.path.join(self.intrin, 'xmmintrin.h'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    @staticmethod
+    def touch(path):
+        with open(path, 'w', encoding='utf-8'):
+            pass
+
+    def test_results(self):
+        """The results are the same as without the cache."""
+        cache = ProbeCache()
+        missing = os.path.join(self.tmp_dir, 'missing')
+        header = os.path.join(self.intrin, 'xmmintrin.h')
+
+        self.assertTrue(cache.isdir(self.plain))
+        self.assertFalse(cache.isdir(missing))
+        self.assertFalse(cache.isdir(header))
+        self.assertTrue(cache.contains_no_intrinsic_headers(self.plain))
+        self.assertFalse(cache.contains_no_intrinsic_headers(self.intrin))
+        self.assertTrue(cache.contains_no_intrinsic_headers(missing))
+
+    def test_probed_once(self):
+        """Every directory is examined only once."""
+        cache = ProbeCache()
+        with mock.patch('glob.glob', wraps=__import__('glob').glob) as scan, \
+                mock.patch('os.stat', wraps=os.stat) as status:
+            for _ in range(10):
+                cache.isdir(self.intrin)
+                cache.contains_no_intrinsic_headers(self.intrin)
+                cache.contains_no_intrinsic_headers(self.plain)
+
+        self.assertEqual(scan.call_count, 2)
+        self.assertEqual(status.call_count, 2)
+        self.assertEqual((cache.hits, cache.misses), (27, 3))
+        self.assertAlmostEqual(cache.hit_rate, 0.9)
+
+    def test_validation(self):
+        """With validation a changed directory is examined again."""
+        cache = ProbeCache(validate=True)
+        self.assertTrue(cache.contains_no_intrinsic_headers(self.plain))
+        self.assertTrue(cache.contains_no_intrinsic_headers(self.plain))
+        self.assertEqual(cache.hits, 1)
+
+        # Make sure the modification time changes.
+        time.sleep(0.01)
+        self.touch(os.path.join(self.plain, 'emmintrin.h'))
+        self.assertFalse(cache.contains_no_intrinsic_headers(self.plain))
+
+        unvalidated = ProbeCache()
+        self.assertFalse(unvalidated.contains_no_intrinsic_headers(self.plain))
+        os.remove(os.path.join(self.plain, 'emmintrin.h'))
+        self.assertFalse(unvalidated.contains_no_intrinsic_headers(self.plain))
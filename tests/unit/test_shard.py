@@ -0,0 +1,86 @@
+# -----------------------------------------------------------------------------
+#                     The CodeChecker Infrastructure
+#   This file is distributed under the University of Illinois Open Source
+#   License. See LICENSE.TXT for details.
+# -----------------------------------------------------------------------------
+
+"""
+This module tests the sharding of compilation databases, and the merging of
+the results of the shards.
+"""
+
+import argparse
+import unittest
+
+from compilation_database_transformer.shard import in_shard, merge_shards, \
+    parse_shard, select_shard, shard_of
+
+
+def entry(directory, file_name, number=0):
+    return {'directory': directory, 'file': file_name, 'n': number}
+
+
+class ShardTestCase(unittest.TestCase):
+    """ Test the selection and merging of shards. """
+
+    def setUp(self):
+        self.entries = [entry('/src/d{0}'.format(i % 3),
+                              'f{0}.c'.format(i % 7), i)
+                        for i in range(50)]
+
+    def test_parse(self):
+        """Shards are given as INDEX/COUNT."""
+        self.assertEqual(parse_shard('2/5'), (2, 5))
+        for text in ('5/5', '-1/2', '1', 'a/b', '1/2/3'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_shard(text)
+
+    def test_disjoint(self):
+        """Every entry is in exactly one shard."""
+        shards = [list(select_shard((index, 4), self.entries))
+                  for index in range(4)]
+
+        self.assertEqual(sorted(e['n'] for shard in shards for e in shard),
+                         list(range(50)))
+        self.assertTrue(all(shards))
+        self.assertTrue(all(in_shard((1, 4), e) for e in shards[1]))
+        self.assertEqual(shard_of(entry('/a', 'b.c'), 1), 0)
+
+    def test_merge(self):
+        """The results are merged in the order of the entries."""
+        def result(e):
+            # Like the results of check, without the directory.
+            return {'file': e['file'], 'n': e['n']}
+
+        shards = [[result(e) for e in select_shard((index, 3), self.entries)]
+                  for index in range(3)]
+
+        merged = merge_shards(self.entries, shards)
+        self.assertEqual([r['n'] for r in merged], list(range(50)))
+
+    def test_merge_missing_and_unmatched(self):
+        """Entries without results are skipped, extra results kept."""
+        entries = [entry('/src', 'a.c', 0), entry('/src', 'b.c', 1),
+                   entry('/src', 'a.c', 2)]
+        results = [entry('/src', './a.c', 0), entry('/other', 'c.c', 3)]
+
+        with self.assertLogs('shard', 'WARNING'):
+            merged = list(merge_shards(entries, [results]))
+
+        self.assertEqual([r['n'] for r in merged], [0, 3])
+
+    def test_merge_duplicates(self):
+        """The duplicate entries dropped by a command are skipped."""
+        entries = [entry('/src', 'f.c', 0), entry('/src', 'f.c', 0),
+                   entry('/src', 'g.c', 1), entry('/src', 'f.c', 2)]
+        results = [entries[0], entries[2], entries[3]]
+
+        for count in (1, 3):
+            shards = [list(select_shard((index, count), results))
+                      for index in range(count)]
+            merged = merge_shards(entries, shards)
+            self.assertEqual([r['n'] for r in merged], [0, 1, 2])
+
+        # The results of every entry are kept.
+        merged = merge_shards(entries, [entries])
+        self.assertEqual([r['n'] for r in merged], [0, 0, 1, 2])